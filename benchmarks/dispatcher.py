@@ -0,0 +1,243 @@
+"""Нагрузочный бенчмарк обработчиков: настоящий Dispatcher бота без сети.
+
+Используется dp из src/app.py (setup_handlers, setup_middleware, FSM storage, startup/shutdown),
+Bot с сессией-заглушкой (FakeBotSession) и локальный сервер вместо OpenWeatherMap,
+OpenFoodFacts, api-ninjas и сервиса перевода (FakeUpstreamServer). Каждый пользователь
+проходит сценарий из всех команд, включая диалог /set_profile; пользователи работают
+параллельно. Печатаются пропускная способность, p50/p95/p99 по командам и память на
+одного пользователя.
+
+Запуск: python -m benchmarks.dispatcher --users 100 --concurrency 20 [--json results.json] [--max-p95-ms 50]
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, List
+
+from benchmarks.fake_telegram import FakeBotSession, make_message_update
+from benchmarks.fake_upstreams import FakeUpstreamServer, FakeTranslator
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_USER_ID = 10_000
+# цифры id пользователя кодируются буквами: названия с цифрами бот отклоняет (isalpha)
+ID_LETTERS = "абвгдежзик"
+# внешние api, которые должны опрашиваться шагами ":remote" каждого пользователя
+REMOTE_UPSTREAMS = ("translate", "openfoodfacts", "api_ninjas")
+
+# (метка для отчета, текст сообщения); продукт и активность, которых нет
+# в локальных индексах, проходят через перевод и внешние api
+PROFILE_STEPS = [
+    ("start", "/start"),
+    ("help", "/help"),
+    ("set_profile", "/set_profile"),
+    ("profile:weight", "70"),
+    ("profile:height", "180"),
+    ("profile:age", "30"),
+    ("profile:activity", "45"),
+    ("profile:city", "Москва"),
+]
+LOG_STEPS = [
+    ("log_water", "/log_water 250"),
+    ("log_food", "/log_food банан"),
+    ("food:amount", "150"),
+    ("log_food:remote", "/log_food {product}"),
+    ("food:amount", "100"),
+    ("log_workout", "/log_workout бег 30"),
+    ("log_workout:remote", "/log_workout {activity} 20"),
+    ("check_progress", "/check_progress"),
+    ("fake", "/fake"),
+]
+CHART_STEPS = [
+    ("show_water_chart", "/show_water_chart"),
+    ("show_calories_chart", "/show_calories_chart"),
+    # повторный запрос того же графика отдается из кэша
+    ("show_water_chart:cached", "/show_water_chart"),
+]
+
+
+def unknown_name(prefix: str, user_id: int) -> str:
+    """Название из одних букв, которого нет в локальных индексах: "продукт" + "бааа..." для 10000"""
+    return prefix + "".join(ID_LETTERS[int(digit)] for digit in str(user_id))
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Harness:
+    def __init__(self, dp, bot) -> None:
+        from aiogram.types import Update
+
+        self.dp = dp
+        self.bot = bot
+        self.update_type = Update
+        self.update_ids = itertools.count(1)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def send(self, label: str, user_id: int, text: str) -> None:
+        update = self.update_type.model_validate(
+            make_message_update(next(self.update_ids), user_id, text), context={"bot": self.bot}
+        )
+        started_at = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            self.errors[label] += 1
+        self.latencies[label].append(time.perf_counter() - started_at)
+
+    async def run_user(self, user_id: int, with_charts: bool = True) -> None:
+        from src.users import generate_fake_date
+
+        # уникальные названия, чтобы каждый пользователь доходил до внешних api
+        names = {"product": unknown_name("продукт", user_id), "activity": unknown_name("активность", user_id)}
+        for label, text in PROFILE_STEPS + LOG_STEPS:
+            await self.send(label, user_id, text.format(**names))
+        if with_charts:
+            # для графиков нужно несколько дней статистики
+            await generate_fake_date(user_id, 7)
+            for label, text in CHART_STEPS:
+                await self.send(label, user_id, text)
+
+    async def run_users(self, user_ids: List[int], concurrency: int, with_charts: bool = True) -> None:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(user_id: int) -> None:
+            async with semaphore:
+                await self.run_user(user_id, with_charts)
+
+        await asyncio.gather(*(run(user_id) for user_id in user_ids))
+
+
+async def measure_memory(harness: Harness, user_ids: List[int], concurrency: int) -> float:
+    """Прирост памяти Python-объектов на одного пользователя после профиля и записей за день"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    await harness.run_users(user_ids, concurrency, with_charts=False)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(user_ids)
+
+
+def report(harness: Harness, elapsed: float, memory_per_user: float) -> Dict[str, object]:
+    total = sum(len(values) for values in harness.latencies.values())
+    all_latencies = [value for values in harness.latencies.values() for value in values]
+    results: Dict[str, object] = {
+        "updates": total,
+        "seconds": elapsed,
+        "updates_per_second": total / elapsed,
+        "p50_ms": percentile(all_latencies, 0.5) * 1000,
+        "p95_ms": percentile(all_latencies, 0.95) * 1000,
+        "p99_ms": percentile(all_latencies, 0.99) * 1000,
+        "memory_per_user_bytes": memory_per_user,
+        "errors": dict(harness.errors),
+        "commands": {},
+    }
+
+    print(f"{'command':26s} {'n':>6s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'errors':>6s}")
+    for label, values in sorted(harness.latencies.items()):
+        ms = [value * 1000 for value in values]
+        stats = {"n": len(ms), "p50_ms": percentile(ms, 0.5), "p95_ms": percentile(ms, 0.95),
+                 "p99_ms": percentile(ms, 0.99), "errors": harness.errors.get(label, 0)}
+        results["commands"][label] = stats
+        print(f"{label:26s} {stats['n']:6d} {stats['p50_ms']:8.2f} {stats['p95_ms']:8.2f} "
+              f"{stats['p99_ms']:8.2f} {stats['errors']:6d}")
+    print(f"\n{total} updates in {elapsed:.2f} s: {results['updates_per_second']:.0f} updates/s, "
+          f"p50 {results['p50_ms']:.2f} ms, p95 {results['p95_ms']:.2f} ms, p99 {results['p99_ms']:.2f} ms")
+    print(f"memory per user: {memory_per_user / 1024:.1f} KiB")
+    return results
+
+
+async def main(args: argparse.Namespace) -> int:
+    upstreams = FakeUpstreamServer(delay=args.upstream_delay)
+    await upstreams.start()
+
+    data_dir = tempfile.mkdtemp()
+    os.environ.update(
+        BOT_TOKEN="42:benchmark",
+        OPEN_WEATHER_MAP_TOKEN="benchmark",
+        WORKOUT_API_TOKEN="benchmark",
+        ADMIN_USER_ID=str(FIRST_USER_ID),
+        SKIP_API_KEY_CHECK="1",
+        BOT_MODE="polling",
+        DATA_DIR=data_dir,
+        LOG_DIR=os.path.join(data_dir, "logs"),
+        METRICS_ENABLED="0",
+        **upstreams.env(),
+    )
+    # бенчмарк измеряет бота, а не ограничения бесплатных тарифов внешних api
+    for upstream in ("OPENWEATHERMAP", "OPENFOODFACTS", "API_NINJAS", "TRANSLATE"):
+        os.environ.setdefault(f"{upstream}_RATE", "100000")
+        os.environ.setdefault(f"{upstream}_BURST", "100000")
+
+    sys.path.insert(0, ROOT_DIR)
+    from aiogram import Bot
+    from src.app import create_dispatcher
+    from src.logger import get_logger
+    from src.sessions import sessions
+
+    get_logger().setLevel(logging.WARNING)
+    sessions._translator = FakeTranslator(upstreams.url)
+    bot = Bot(token="42:benchmark", session=FakeBotSession())
+    dp = create_dispatcher()
+    harness = Harness(dp, bot)
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    try:
+        user_ids = list(range(FIRST_USER_ID, FIRST_USER_ID + args.users))
+        requests_before = upstreams.requests.copy()
+        started_at = time.perf_counter()
+        await harness.run_users(user_ids, args.concurrency)
+        elapsed = time.perf_counter() - started_at
+        remote_requests = {name: upstreams.requests[name] - requests_before[name] for name in REMOTE_UPSTREAMS}
+
+        memory_user_ids = list(range(FIRST_USER_ID + args.users, FIRST_USER_ID + args.users + args.memory_users))
+        memory_harness = Harness(dp, bot)
+        memory_harness.update_ids = harness.update_ids
+        memory_per_user = await measure_memory(memory_harness, memory_user_ids, args.concurrency)
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await upstreams.stop()
+
+    results = report(harness, elapsed, memory_per_user)
+    results["upstream_requests"] = remote_requests
+    print(f"upstream requests: {remote_requests}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if harness.errors:
+        print(f"errors: {dict(harness.errors)}")
+        return 1
+    # иначе шаги ":remote" измеряли бы отказ в валидации, а не поход во внешние api
+    skipped = [name for name, count in remote_requests.items() if count < args.users]
+    if skipped:
+        print(f"remote steps did not reach upstreams: {', '.join(skipped)}")
+        return 1
+    if args.max_p95_ms is not None and results["p95_ms"] > args.max_p95_ms:
+        print(f"p95 {results['p95_ms']:.2f} ms exceeds the limit of {args.max_p95_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--memory-users", type=int, default=200, help="пользователей для замера памяти")
+    parser.add_argument("--upstream-delay", type=float, default=0.0, help="задержка ответа внешних api, с")
+    parser.add_argument("--json", help="сохранить результаты в JSON-файл")
+    parser.add_argument("--max-p95-ms", type=float, help="завершиться с ошибкой, если общий p95 больше")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiohttp import web
+
+
+def make_message_update(update_id: int, user_id: int, text: str) -> Dict[str, Any]:
+    """Update с текстовым сообщением от пользователя в личном чате"""
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return {"update_id": update_id, "message": message}
+
+
+class FakeTelegramServer:
+    """Локальная замена Bot API: отдает заранее заданные апдейты через getUpdates
+    и запоминает все исходящие запросы бота (sendMessage, sendPhoto, ...)."""
+
+    def __init__(self, updates: Optional[List[Dict[str, Any]]] = None) -> None:
+        self.updates: List[Dict[str, Any]] = list(updates or [])
+        self.requests: List[tuple] = []
+        self.first_reply_at: Optional[float] = None
+        self.first_reply = asyncio.Event()
+        self._new_updates = asyncio.Event()
+        self.replies: int = 0
+        self._reply_received = asyncio.Event()
+        self._reply_waiters: Dict[int, List[asyncio.Future]] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    def add_update(self, update: Dict[str, Any]) -> None:
+        self.updates.append(update)
+        self._new_updates.set()
+
+    def wait_for_reply(self, chat_id: int) -> "asyncio.Future[float]":
+        """Future, которое завершится временем (perf_counter) следующего ответа бота в чат"""
+        future = asyncio.get_running_loop().create_future()
+        self._reply_waiters.setdefault(chat_id, []).append(future)
+        return future
+
+    async def wait_for_replies(self, count: int) -> None:
+        """Ждет, пока бот не отправит всего count сообщений"""
+        while self.replies < count:
+            self._reply_received.clear()
+            await self._reply_received.wait()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = dict(await request.post())
+        self.requests.append((method, data))
+
+        if method == "getMe":
+            result: Any = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "getUpdates":
+            result = await self._get_updates(data)
+        elif method.startswith("send"):
+            replied_at = time.perf_counter()
+            self.replies += 1
+            self._reply_received.set()
+            if self.first_reply_at is None:
+                self.first_reply_at = replied_at
+                self.first_reply.set()
+            for future in self._reply_waiters.pop(int(data.get("chat_id", 0)), []):
+                if not future.done():
+                    future.set_result(replied_at)
+            result = {
+                "message_id": len(self.requests),
+                "date": int(time.time()),
+                "chat": {"id": int(data.get("chat_id", 0)), "type": "private"},
+                "text": data.get("text", ""),
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _get_updates(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(data.get("offset") or 0)
+        self.updates = [update for update in self.updates if update["update_id"] >= offset]
+        if not self.updates:
+            # long polling: ждем новых апдейтов, но не дольше timeout
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), min(float(data.get("timeout") or 0), 1.0))
+            except asyncio.TimeoutError:
+                return []
+            self.updates = [update for update in self.updates if update["update_id"] >= offset]
+        return self.updates[:100]
+
+
+class FakeBotSession(BaseSession):
+    """Сессия aiogram без сети: на каждый метод Bot API сразу отвечает правдоподобным
+    результатом, как это сделал бы Telegram. Ответ все равно проходит через разбор
+    JSON и валидацию aiogram, как в настоящей сессии."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls: Counter = Counter()
+        self._message_id: int = 0
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        name = method.__api_method__
+        self.calls[name] += 1
+        return self.check_response(
+            bot=bot, method=method, status_code=200,
+            content=json.dumps({"ok": True, "result": self._result(name, method)}),
+        ).result
+
+    def _result(self, name: str, method: TelegramMethod) -> Any:
+        if name == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        if not name.startswith("send"):
+            return True
+
+        self._message_id += 1
+        chat_id = int(getattr(method, "chat_id", 0) or 0)
+        message: Dict[str, Any] = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        file_id = f"file-{self._message_id}"
+        if name == "sendPhoto":
+            message["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 1, "height": 1}]
+        elif name == "sendDocument":
+            message["document"] = {"file_id": file_id, "file_unique_id": file_id}
+        else:
+            message["text"] = getattr(method, "text", None) or ""
+        return message
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
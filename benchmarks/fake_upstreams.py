@@ -0,0 +1,137 @@
+import asyncio
+import random
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Union
+
+import aiohttp
+from aiohttp import web
+
+WEATHER_PATH = "/data/2.5/weather"
+OPENFOODFACTS_PATH = "/cgi/search.pl"
+API_NINJAS_PATH = "/v1/caloriesburned"
+TRANSLATE_PATH = "/translate"
+
+# города, для которых погода "не найдена" (404), как у OpenWeatherMap
+UNKNOWN_CITIES = {"нигдеград", "nowhere"}
+
+
+class FakeUpstreamServer:
+    """Локальная замена OpenWeatherMap, OpenFoodFacts, api-ninjas и сервиса перевода.
+
+    Можно задать задержку ответа, долю "медленных" ответов (хвост задержек) и статус,
+    которым сервер отвечает на все запросы (имитация отказа). Адреса для переменных
+    окружения бота возвращает env()."""
+
+    def __init__(
+            self,
+            delay: float = 0.0,
+            slow_ratio: float = 0.0,
+            slow_delay: float = 0.0,
+            fail_status: Optional[int] = None,
+            temperature: float = 20.0,
+            seed: int = 0,
+    ) -> None:
+        self.delay: float = delay
+        self.slow_ratio: float = slow_ratio
+        self.slow_delay: float = slow_delay
+        self.fail_status: Optional[int] = fail_status
+        self.temperature: float = temperature
+        self.requests: Counter = Counter()
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get(WEATHER_PATH, self._weather)
+        app.router.add_get(OPENFOODFACTS_PATH, self._products)
+        app.router.add_get(API_NINJAS_PATH, self._exercises)
+        app.router.add_get(TRANSLATE_PATH, self._translate)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    def env(self) -> Dict[str, str]:
+        # сервис перевода так не подменить, см. FakeTranslator
+        return {
+            "OPENWEATHERMAP_URL": self.url + WEATHER_PATH,
+            "OPENFOODFACTS_URL": self.url + OPENFOODFACTS_PATH,
+            "API_NINJAS_URL": self.url + API_NINJAS_PATH,
+        }
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _respond(self, name: str) -> Optional[web.Response]:
+        self.requests[name] += 1
+        delay = self.slow_delay if self._random.random() < self.slow_ratio else self.delay
+        if delay:
+            await asyncio.sleep(delay)
+        if self.fail_status is not None:
+            return web.json_response({"error": "fake failure"}, status=self.fail_status)
+        return None
+
+    async def _weather(self, request: web.Request) -> web.Response:
+        failed = await self._respond("weather")
+        if failed is not None:
+            return failed
+        city = request.query.get("q", "")
+        if city.lower() in UNKNOWN_CITIES:
+            return web.json_response({"cod": "404", "message": "city not found"}, status=404)
+        return web.json_response({"name": city, "main": {"temp": self.temperature}})
+
+    async def _products(self, request: web.Request) -> web.Response:
+        failed = await self._respond("openfoodfacts")
+        if failed is not None:
+            return failed
+        term = request.query.get("search_terms", "")
+        return web.json_response({"products": [{"product_name": term, "nutriments": {"energy-kcal_100g": 100}}]})
+
+    async def _exercises(self, request: web.Request) -> web.Response:
+        failed = await self._respond("api_ninjas")
+        if failed is not None:
+            return failed
+        activity = request.query.get("activity", "")
+        return web.json_response([{"name": activity, "calories_per_hour": 500}])
+
+    async def _translate(self, request: web.Request) -> web.Response:
+        failed = await self._respond("translate")
+        if failed is not None:
+            return failed
+        # "перевод" возвращает исходный текст: для бенчмарка важна только задержка
+        return web.json_response({"text": request.query.get("q", "")})
+
+
+class FakeTranslator:
+    """Замена googletrans.Translator, которая ходит в FakeUpstreamServer.
+
+    googletrans обращается к сервису только по https, поэтому вместо подмены адреса
+    подменяется сам переводчик: sessions._translator = FakeTranslator(server.url)"""
+
+    def __init__(self, url: str) -> None:
+        self.url: str = url + TRANSLATE_PATH
+        self.client = self
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _translate_one(self, text: str, dest: str) -> SimpleNamespace:
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        async with self._session.get(self.url, params={"q": text, "dest": dest}) as response:
+            response.raise_for_status()
+            return SimpleNamespace(text=(await response.json())["text"])
+
+    async def translate(self, text: Union[str, List[str]], dest: str = "en"):
+        if isinstance(text, list):
+            return [await self._translate_one(item, dest) for item in text]
+        return await self._translate_one(text, dest)
+
+    async def aclose(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
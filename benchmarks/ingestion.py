@@ -0,0 +1,123 @@
+"""Сравнение задержки обработки апдейтов в режимах polling и webhook.
+
+Бот (dp и bot из bot.py) запускается в этом же процессе, Bot API заменяется локальным
+сервером. Задержка - время от появления апдейта (в getUpdates или POST на webhook)
+до ответа бота. По умолчанию отправляется /start от разных пользователей, можно
+передать JSON-файл со списком записанных апдейтов.
+
+Запуск: python -m benchmarks.ingestion --updates 200 [--recorded updates.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.fake_telegram import FakeTelegramServer, make_message_update
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEBHOOK_SECRET = "benchmark-secret"
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def report(mode: str, latencies: List[float]) -> None:
+    ms = [latency * 1000 for latency in latencies]
+    print(f"{mode:8s} n={len(ms)} p50={percentile(ms, 0.5):.1f} ms p95={percentile(ms, 0.95):.1f} ms "
+          f"p99={percentile(ms, 0.99):.1f} ms mean={statistics.mean(ms):.1f} ms")
+
+
+def chat_id(update: Dict[str, Any]) -> int:
+    return update["message"]["chat"]["id"]
+
+
+async def run_polling(dp, bot, server: FakeTelegramServer, updates: List[Dict[str, Any]]) -> List[float]:
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False))
+    latencies = []
+    try:
+        for update in updates:
+            reply = server.wait_for_reply(chat_id(update))
+            started_at = time.perf_counter()
+            server.add_update(update)
+            latencies.append(await asyncio.wait_for(reply, 30) - started_at)
+    finally:
+        await dp.stop_polling()
+        await polling
+    return latencies
+
+
+async def run_webhook(dp, bot, server: FakeTelegramServer, updates: List[Dict[str, Any]]) -> List[float]:
+    from src.webhook import create_webhook_app
+
+    app = create_webhook_app(dp, bot, secret_token=WEBHOOK_SECRET)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/webhook"
+
+    latencies = []
+    try:
+        async with aiohttp.ClientSession(headers={"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET}) as session:
+            for update in updates:
+                reply = server.wait_for_reply(chat_id(update))
+                started_at = time.perf_counter()
+                async with session.post(url, json=update) as response:
+                    response.raise_for_status()
+                latencies.append(await asyncio.wait_for(reply, 30) - started_at)
+    finally:
+        await runner.cleanup()
+    return latencies
+
+
+async def main(count: int, recorded: str) -> None:
+    if recorded:
+        with open(recorded, encoding="utf-8") as f:
+            updates = json.load(f)
+    else:
+        updates = [make_message_update(i + 1, 1000 + i, "/start") for i in range(count)]
+
+    server = FakeTelegramServer()
+    url = await server.start()
+    data_dir = tempfile.mkdtemp()
+    os.environ.update(
+        BOT_TOKEN="42:benchmark",
+        OPEN_WEATHER_MAP_TOKEN=os.getenv("OPEN_WEATHER_MAP_TOKEN", "benchmark"),
+        WORKOUT_API_TOKEN=os.getenv("WORKOUT_API_TOKEN", "benchmark"),
+        ADMIN_USER_ID=os.getenv("ADMIN_USER_ID", "1"),
+        SKIP_API_KEY_CHECK="1",
+        TELEGRAM_API_URL=url,
+        DATA_DIR=data_dir,
+        FSM_STORAGE="memory",
+    )
+    sys.path.insert(0, ROOT_DIR)
+    from src.app import create_bot, create_dispatcher
+    from src.logger import get_logger
+    get_logger().setLevel(logging.WARNING)
+    bot, dp = create_bot(), create_dispatcher()
+
+    try:
+        report("polling", await run_polling(dp, bot, server, updates))
+        # апдейты с теми же update_id повторно отправляем уже через webhook
+        report("webhook", await run_webhook(dp, bot, server, updates))
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--recorded", help="JSON-файл со списком апдейтов")
+    args = parser.parse_args()
+    asyncio.run(main(args.updates, args.recorded))
@@ -0,0 +1,96 @@
+"""Бенчмарк устойчивости клиентов внешних API к медленному и неработающему upstream.
+
+1. Хвост задержек: доля ответов погоды приходит с большой задержкой, сравниваются
+   p50/p99 без повторных (hedged) запросов и с ними.
+2. Отказ: upstream отвечает 503, circuit breaker должен размыкаться, и запросы
+   завершаются сразу (последней известной погодой), а не ждут таймаута.
+
+Все запросы идут в локальный сервер (см. fake_upstreams.py), сеть не нужна.
+
+Запуск: python -m benchmarks.resilience --requests 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.fake_upstreams import FakeUpstreamServer
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def measure_tail(requests_count: int) -> None:
+    from src.api import WeatherApiClient
+    from src.cache import TTLCache
+    from src.sessions import sessions
+
+    # кэш размером 1 с нулевым временем жизни, чтобы каждый запрос доходил до сервера
+    client = WeatherApiClient("benchmark", cache=TTLCache(maxsize=1, ttl=0))
+    latencies = []
+    for i in range(requests_count):
+        started_at = time.perf_counter()
+        await client.get_weather_async(f"Город{i}")
+        latencies.append(time.perf_counter() - started_at)
+    await sessions.close()
+    print(f"  p50 {percentile(latencies, 0.5) * 1000:.1f} ms, p95 {percentile(latencies, 0.95) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+
+async def measure_outage(server: FakeUpstreamServer, requests_count: int) -> None:
+    from src.api import WeatherApiClient
+    from src.cache import TTLCache
+    from src.resilience import breakers
+    from src.ratelimit import OPENWEATHERMAP
+    from src.sessions import sessions
+
+    client = WeatherApiClient("benchmark", cache=TTLCache(maxsize=1, ttl=0))
+    await client.get_weather_async("Москва")
+
+    server.fail_status = 503
+    requests_before = server.requests["weather"]
+    latencies = []
+    for _ in range(requests_count):
+        started_at = time.perf_counter()
+        weather = await client.get_weather_async("Москва")
+        latencies.append(time.perf_counter() - started_at)
+        assert "main" in weather, weather
+    await sessions.close()
+    print(f"  upstream requests {server.requests['weather'] - requests_before} of {requests_count}, "
+          f"breaker {breakers[OPENWEATHERMAP].state}, median {statistics.median(latencies) * 1000:.2f} ms")
+
+
+async def main(requests_count: int, hedge_delay: float) -> None:
+    # 10% ответов приходят через 0.5 с
+    server = FakeUpstreamServer(delay=0.005, slow_ratio=0.1, slow_delay=0.5)
+    await server.start()
+    os.environ.update(server.env())
+    os.environ.setdefault("OPENWEATHERMAP_RATE", "100000")
+    os.environ.setdefault("OPENWEATHERMAP_BURST", "100000")
+    try:
+        import src.api
+
+        print("hedging off:")
+        src.api.HEDGE_DELAY = 0
+        await measure_tail(requests_count)
+
+        print(f"hedging after {hedge_delay * 1000:.0f} ms:")
+        src.api.HEDGE_DELAY = hedge_delay
+        await measure_tail(requests_count)
+
+        print("upstream returns 503:")
+        server.slow_ratio = 0
+        await measure_outage(server, requests_count)
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--hedge-delay", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.hedge_delay))
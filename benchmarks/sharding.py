@@ -0,0 +1,74 @@
+"""Пропускная способность бота в режиме BOT_MODE=supervisor в зависимости от числа процессов.
+
+Для каждого числа процессов запускается `python bot.py` с локальным Bot API, после прогрева
+в getUpdates сразу выкладывается пачка апдейтов от разных пользователей и измеряется время
+до последнего ответа бота.
+
+Запуск: python -m benchmarks.sharding --workers 1 2 4 --updates 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_telegram import FakeTelegramServer, make_message_update
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMANDS = ["/start", "/help"]
+
+
+async def measure(workers: int, count: int, users: int, timeout: float) -> float:
+    server = FakeTelegramServer()
+    url = await server.start()
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(
+            os.environ,
+            BOT_TOKEN="42:benchmark",
+            OPEN_WEATHER_MAP_TOKEN=os.getenv("OPEN_WEATHER_MAP_TOKEN", "benchmark"),
+            WORKOUT_API_TOKEN=os.getenv("WORKOUT_API_TOKEN", "benchmark"),
+            ADMIN_USER_ID=os.getenv("ADMIN_USER_ID", "1"),
+            SKIP_API_KEY_CHECK="1",
+            TELEGRAM_API_URL=url,
+            DATA_DIR=data_dir,
+            BOT_MODE="supervisor",
+            SHARD_WORKERS=str(workers),
+            CHART_WORKERS="1",
+        )
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "bot.py", cwd=ROOT_DIR, env=env,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            # прогрев: по одному апдейту в каждый шард
+            for user_id in range(workers):
+                server.add_update(make_message_update(user_id + 1, user_id, "/start"))
+            await asyncio.wait_for(server.wait_for_replies(workers), timeout)
+
+            started_at = time.perf_counter()
+            for i in range(count):
+                update_id = workers + i + 1
+                server.add_update(make_message_update(update_id, 1000 + i % users, COMMANDS[i % len(COMMANDS)]))
+            await asyncio.wait_for(server.wait_for_replies(workers + count), timeout)
+            return time.perf_counter() - started_at
+        finally:
+            process.terminate()
+            await process.wait()
+            await server.stop()
+
+
+async def main(workers_list, count: int, users: int, timeout: float) -> None:
+    for workers in workers_list:
+        elapsed = await measure(workers, count, users, timeout)
+        print(f"workers={workers}: {count} updates in {elapsed:.2f} s, {count / elapsed:.0f} updates/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.workers, args.updates, args.users, args.timeout))
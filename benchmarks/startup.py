@@ -0,0 +1,63 @@
+"""Бенчмарк холодного старта: время от запуска `python bot.py` до ответа на первый апдейт.
+
+Bot API заменяется локальным сервером (см. fake_telegram.py), проверка ключей внешних API
+отключается, поэтому бенчмарк работает без сети.
+
+Запуск: python -m benchmarks.startup --runs 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_telegram import FakeTelegramServer, make_message_update
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def measure_once(timeout: float) -> float:
+    server = FakeTelegramServer([make_message_update(1, 100, "/start")])
+    url = await server.start()
+    env = dict(
+        os.environ,
+        BOT_TOKEN="42:benchmark",
+        OPEN_WEATHER_MAP_TOKEN=os.getenv("OPEN_WEATHER_MAP_TOKEN", "benchmark"),
+        WORKOUT_API_TOKEN=os.getenv("WORKOUT_API_TOKEN", "benchmark"),
+        ADMIN_USER_ID=os.getenv("ADMIN_USER_ID", "1"),
+        SKIP_API_KEY_CHECK="1",
+        TELEGRAM_API_URL=url,
+    )
+    with tempfile.TemporaryDirectory() as data_dir:
+        env["DATA_DIR"] = data_dir
+        started_at = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "bot.py", cwd=ROOT_DIR, env=env,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            await asyncio.wait_for(server.first_reply.wait(), timeout)
+            return server.first_reply_at - started_at
+        finally:
+            process.terminate()
+            await process.wait()
+            await server.stop()
+
+
+async def main(runs: int, timeout: float) -> None:
+    results = []
+    for run in range(runs):
+        elapsed = await measure_once(timeout)
+        results.append(elapsed)
+        print(f"run {run + 1}: {elapsed * 1000:.0f} ms")
+    print(f"min {min(results) * 1000:.0f} ms, median {statistics.median(results) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, args.timeout))
@@ -0,0 +1,123 @@
+import json
+import os
+import sqlite3
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import ACTIVITY_DB_PATH
+from src.logger import get_logger
+from src.translations import RESOURCES_DIR, normalize_text
+
+logger = get_logger()
+
+BUNDLED_ACTIVITIES_PATH = os.path.join(RESOURCES_DIR, "activities.json")
+
+# api-ninjas по умолчанию считает калории для человека весом 160 фунтов,
+# этот же вес используется, если вес пользователя неизвестен
+REFERENCE_WEIGHT_KG = 72.6
+
+
+class ActivityCatalog:
+    """Каталог активностей с MET-коэффициентами.
+
+    Калории за час считаются как MET * вес (кг), поэтому результат зависит от веса
+    пользователя. Все поиски идут по словарям в памяти; ответы api-ninjas для
+    неизвестных активностей сохраняются в SQLite (в отдельном потоке) и подгружаются при старте."""
+
+    def __init__(self, path: str = BUNDLED_ACTIVITIES_PATH, db_path: str = ACTIVITY_DB_PATH) -> None:
+        self.db_path: str = db_path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._activities: Dict[str, Dict[str, Any]] = {}
+        self._remote_loaded: bool = False
+        # запись идет через один поток со своим соединением, чтобы commit не блокировал event loop
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._writer: Optional[sqlite3.Connection] = None
+
+        with open(path, encoding="utf-8") as f:
+            for activity in json.load(f):
+                self._register(activity)
+
+    def _register(self, activity: Dict[str, Any]) -> None:
+        for name in [activity["name"], activity.get("name_en"), *activity.get("aliases", [])]:
+            if name:
+                self._activities.setdefault(normalize_text(name), activity)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if self.db_path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS remote_activities ("
+                "query TEXT PRIMARY KEY, name TEXT NOT NULL, met REAL NOT NULL)"
+            )
+        return self._connection
+
+    def _load_remote(self) -> None:
+        # сохраненные ответы api подгружаем в память один раз
+        if self._remote_loaded:
+            return
+        for query, name, met in self.connection.execute("SELECT query, name, met FROM remote_activities"):
+            self._register({"name": name, "met": met, "high_intensity": False, "aliases": [query]})
+        self._remote_loaded = True
+
+    def lookup(self, name: str) -> Optional[Dict[str, Any]]:
+        self._load_remote()
+        return self._activities.get(normalize_text(name))
+
+    def add_remote(self, query: str, name: str, calories_per_hour: float) -> Dict[str, Any]:
+        """Сохраняет ответ api (калории за час для веса по умолчанию) в виде MET"""
+        self._load_remote()
+        activity = {
+            "name": name,
+            "met": calories_per_hour / REFERENCE_WEIGHT_KG,
+            "high_intensity": False,
+            "aliases": [query],
+        }
+        self._register(activity)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="activities-writer")
+        self._executor.submit(self._write, (normalize_text(query), name, activity["met"])).add_done_callback(
+            self._log_write_error
+        )
+        return activity
+
+    def _write(self, row: Tuple[str, str, float]) -> None:
+        if self._writer is None:
+            self._writer = sqlite3.connect(self.db_path)
+        with self._writer:
+            self._writer.execute("INSERT OR REPLACE INTO remote_activities (query, name, met) VALUES (?, ?, ?)", row)
+
+    @staticmethod
+    def _log_write_error(future: Future) -> None:
+        # активность остается в памяти, после перезапуска она будет запрошена в api заново
+        if future.exception() is not None:
+            logger.error(f"Не удалось сохранить активность: {future.exception()!r}")
+
+    def _close_writer(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    @staticmethod
+    def calories_per_hour(activity: Dict[str, Any], weight: Optional[float] = None) -> float:
+        return activity["met"] * (weight or REFERENCE_WEIGHT_KG)
+
+    def high_intensive_activities(self) -> List[str]:
+        """Названия и синонимы всех высокоинтенсивных активностей"""
+        return [name for name, activity in self._activities.items() if activity.get("high_intensity")]
+
+    def close(self) -> None:
+        if self._executor is not None:
+            # дожидаемся записи активностей, отправленных в поток
+            self._executor.submit(self._close_writer)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+activity_catalog = ActivityCatalog()
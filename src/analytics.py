@@ -0,0 +1,212 @@
+import sqlite3
+from datetime import date, timedelta
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+# модуль выполняется в отдельном процессе, поэтому не импортирует ничего из бота
+
+# флаги дня, упакованные вместе с номером дня в одно число: день * 16 + флаги
+WATER_KNOWN, WATER_MET, CALORIES_KNOWN, CALORIES_MET = 1, 2, 4, 8
+PACKED_DAY = (
+    "(CAST(julianday(day) AS INTEGER) - :since_jd) * 16"
+    " + (water_goal IS NOT NULL)"
+    " + 2 * IFNULL(logged_water >= water_goal + additional_water, 0)"
+    # норма калорий считается выполненной, если за день что-то записано и баланс не превышен
+    " + 4 * (calorie_goal IS NOT NULL AND logged_calories > 0)"
+    " + 8 * IFNULL(logged_calories > 0 AND logged_calories - burned_calories <= calorie_goal, 0)"
+)
+# julianday(день) - date.toordinal(день) после отбрасывания дробной части
+JULIAN_DAY_OFFSET = 1721424
+# строк daily_stats за один запрос: ограничивает размер строки group_concat
+CHUNK_ROWS = 1_000_000
+MOVING_AVERAGE_DAYS = 7
+TOP_CITIES = 10
+
+
+def load_daily_stats(connection: sqlite3.Connection, since: date,
+                     until: date) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """user_id, номер дня от since и флаги выполнения норм для строк daily_stats за [since, until],
+    отсортированные по (user_id, день). Дни после until (например, при расхождении часов) не попадают
+    в отчет, иначе номера дней вышли бы за пределы периода.
+
+    Построчное чтение через курсор создает python-объект на каждое значение и на миллионах строк
+    занимает большую часть времени отчета, поэтому sqlite склеивает колонку в одну строку
+    (group_concat), а numpy разбирает ее целиком"""
+    (max_rowid,) = connection.execute("SELECT IFNULL(max(rowid), 0) FROM daily_stats").fetchone()
+    user_ids, packed = [], []
+    for first in range(0, max_rowid, CHUNK_ROWS):
+        chunk_users, chunk_packed = connection.execute(
+            f"SELECT group_concat(user_id), group_concat({PACKED_DAY}) FROM daily_stats "
+            "WHERE rowid > :first AND rowid <= :last AND day >= :since AND day <= :until",
+            {"first": first, "last": first + CHUNK_ROWS, "since": since.isoformat(), "until": until.isoformat(),
+             "since_jd": since.toordinal() + JULIAN_DAY_OFFSET},
+        ).fetchone()
+        if chunk_users:
+            user_ids.append(np.fromstring(chunk_users, dtype="i8", sep=","))
+            packed.append(np.fromstring(chunk_packed, dtype="i8", sep=","))
+    if not user_ids:
+        return np.empty(0, dtype="i8"), np.empty(0, dtype="i8"), np.empty(0, dtype="i8")
+
+    user_ids, packed = np.concatenate(user_ids), np.concatenate(packed)
+    order = np.lexsort((packed, user_ids))
+    user_ids, packed = user_ids[order], packed[order]
+    return user_ids, packed >> 4, packed & 15
+
+
+def load_cities(connection: sqlite3.Connection):
+    """user_id профилей по возрастанию, код города каждого профиля и названия городов"""
+    rows = connection.execute("SELECT user_id, IFNULL(city, '') FROM profiles ORDER BY user_id").fetchall()
+    user_ids = np.fromiter((row[0] for row in rows), dtype="i8", count=len(rows))
+    names, codes = np.unique(np.array([row[1] for row in rows], dtype=object), return_inverse=True)
+    return user_ids, codes, names
+
+
+def streaks(user_ids: np.ndarray, days: np.ndarray, met: np.ndarray, today: int) -> Dict[str, Any]:
+    """Серии дней подряд с выполненной нормой: самая длинная у каждого пользователя и текущие серии"""
+    continues = np.zeros(len(met), dtype=bool)
+    continues[1:] = (user_ids[1:] == user_ids[:-1]) & (days[1:] - days[:-1] == 1) & met[:-1] & met[1:]
+    run_start = met & ~continues
+    if not run_start.any():
+        return {"users": 0, "median_longest": 0, "max_longest": 0, "active": 0, "mean_active": 0.0}
+
+    run_ids = np.cumsum(run_start)[met] - 1
+    lengths = np.bincount(run_ids)
+    run_users = user_ids[run_start]
+    _, first_run = np.unique(run_users, return_index=True)
+    longest = np.maximum.reduceat(lengths, first_run)
+
+    run_end = met.copy()
+    run_end[:-1] &= ~continues[1:]
+    # серия текущая, если продолжается сегодня или закончилась вчера (сегодня еще не записано)
+    active = lengths[days[run_end] >= today - 1]
+    return {
+        "users": int(len(longest)),
+        "median_longest": float(np.median(longest)),
+        "max_longest": int(longest.max()),
+        "active": int(len(active)),
+        "mean_active": float(active.mean()) if len(active) else 0.0,
+    }
+
+
+def moving_average(values: np.ndarray, window: int = MOVING_AVERAGE_DAYS) -> np.ndarray:
+    if len(values) < window:
+        return np.array([values.mean()]) if len(values) else values
+    return np.convolve(values, np.ones(window) / window, mode="valid")
+
+
+def build_report(db_path: str, days: int, today: date) -> Dict[str, Any]:
+    """Статистика выполнения норм по всем пользователям за последние days дней.
+
+    Все вычисления - векторные проходы numpy по строкам daily_stats, без циклов по пользователям"""
+    since = today - timedelta(days=days - 1)
+    connection = sqlite3.connect(db_path)
+    try:
+        user_ids, day, flags = load_daily_stats(connection, since, today)
+        profile_ids, city_codes, city_names = load_cities(connection)
+    finally:
+        connection.close()
+
+    report: Dict[str, Any] = {"days": days, "since": since.isoformat(), "profiles": int(len(profile_ids)),
+                              "rows": int(len(user_ids))}
+    if not len(user_ids):
+        return report
+
+    water_known = (flags & WATER_KNOWN) > 0
+    water_met = (flags & WATER_MET) > 0
+    calories_known = (flags & CALORIES_KNOWN) > 0
+    calories_met = (flags & CALORIES_MET) > 0
+
+    active_users, first_row = np.unique(user_ids, return_index=True)
+    user_water_known = np.add.reduceat(water_known.astype("i4"), first_row)
+    user_water_rate = np.add.reduceat(water_met.astype("i4"), first_row) / np.maximum(user_water_known, 1)
+
+    report.update(
+        active_users=int(len(active_users)),
+        water_days_rate=float(water_met.sum() / max(water_known.sum(), 1)),
+        calorie_days_rate=float(calories_met.sum() / max(calories_known.sum(), 1)),
+        median_user_water_rate=float(np.median(user_water_rate[user_water_known > 0]))
+        if (user_water_known > 0).any() else 0.0,
+        water_streaks=streaks(user_ids, day, water_met, days - 1),
+        calorie_streaks=streaks(user_ids, day, calories_met, days - 1),
+    )
+
+    # показатели по каждому дню периода, затем скользящее среднее за неделю
+    rows_per_day = np.bincount(day, minlength=days).astype(float)
+    daily = {
+        "active_users": rows_per_day,
+        "water_rate": np.bincount(day, weights=water_met, minlength=days)
+        / np.maximum(np.bincount(day, weights=water_known, minlength=days), 1),
+        "calorie_rate": np.bincount(day, weights=calories_met, minlength=days)
+        / np.maximum(np.bincount(day, weights=calories_known, minlength=days), 1),
+    }
+    report["moving_average"] = {}
+    for name, values in daily.items():
+        averaged = moving_average(values)
+        previous = averaged[-1 - MOVING_AVERAGE_DAYS] if len(averaged) > MOVING_AVERAGE_DAYS else None
+        report["moving_average"][name] = (float(averaged[-1]), None if previous is None else float(previous))
+
+    # города: пользователь -> код города через поиск по отсортированным user_id профилей,
+    # пользователи без профиля получают отдельный код len(city_names)
+    user_cities = np.full(len(active_users), len(city_names))
+    if len(profile_ids):
+        positions = np.minimum(np.searchsorted(profile_ids, active_users), len(profile_ids) - 1)
+        found = profile_ids[positions] == active_users
+        user_cities[found] = city_codes[positions[found]]
+    row_cities = np.repeat(user_cities, np.diff(np.append(first_row, len(user_ids))))
+    city_count = len(city_names) + 1
+    profiles_by_city = np.bincount(city_codes, minlength=city_count)
+    active_by_city = np.bincount(user_cities, minlength=city_count)
+    met_by_city = np.bincount(row_cities, weights=water_met, minlength=city_count)
+    known_by_city = np.bincount(row_cities, weights=water_known, minlength=city_count)
+    report["cities"] = [
+        {
+            "city": city_names[code] if code < len(city_names) else "",
+            "users": int(profiles_by_city[code]),
+            "active_users": int(active_by_city[code]),
+            "water_days_rate": float(met_by_city[code] / max(known_by_city[code], 1)),
+        }
+        for code in np.argsort(-profiles_by_city, kind="stable")[:TOP_CITIES]
+        if profiles_by_city[code]
+    ]
+    return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"📈 Отчет за {report['days']} дн. (с {report['since']})",
+        "",
+        f"Профилей: {report['profiles']}, активных пользователей: {report.get('active_users', 0)}, "
+        f"дней со статистикой: {report['rows']}",
+    ]
+    if not report["rows"]:
+        return "\n".join(lines)
+
+    lines += [
+        "",
+        "Выполнение норм:",
+        f"- Вода: {report['water_days_rate']:.1%} дней (медиана по пользователям {report['median_user_water_rate']:.1%})",
+        f"- Калории: {report['calorie_days_rate']:.1%} дней с записанной едой",
+        "",
+        "Серии дней с выполненной нормой:",
+    ]
+    for title, key in (("Вода", "water_streaks"), ("Калории", "calorie_streaks")):
+        s = report[key]
+        lines.append(
+            f"- {title}: медиана самой длинной {s['median_longest']:g}, максимум {s['max_longest']}, "
+            f"текущих серий {s['active']} (в среднем {s['mean_active']:.1f} дн.)"
+        )
+
+    lines += ["", f"Скользящее среднее за {MOVING_AVERAGE_DAYS} дн. (сейчас / неделю назад):"]
+    titles = {"active_users": "Активных пользователей в день", "water_rate": "Выполнили норму воды",
+              "calorie_rate": "Выполнили норму калорий"}
+    for name, (current, previous) in report["moving_average"].items():
+        value_format = "{:.0f}" if name == "active_users" else "{:.1%}"
+        previous_text = "—" if previous is None else value_format.format(previous)
+        lines.append(f"- {titles[name]}: {value_format.format(current)} / {previous_text}")
+
+    lines += ["", "Города (пользователей / активных / дней с нормой воды):"]
+    for city in report["cities"]:
+        lines.append(f"- {city['city'] or 'не указан'}: {city['users']} / {city['active_users']} / "
+                     f"{city['water_days_rate']:.1%}")
+    return "\n".join(lines)
@@ -1,122 +1,357 @@
+import asyncio
+import time
 import aiohttp
-import requests
-from typing import Dict, Any, Optional
-from googletrans import Translator
-from requests import RequestException
+from typing import Dict, Any, List, Optional, Tuple
+from src.cache import TTLCache
+from src.activities import ActivityCatalog, activity_catalog
+from src.config import (
+    WEATHER_CACHE_SIZE,
+    WEATHER_CACHE_TTL,
+    OPENWEATHERMAP_URL,
+    OPENFOODFACTS_URL,
+    API_NINJAS_URL,
+    HEDGE_DELAY,
+    PRODUCT_LOOKUP_CONCURRENCY,
+)
+from src.metrics import upstream_duration, upstream_responses, cache_requests
+from src.nutrition import NutritionIndex, nutrition_index
+from src.ratelimit import limiters, UpstreamBusyError, OPENWEATHERMAP, OPENFOODFACTS, API_NINJAS, TRANSLATE
+from src.resilience import breakers, timeouts, hedged, CircuitOpenError
+from src.sessions import sessions, get_session, get_translator
+from src.translations import translation_cache, normalize_text
+
+# общий для всех экземпляров WeatherApiClient кэш погоды по городам
+weather_cache = TTLCache(maxsize=WEATHER_CACHE_SIZE, ttl=WEATHER_CACHE_TTL)
+# последняя полученная погода по городам без срока жизни: отдается, когда api недоступен
+last_known_weather = TTLCache(maxsize=WEATHER_CACHE_SIZE, ttl=None)
+
+# ошибки, при которых api считается недоступным
+UPSTREAM_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError)
+
+
+def normalize_city(city: str) -> str:
+    return " ".join(city.split()).lower()
+
+
+class InvalidApiKeyError(Exception):
+    pass
+
+
+async def get_json(
+        upstream: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+) -> Tuple[int, Any]:
+    """GET-запрос к внешнему api с ограничением частоты, таймаутом и circuit breaker.
+
+    Возвращает статус и разобранный JSON (None, если тело не JSON). Ответы 5xx и 429,
+    таймауты и ошибки соединения считаются отказом api и выбрасываются дальше."""
+    breaker = breakers[upstream]
+    try:
+        breaker.before_request()
+    except CircuitOpenError:
+        upstream_responses.inc(upstream, "circuit_open")
+        raise
+
+    async def attempt() -> Tuple[int, Any]:
+        session = get_session()
+        timeout = aiohttp.ClientTimeout(total=timeouts[upstream])
+        async with session.get(url, params=params, headers=headers, timeout=timeout) as response:
+            if response.status >= 500 or response.status == 429:
+                response.raise_for_status()
+            try:
+                data = await response.json(content_type=None)
+            except ValueError:
+                data = None
+            return response.status, data
+
+    try:
+        await limiters[upstream].acquire()
+        started_at = time.perf_counter()
+        if HEDGE_DELAY > 0:
+            # повторный запрос отправляется, только если для него есть свободный токен
+            result = await hedged(attempt, HEDGE_DELAY, can_hedge=limiters[upstream].try_acquire)
+        else:
+            result = await attempt()
+    except aiohttp.ClientResponseError as e:
+        breaker.record_failure()
+        _record_upstream(upstream, str(e.status), started_at)
+        raise
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        breaker.record_failure()
+        _record_upstream(upstream, "timeout" if isinstance(e, asyncio.TimeoutError) else "error", started_at)
+        raise
+    except UpstreamBusyError:
+        breaker.release()
+        upstream_responses.inc(upstream, "busy")
+        raise
+    except BaseException:
+        # запрос не состоялся (отмена) - это не отказ api
+        breaker.release()
+        raise
+    breaker.record_success()
+    _record_upstream(upstream, str(result[0]), started_at)
+    return result
+
+
+def _record_upstream(upstream: str, status: str, started_at: float) -> None:
+    upstream_duration.observe(time.perf_counter() - started_at, upstream)
+    upstream_responses.inc(upstream, status)
 
 
 class WeatherApiClient:
-    def __init__(self, api_key: str) -> None:
+    def __init__(self, api_key: str, cache: Optional[TTLCache] = None) -> None:
         self.api_key: str = api_key
-        self.base_url: str = "http://api.openweathermap.org/data/2.5/weather"
-        self.check_key()
+        self.base_url: str = OPENWEATHERMAP_URL
+        self.cache: TTLCache = cache if cache is not None else weather_cache
 
-    def check_key(self) -> bool:
+    async def check_key(self) -> None:
         try:
-            response = requests.get(f"{self.base_url}?q=London&appid={self.api_key}")
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            raise RequestException("Not valid API key")
+            status, _ = await get_json(OPENWEATHERMAP, self.base_url, params={"q": "London", "appid": self.api_key})
+        except UPSTREAM_ERRORS as e:
+            raise InvalidApiKeyError("Not valid API key") from e
+        if status != 200:
+            raise InvalidApiKeyError("Not valid API key")
 
     async def get_weather_async(self, city: str) -> Dict[str, Any]:
+        # одновременные запросы погоды для одного города склеиваются в один,
+        # ошибки в кэш не попадают
+        return await self.cache.get_or_load(
+            normalize_city(city),
+            lambda: self._fetch_weather(city),
+            should_cache=lambda data: "error" not in data,
+        )
+
+    def _params(self, city: str) -> Dict[str, str]:
+        return {"q": city, "appid": self.api_key, "units": "metric", "lang": "ru"}
+
+    async def _fetch_weather(self, city: str) -> Dict[str, Any]:
+        # при перегрузке api выбрасывается UpstreamBusyError, его обрабатывает вызывающий код
+        key = normalize_city(city)
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.base_url}?q={city}&appid={self.api_key}&units=metric&lang=ru") as response:
-                    response.raise_for_status()
-                    return await response.json()
-        except aiohttp.ClientError as e:
-            return {"error": str(e)}
+            status, data = await get_json(OPENWEATHERMAP, self.base_url, params=self._params(city))
+        except UPSTREAM_ERRORS as e:
+            # api недоступен - отдаем последнюю известную погоду, если она есть
+            stale = last_known_weather.get(key)
+            return stale if stale is not None else {"error": str(e) or type(e).__name__}
+        if status != 200 or not isinstance(data, dict):
+            return {"error": f"HTTP {status}"}
+        last_known_weather.set(key, data)
+        return data
 
     async def is_city_exists(self, city: str) -> bool:
+        # если погода для города уже есть в кэше, то город точно существует
+        key = normalize_city(city)
+        if key in self.cache:
+            return False
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                        f"{self.base_url}?q={city}&appid={self.api_key}&units=metric&lang=ru") as response:
-                    await response.text()
-                    return response.status == 404
-        except aiohttp.ClientError:
+            status, data = await get_json(OPENWEATHERMAP, self.base_url, params=self._params(city))
+        except UPSTREAM_ERRORS:
             return False
+        if status == 200 and isinstance(data, dict):
+            # ответ сразу кладем в кэш, он понадобится при расчете норм
+            self.cache.set(key, data)
+            last_known_weather.set(key, data)
+        return status == 404
 
 
 class ProductsApiClient:
+    def __init__(self, index: Optional[NutritionIndex] = None) -> None:
+        self.index: NutritionIndex = index if index is not None else nutrition_index
+        self.base_url: str = OPENFOODFACTS_URL
+
     async def get_product_info(self, product: str) -> Optional[Dict[str, Any]]:
-        # api лучше работает на английском, поэтому перед запросом переводим название упражнения
-        product_name = await translate(product)
-        url = f"https://world.openfoodfacts.org/cgi/search.pl?action=process&search_terms={product_name}&json=true"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                try:
-                    data = await response.json()
-                    products = data.get('products', [])
-                    if products:  # Проверяем, есть ли найденные продукты
-                        first_product = products[0]
-                        return {
-                            'name': first_product.get('product_name', 'Неизвестно'),
-                            'calories': first_product.get('nutriments', {}).get('energy-kcal_100g', 0)
-                        }
-                    return None
-                except aiohttp.ClientError as e:
-                    return {"error": str(e)}
+        return (await self.get_products_info([product]))[0]
+
+    async def get_products_info(self, products: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Поиск нескольких продуктов: сначала в локальном индексе, ненайденные названия
+        переводятся одним запросом, OpenFoodFacts опрашивается параллельно (не более
+        PRODUCT_LOOKUP_CONCURRENCY запросов одновременно)"""
+        found: Dict[str, Optional[Dict[str, Any]]] = {}
+        for product in dict.fromkeys(products):
+            found[product] = self.index.lookup(product)
+
+        missing = [product for product, info in found.items() if not info]
+        cache_requests.inc("nutrition", "hit", amount=len(found) - len(missing))
+        if missing:
+            # api лучше работает на английском, поэтому перед запросом переводим названия
+            translated = dict(zip(missing, await translate_many(missing)))
+            remote = []
+            for product in missing:
+                found[product] = self.index.lookup(translated[product])
+                if found[product]:
+                    cache_requests.inc("nutrition", "hit")
+                else:
+                    cache_requests.inc("nutrition", "miss")
+                    remote.append(product)
+
+            semaphore = asyncio.Semaphore(PRODUCT_LOOKUP_CONCURRENCY)
+
+            async def search(product: str) -> Optional[Dict[str, Any]]:
+                async with semaphore:
+                    return await self._search_remote(translated[product])
+
+            for product, product_info in zip(remote, await asyncio.gather(*(search(p) for p in remote))):
+                if product_info and "error" not in product_info and product_info['calories']:
+                    # найденный продукт дописываем в индекс, чтобы в следующий раз не ходить в api
+                    self.index.add(product, translated[product], product_info['calories'], source="openfoodfacts")
+                found[product] = product_info
+
+        return [found[product] for product in products]
+
+    async def _search_remote(self, product_name: str) -> Optional[Dict[str, Any]]:
+        params = {"action": "process", "search_terms": product_name, "json": "true"}
+        try:
+            _, data = await get_json(OPENFOODFACTS, self.base_url, params=params)
+        except UPSTREAM_ERRORS as e:
+            return {"error": str(e) or type(e).__name__}
+        products = data.get('products', []) if isinstance(data, dict) else []
+        if products:  # Проверяем, есть ли найденные продукты
+            first_product = products[0]
+            return {
+                'name': first_product.get('product_name', 'Неизвестно'),
+                'calories': first_product.get('nutriments', {}).get('energy-kcal_100g', 0)
+            }
+        return None
 
 
 class WorkoutApiClient:
-    def __init__(self, api_key: str) -> None:
+    def __init__(self, api_key: str, catalog: Optional[ActivityCatalog] = None) -> None:
         self.api_key: str = api_key
-        self.check_key()
+        self.catalog: ActivityCatalog = catalog if catalog is not None else activity_catalog
+        self.base_url: str = API_NINJAS_URL
+
+    async def check_key(self) -> None:
+        try:
+            status, _ = await get_json(
+                API_NINJAS, self.base_url, params={"activity": "running"}, headers={'X-Api-Key': self.api_key}
+            )
+        except UPSTREAM_ERRORS as e:
+            raise InvalidApiKeyError("Not valid API key") from e
+        if status != 200:
+            raise InvalidApiKeyError("Not valid API key")
 
-    def check_key(self) -> bool:
+    async def get_exercise_info(self, exercise_name: str, weight: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        # сначала ищем активность в локальном каталоге, api - только для неизвестных активностей
+        activity = self.catalog.lookup(exercise_name)
+        if activity is None:
+            # данное api работает только с английским языком, поэтмоу переводим
+            # название упражнения перед запросом
+            exercise = await translate(exercise_name)
+            activity = self.catalog.lookup(exercise)
+
+        if activity is not None:
+            cache_requests.inc("activities", "hit")
+        else:
+            cache_requests.inc("activities", "miss")
+            exercise_info = await self._search_remote(exercise)
+            if not exercise_info or "error" in exercise_info or not exercise_info['calories']:
+                return exercise_info
+            activity = self.catalog.add_remote(exercise_name, exercise_info['name'], exercise_info['calories'])
+
+        return {
+            'name': activity['name'],
+            'calories': self.catalog.calories_per_hour(activity, weight)
+        }
+
+    async def _search_remote(self, exercise: str) -> Optional[Dict[str, Any]]:
         try:
-            response = requests.get(
-                f"https://api.api-ninjas.com/v1/caloriesburned?activity=running",
-                headers={'X-Api-Key': self.api_key}
+            status, data = await get_json(
+                API_NINJAS, self.base_url, params={"activity": exercise}, headers={'X-Api-Key': self.api_key}
             )
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            raise RequestException("Not valid API key")
-
-    async def get_exercise_info(self, exercise_name: str) -> Optional[Dict[str, Any]]:
-        # данное api работает только с английским языком, поэтмоу переводим
-        # название упражнения перед запросом
-        exercise = await translate(exercise_name)
-        url = f"https://api.api-ninjas.com/v1/caloriesburned?activity={exercise}"
-        async with aiohttp.ClientSession(headers={'X-Api-Key': self.api_key}) as session:
-            async with session.get(url) as response:
-                try:
-                    data = await response.json()
-                    response.raise_for_status()
-                    if data:
-                        first_exercise = data[0]
-                        return {
-                            'name': first_exercise.get('name', 'Неизвестно'),
-                            'calories': first_exercise.get('calories_per_hour', 0)
-                        }
-                    return None
-                except aiohttp.ClientError as e:
-                    return {"error": str(e)}
+        except UPSTREAM_ERRORS as e:
+            return {"error": str(e) or type(e).__name__}
+        if status != 200:
+            return {"error": f"HTTP {status}"}
+        if data:
+            first_exercise = data[0]
+            return {
+                'name': first_exercise.get('name', 'Неизвестно'),
+                'calories': first_exercise.get('calories_per_hour', 0)
+            }
+        return None
 
 
 async def translate(text: str, destination='en') -> str:
     """Метод для перевода текста"""
-    async with Translator() as translator:
-        translation = await translator.translate(text, dest=destination)
-        return translation.text
+    return (await translate_many([text], destination))[0]
+
+
+async def translate_many(texts: List[str], destination='en') -> List[str]:
+    """Метод для перевода нескольких текстов: сначала ищем в кэше,
+    все ненайденное переводим одним запросом к сервису перевода"""
+    found = translation_cache.get_many(texts, destination)
+    missing = list(dict.fromkeys(normalize_text(text) for text in texts if normalize_text(text) not in found))
+    cache_requests.inc("translation", "hit", amount=len(texts) - len(missing))
+    if missing:
+        cache_requests.inc("translation", "miss", amount=len(missing))
+        breaker = breakers[TRANSLATE]
+        started_at = time.perf_counter()
+        try:
+            breaker.before_request()
+            translated = await _translate_upstream(missing, destination)
+        except CircuitOpenError:
+            upstream_responses.inc(TRANSLATE, "circuit_open")
+            translated = None
+        except (UpstreamBusyError, asyncio.CancelledError):
+            breaker.release()
+            raise
+        except Exception:
+            # googletrans может упасть на чем угодно (сеть, разбор ответа), перевод не критичен
+            breaker.record_failure()
+            _record_upstream(TRANSLATE, "error", started_at)
+            translated = None
+        else:
+            breaker.record_success()
+            _record_upstream(TRANSLATE, "200", started_at)
+
+        if translated is None:
+            # сервис перевода недоступен - ищем по исходному тексту и ничего не кэшируем
+            found.update((text, text) for text in missing)
+        else:
+            translation_cache.set_many(dict(zip(missing, translated)), destination)
+            found.update(zip(missing, translated))
+    return [found[normalize_text(text)] for text in texts]
+
+
+async def _translate_upstream(texts: List[str], destination: str) -> List[str]:
+    translator = get_translator()
+    timeout = timeouts[TRANSLATE]
+    await limiters[TRANSLATE].acquire()
+    if len(texts) == 1:
+        translation = await asyncio.wait_for(translator.translate(texts[0], dest=destination), timeout)
+        return [translation.text]
+
+    # несколько терминов отправляем одним запросом, по одному на строку
+    translation = await asyncio.wait_for(translator.translate("\n".join(texts), dest=destination), timeout)
+    lines = translation.text.split("\n")
+    if len(lines) == len(texts):
+        return [line.strip() for line in lines]
+
+    # если сервис склеил или разбил строки, переводим по отдельности
+    await limiters[TRANSLATE].acquire()
+    translations = await asyncio.wait_for(translator.translate(texts, dest=destination), timeout)
+    return [t.text for t in translations]
 
 
 def test_weather_api_client(api_key: str, city: str) -> None:
     weather_client = WeatherApiClient(api_key=api_key)
 
-    try:
-        weather_client.check_key()
-        print("API key is valid.")
-    except Exception as e:
-        print(f"API key validation failed: {e}")
-
     async def test_get_weather():
+        try:
+            await weather_client.check_key()
+            print("API key is valid.")
+        except Exception as e:
+            print(f"API key validation failed: {e}")
+
         result = await weather_client.get_weather_async(city)
         if "error" in result:
             print(f"Error while fetching weather data: {result['error']}")
         else:
             print(f"Weather data for Moscow: {result}")
+        # сессия привязана к event loop, а каждый тест запускается в своем asyncio.run
+        await sessions.close()
 
     asyncio.run(test_get_weather())
 
@@ -132,6 +367,7 @@ def test_products_api_client(product: str):
             print(f"Error while fetching product data: {result['error']}")
         else:
             print(f"Product information: {result}")
+        await sessions.close()
 
     asyncio.run(test_get_food_info())
 
@@ -146,13 +382,15 @@ def test_exercise_api_client(exercise: str):
             print(f"Error while fetching product data: {result['error']}")
         else:
             print(f"Product information: {result}")
+        await sessions.close()
 
     asyncio.run(test_get_exercise_info())
 
 
 if __name__ == "__main__":
+    # запуск: python -m src.api
     import asyncio
-    from config import OPEN_WEATHER_MAP_TOKEN, WORKOUT_API_TOKEN
+    from src.config import OPEN_WEATHER_MAP_TOKEN, WORKOUT_API_TOKEN
 
     print("Testing WeatherApiClient...")
     test_weather_api_client(OPEN_WEATHER_MAP_TOKEN, "Москва")
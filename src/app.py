@@ -0,0 +1,82 @@
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from src.config import BOT_TOKEN, BOT_MODE, SKIP_API_KEY_CHECK, TELEGRAM_API_URL, SHARD_SOCKET
+from src.clients import validate_api_keys
+from src.fsm_storage import create_fsm_storage
+from src.jobs import process_jobs
+from src.logger import start_logging, stop_logging
+from src.handlers import setup_handlers
+from src.metrics import start_metrics, metrics_server
+from src.middlewares import setup_middleware
+from src.activities import activity_catalog
+from src.nutrition import nutrition_index
+from src.renderer import chart_renderer
+from src.scheduler import norms_scheduler
+from src.sharding import run_shard_worker, run_supervisor
+from src.sessions import sessions
+from src.translations import translation_cache
+from src.user_queues import user_queues
+from src.users import users
+from src.webhook import run_webhook
+
+
+def create_bot() -> Bot:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+    return Bot(token=BOT_TOKEN, session=session)
+
+
+def create_dispatcher() -> Dispatcher:
+    dp = Dispatcher(storage=create_fsm_storage())
+    setup_middleware(dp)
+    setup_handlers(dp)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+
+async def on_startup():
+    await sessions.start()
+    await users.start()
+    chart_renderer.start()
+    process_jobs.start()
+    await norms_scheduler.start()
+    await start_metrics()
+    if not SKIP_API_KEY_CHECK:
+        await validate_api_keys()
+
+
+async def on_shutdown(dispatcher: Dispatcher):
+    await norms_scheduler.close()
+    await metrics_server.close()
+    await user_queues.close()
+    await sessions.close()
+    chart_renderer.shutdown()
+    process_jobs.shutdown()
+    await users.close()
+    await dispatcher.storage.close()
+    translation_cache.close()
+    nutrition_index.close()
+    activity_catalog.close()
+
+
+async def main():
+    print("Бот запущен!")
+    start_logging()
+    try:
+        if BOT_MODE == "supervisor":
+            # несколько процессов-обработчиков, каждый со своей частью пользователей
+            await run_supervisor()
+            return
+
+        bot = create_bot()
+        dp = create_dispatcher()
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot)
+        elif BOT_MODE == "worker":
+            await run_shard_worker(dp, bot, SHARD_SOCKET)
+        else:
+            await dp.start_polling(bot, skip_updates=True)
+    finally:
+        stop_logging()
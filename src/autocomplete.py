@@ -0,0 +1,139 @@
+import bisect
+import heapq
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.config import INLINE_RESULTS_LIMIT, RECENT_PRODUCTS_PER_USER, RECENT_PRODUCTS_USERS
+from src.nutrition import NutritionIndex, nutrition_index
+from src.translations import normalize_text
+
+# сколько совпадений по префиксу рассматривается, прежде чем выбрать лучшие
+MAX_PREFIX_CANDIDATES = 200
+# доля общих триграмм, начиная с которой название считается похожим на запрос (опечатки)
+MIN_TRIGRAM_SIMILARITY = 0.4
+
+
+@dataclass
+class Suggestion:
+    product_id: int
+    name: str
+    calories: float
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductSuggester:
+    """Подсказки продуктов для inline-режима: поиск только в памяти, без запросов к api.
+
+    Названия продуктов из NutritionIndex (русские и английские) хранятся в отсортированном
+    списке для поиска по префиксу (целого названия и каждого слова) и в триграммном индексе
+    для названий с опечатками. Продукты, которые пользователь недавно записывал, поднимаются
+    выше в его выдаче. Индекс строится при первом запросе и дополняется при добавлении
+    продуктов в NutritionIndex."""
+
+    def __init__(self, index: Optional[NutritionIndex] = None) -> None:
+        self.index: NutritionIndex = index if index is not None else nutrition_index
+        self._products: Dict[int, Suggestion] = {}
+        self._by_name: Dict[str, int] = {}
+        self._prefixes: List[Tuple[str, int, bool]] = []
+        self._trigrams: Dict[str, List[int]] = {}
+        self._recent: "OrderedDict[int, OrderedDict[str, int]]" = OrderedDict()
+        self._built: bool = False
+
+    def _build(self) -> None:
+        self._built = True
+        for row in self.index.iter_products():
+            self.add(*row)
+        self.index.subscribe(self.add)
+
+    def add(self, product_id: int, name_ru: Optional[str], name_en: Optional[str], calories: float) -> None:
+        key = name_ru or name_en
+        # продукт с тем же названием заменяется: старая запись удаляется лениво при поиске
+        previous = self._by_name.get(key)
+        if previous is not None:
+            self._products.pop(previous, None)
+        self._by_name[key] = product_id
+        self._products[product_id] = Suggestion(product_id, key.capitalize(), calories)
+
+        product_trigrams = set()
+        for name in filter(None, (name_ru, name_en)):
+            words = name.split()
+            for i in range(len(words)):
+                # (хвост названия с i-го слова, id, начало ли это всего названия)
+                bisect.insort(self._prefixes, (" ".join(words[i:]), product_id, i == 0))
+            product_trigrams |= trigrams(name)
+        # id попадает в список триграммы один раз, даже если она есть в обоих названиях
+        for trigram in product_trigrams:
+            self._trigrams.setdefault(trigram, []).append(product_id)
+
+    def get(self, product_id: int) -> Optional[Suggestion]:
+        if not self._built:
+            self._build()
+        return self._products.get(product_id)
+
+    def remember(self, user_id: int, name: str) -> None:
+        """Запоминает продукт, записанный пользователем, для поднятия в его подсказках"""
+        key = normalize_text(name)
+        recent = self._recent.pop(user_id, None) or OrderedDict()
+        recent[key] = recent.pop(key, 0) + 1
+        while len(recent) > RECENT_PRODUCTS_PER_USER:
+            recent.popitem(last=False)
+        self._recent[user_id] = recent
+        while len(self._recent) > RECENT_PRODUCTS_USERS:
+            self._recent.popitem(last=False)
+
+    def _recency_boost(self, user_id: int) -> Dict[int, float]:
+        recent = self._recent.get(user_id)
+        if not recent:
+            return {}
+        boost = {}
+        for position, (name, count) in enumerate(reversed(recent.items())):
+            product_id = self._by_name.get(name)
+            if product_id is not None:
+                # чем чаще и недавнее продукт записывался, тем выше он в выдаче
+                boost[product_id] = 1.0 + min(count, 5) * 0.2 - position * 0.02
+        return boost
+
+    def search(self, query: str, user_id: int, limit: int = INLINE_RESULTS_LIMIT) -> List[Suggestion]:
+        if not self._built:
+            self._build()
+        query = normalize_text(query)
+        boost = self._recency_boost(user_id)
+        scores: Dict[int, float] = {}
+
+        if not query:
+            scores = dict(boost)
+        else:
+            start = bisect.bisect_left(self._prefixes, (query,))
+            for name, product_id, whole in self._prefixes[start:start + MAX_PREFIX_CANDIDATES]:
+                if not name.startswith(query):
+                    break
+                # совпадение с началом названия важнее совпадения с началом слова
+                scores[product_id] = max(scores.get(product_id, 0.0), 3.0 if whole else 2.0)
+
+            if len(query) >= 3:
+                query_trigrams = trigrams(query)
+                shared = Counter()
+                for trigram in query_trigrams:
+                    shared.update(self._trigrams.get(trigram, ()))
+                for product_id, count in shared.items():
+                    similarity = count / len(query_trigrams)
+                    if similarity >= MIN_TRIGRAM_SIMILARITY:
+                        scores[product_id] = max(scores.get(product_id, 0.0), 1.5 * similarity)
+
+            for product_id in scores:
+                scores[product_id] += boost.get(product_id, 0.0)
+
+        best = heapq.nlargest(
+            limit,
+            ((score, -len(self._products[product_id].name), product_id)
+             for product_id, score in scores.items() if product_id in self._products),
+        )
+        return [self._products[product_id] for _, _, product_id in best]
+
+
+product_suggester = ProductSuggester()
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU-кэш с ограничением по размеру и временем жизни записей.
+
+    Помимо обычных get/set умеет склеивать одновременные промахи по одному ключу:
+    если значение уже загружается, остальные вызовы get_or_load ждут тот же запрос,
+    а не делают свой."""
+
+    def __init__(self, maxsize: int, ttl: Optional[float]) -> None:
+        self.maxsize: int = maxsize
+        self.ttl: Optional[float] = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.coalesced: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key) is not _MISSING
+
+    def _lookup(self, key: Hashable) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return _MISSING
+        expires_at, value = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    async def get_or_load(
+            self,
+            key: Hashable,
+            loader: Callable[[], Awaitable[Any]],
+            should_cache: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(loader())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._on_loaded(key, t, should_cache))
+
+        # shield, чтобы отмена одного из ожидающих не отменяла запрос для остальных
+        return await asyncio.shield(task)
+
+    def _on_loaded(self, key: Hashable, task: asyncio.Task, should_cache: Callable[[Any], bool]) -> None:
+        self._in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        value = task.result()
+        if should_cache(value):
+            self.set(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        requests_count = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "in_flight": len(self._in_flight),
+            "hit_rate": self.hits / requests_count if requests_count else 0.0,
+        }
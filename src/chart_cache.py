@@ -0,0 +1,51 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable, Optional
+
+from src.config import CHART_CACHE_MAX_BYTES
+
+
+@dataclass
+class CachedChart:
+    version: Hashable
+    png: bytes
+    file_id: Optional[str] = None
+
+
+class ChartCache:
+    """LRU-кэш построенных графиков с ограничением по суммарному размеру PNG.
+
+    Для каждого (пользователь, график) хранится только последняя версия: картинка
+    и file_id, который вернул Telegram после первой отправки. Повторный запрос при
+    неизменившейся статистике отправляется по file_id, без рендера и загрузки."""
+
+    def __init__(self, max_bytes: int = CHART_CACHE_MAX_BYTES) -> None:
+        self.max_bytes: int = max_bytes
+        self.size_bytes: int = 0
+        self._charts: "OrderedDict[tuple, CachedChart]" = OrderedDict()
+
+    def get(self, user_id: int, kind: str, version: Hashable) -> Optional[CachedChart]:
+        chart = self._charts.get((user_id, kind))
+        if chart is None or chart.version != version:
+            return None
+        self._charts.move_to_end((user_id, kind))
+        return chart
+
+    def set(self, user_id: int, kind: str, version: Hashable, png: bytes, file_id: Optional[str] = None) -> None:
+        self.discard(user_id, kind)
+        self._charts[(user_id, kind)] = CachedChart(version, png, file_id)
+        self.size_bytes += len(png)
+        while self.size_bytes > self.max_bytes and self._charts:
+            _, evicted = self._charts.popitem(last=False)
+            self.size_bytes -= len(evicted.png)
+
+    def discard(self, user_id: int, kind: str) -> None:
+        chart = self._charts.pop((user_id, kind), None)
+        if chart is not None:
+            self.size_bytes -= len(chart.png)
+
+    def __len__(self) -> int:
+        return len(self._charts)
+
+
+chart_cache = ChartCache()
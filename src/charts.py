@@ -0,0 +1,61 @@
+import io
+from datetime import date
+from typing import List
+
+# модуль выполняется в процессах пула, поэтому не импортирует ничего из бота; bot.py процессы
+# пула тоже импортируют (как __mp_main__), но при этом он ничего не создает и не импортирует
+
+WATER_CHART = "water"
+CALORIES_CHART = "calories"
+
+CHART_LABELS = {
+    WATER_CHART: {
+        "title": "Потребление воды",
+        "ylabel": "Количество воды (мл)",
+        "value_label": "Суточное потребление (мл)",
+        "goal_label": "Суточная норма (мл)",
+    },
+    CALORIES_CHART: {
+        "title": "Потребление калорий",
+        "ylabel": "Количество (ккал)",
+        "value_label": "Суточное потребление (ккал)",
+        "goal_label": "Суточная норма (ккал)",
+    },
+}
+
+
+# подпись к графику, построенному по средним за неделю/месяц (см. DailyStats.chart_series)
+STEP_TITLES = {
+    "week": "средние за день по неделям",
+    "month": "средние за день по месяцам",
+}
+# на плотных графиках маркеры точек сливаются в сплошную линию
+MAX_MARKED_POINTS = 60
+
+
+def init_worker() -> None:
+    import matplotlib
+    matplotlib.use("Agg")
+    # прогреваем процесс: первый рендер подгружает шрифты и бэкенд
+    render_chart(WATER_CHART, [date.today()], [0], 0)
+
+
+def render_chart(kind: str, dates: List[date], values: List[float], goal: float, step: str = "day") -> bytes:
+    # объектный API (Figure) вместо pyplot: не трогает глобальное состояние pyplot
+    from matplotlib.figure import Figure
+
+    labels = CHART_LABELS[kind]
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    marker = 'o' if len(dates) <= MAX_MARKED_POINTS else None
+    ax.plot(dates, values, marker=marker, linestyle='-', color='b', label=labels["value_label"])
+    ax.axhline(y=goal, color='r', linestyle='--', label=labels["goal_label"])
+    ax.set_title(f"{labels['title']} ({STEP_TITLES[step]})" if step in STEP_TITLES else labels["title"])
+    ax.set_xlabel("Дата")
+    ax.set_ylabel(labels["ylabel"])
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.legend()
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
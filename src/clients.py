@@ -0,0 +1,38 @@
+import asyncio
+from typing import Optional
+
+from src.api import WeatherApiClient, WorkoutApiClient, ProductsApiClient
+from src.config import OPEN_WEATHER_MAP_TOKEN, WORKOUT_API_TOKEN
+
+_weather_client: Optional[WeatherApiClient] = None
+_workout_client: Optional[WorkoutApiClient] = None
+_product_client: Optional[ProductsApiClient] = None
+
+
+def get_weather_client() -> WeatherApiClient:
+    global _weather_client
+    if _weather_client is None:
+        _weather_client = WeatherApiClient(OPEN_WEATHER_MAP_TOKEN)
+    return _weather_client
+
+
+def get_workout_client() -> WorkoutApiClient:
+    global _workout_client
+    if _workout_client is None:
+        _workout_client = WorkoutApiClient(WORKOUT_API_TOKEN)
+    return _workout_client
+
+
+def get_product_client() -> ProductsApiClient:
+    global _product_client
+    if _product_client is None:
+        _product_client = ProductsApiClient()
+    return _product_client
+
+
+async def validate_api_keys() -> None:
+    """Проверка ключей всех внешних API, запросы выполняются параллельно"""
+    await asyncio.gather(
+        get_weather_client().check_key(),
+        get_workout_client().check_key(),
+    )
@@ -8,3 +8,5 @@ CHECK_PROGRESS = "check_progress"
 SHOW_WATER_CHART = 'show_water_chart'
 SHOW_CALORIES_CHART = 'show_calories_chart'
 FAKE = 'fake'
+REPORT = 'report'
+EXPORT = 'export'
@@ -19,3 +19,155 @@ if not WORKOUT_API_TOKEN:
 
 if not ADMIN_USER_ID:
     raise ValueError("Environment variable ADMIN_USER_ID is not set!")
+
+# настройки общего пула HTTP-соединений к внешним API
+HTTP_CONNECTIONS_LIMIT = int(os.getenv("HTTP_CONNECTIONS_LIMIT", 100))
+HTTP_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_CONNECTIONS_PER_HOST", 20))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", 300))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 30))
+
+# кэш погоды: время жизни записи (сек) и максимальное число городов
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", 600))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", 256))
+
+# каталог для локальных баз данных (кэши, индексы)
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"))
+
+# кэш переводов: размер in-memory LRU и путь к базе на диске
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", 4096))
+TRANSLATION_DB_PATH = os.getenv("TRANSLATION_DB_PATH", os.path.join(DATA_DIR, "translations.sqlite3"))
+
+# локальный индекс продуктов (ккал на 100 г) для /log_food
+NUTRITION_DB_PATH = os.getenv("NUTRITION_DB_PATH", os.path.join(DATA_DIR, "nutrition.sqlite3"))
+
+# кэш ответов api-ninjas для активностей, которых нет в локальном каталоге
+ACTIVITY_DB_PATH = os.getenv("ACTIVITY_DB_PATH", os.path.join(DATA_DIR, "activities.sqlite3"))
+
+# пропустить проверку ключей внешних API при старте бота (1/true/yes)
+SKIP_API_KEY_CHECK = os.getenv("SKIP_API_KEY_CHECK", "").lower() in ("1", "true", "yes")
+
+# адрес Bot API сервера (по умолчанию api.telegram.org), нужен для локального Bot API и бенчмарков
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+# пул процессов для построения графиков: число процессов и максимум ожидающих задач
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", 2))
+CHART_MAX_PENDING = int(os.getenv("CHART_MAX_PENDING", 16))
+
+# графики: период по умолчанию (7d, 4w, 6m, 1y, all) и максимум точек на графике,
+# длинные периоды прореживаются до этого числа точек
+CHART_DEFAULT_RANGE = os.getenv("CHART_DEFAULT_RANGE", "30d")
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", 120))
+
+# ограничение памяти под закэшированные PNG графиков (байт)
+CHART_CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# хранилище пользователей: путь к базе, период сброса изменений на диск (сек) и размер пачки
+USERS_DB_PATH = os.getenv("USERS_DB_PATH", os.path.join(DATA_DIR, "users.sqlite3"))
+USERS_FLUSH_INTERVAL = float(os.getenv("USERS_FLUSH_INTERVAL", 1))
+USERS_FLUSH_BATCH_SIZE = int(os.getenv("USERS_FLUSH_BATCH_SIZE", 500))
+# максимальная пауза между повторами после ошибки записи в базу (сек)
+USERS_FLUSH_MAX_BACKOFF = float(os.getenv("USERS_FLUSH_MAX_BACKOFF", 60))
+# кэш отсутствующих в базе user_id: размер и время жизни записи (сек)
+USERS_MISSING_CACHE_SIZE = int(os.getenv("USERS_MISSING_CACHE_SIZE", 100000))
+USERS_MISSING_TTL = float(os.getenv("USERS_MISSING_TTL", 300))
+
+# хранилище состояний FSM: memory (только один процесс), sqlite или redis (общие для нескольких процессов)
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_DB_PATH = os.getenv("FSM_DB_PATH", os.path.join(DATA_DIR, "fsm.sqlite3"))
+FSM_REDIS_URL = os.getenv("FSM_REDIS_URL", "redis://localhost:6379/0")
+
+# способ получения апдейтов: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# webhook: адрес, на котором слушает сервер, и публичный адрес для setWebhook (если не задан, setWebhook не вызывается)
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+# секрет в заголовке X-Telegram-Bot-Api-Secret-Token (при WEBHOOK_URL без него генерируется случайный)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# сколько апдейтов обрабатывается одновременно и сколько может ждать обработки
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", 64))
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", 1024))
+
+# очереди апдейтов по пользователям: максимальная длина очереди и время простоя (сек), после которого она удаляется
+USER_QUEUE_MAX_SIZE = int(os.getenv("USER_QUEUE_MAX_SIZE", 32))
+USER_QUEUE_IDLE_TIMEOUT = float(os.getenv("USER_QUEUE_IDLE_TIMEOUT", 60))
+
+# шардирование по процессам (BOT_MODE=supervisor): число процессов-обработчиков, способ получения апдейтов
+# фронтом (polling/webhook), каталог для unix-сокетов и максимум апдейтов в буфере одного шарда
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", os.cpu_count() or 1))
+SHARD_INGRESS = os.getenv("SHARD_INGRESS", "polling")
+SHARD_SOCKET_DIR = os.getenv("SHARD_SOCKET_DIR", os.path.join(DATA_DIR, "shards"))
+SHARD_BUFFER_SIZE = int(os.getenv("SHARD_BUFFER_SIZE", 10000))
+# максимальная пауза (сек) между повторами getUpdates после ошибок (409, 401, сеть)
+SHARD_POLL_MAX_BACKOFF = float(os.getenv("SHARD_POLL_MAX_BACKOFF", 60))
+# задаются супервизором для процессов-обработчиков (BOT_MODE=worker)
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", 0))
+SHARD_SOCKET = os.getenv("SHARD_SOCKET")
+
+# ограничения частоты запросов к внешним API: запросов в секунду и допустимая "пачка" запросов
+OPENWEATHERMAP_RATE = float(os.getenv("OPENWEATHERMAP_RATE", 1))
+OPENWEATHERMAP_BURST = int(os.getenv("OPENWEATHERMAP_BURST", 10))
+OPENFOODFACTS_RATE = float(os.getenv("OPENFOODFACTS_RATE", 10 / 60))
+OPENFOODFACTS_BURST = int(os.getenv("OPENFOODFACTS_BURST", 5))
+API_NINJAS_RATE = float(os.getenv("API_NINJAS_RATE", 5))
+API_NINJAS_BURST = int(os.getenv("API_NINJAS_BURST", 10))
+TRANSLATE_RATE = float(os.getenv("TRANSLATE_RATE", 5))
+TRANSLATE_BURST = int(os.getenv("TRANSLATE_BURST", 10))
+# сколько запросов может ждать своей очереди к одному API и сколько секунд
+UPSTREAM_QUEUE_SIZE = int(os.getenv("UPSTREAM_QUEUE_SIZE", 100))
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", 10))
+
+# адреса внешних API (можно подменить, например, на локальный тестовый сервер)
+OPENWEATHERMAP_URL = os.getenv("OPENWEATHERMAP_URL", "http://api.openweathermap.org/data/2.5/weather")
+OPENFOODFACTS_URL = os.getenv("OPENFOODFACTS_URL", "https://world.openfoodfacts.org/cgi/search.pl")
+API_NINJAS_URL = os.getenv("API_NINJAS_URL", "https://api.api-ninjas.com/v1/caloriesburned")
+# таймауты запросов к внешним API (в секундах)
+OPENWEATHERMAP_TIMEOUT = float(os.getenv("OPENWEATHERMAP_TIMEOUT", 5))
+OPENFOODFACTS_TIMEOUT = float(os.getenv("OPENFOODFACTS_TIMEOUT", 10))
+API_NINJAS_TIMEOUT = float(os.getenv("API_NINJAS_TIMEOUT", 5))
+TRANSLATE_TIMEOUT = float(os.getenv("TRANSLATE_TIMEOUT", 5))
+# после стольких ошибок подряд запросы к api не выполняются в течение CIRCUIT_RESET_TIMEOUT секунд
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 30))
+# если ответ на GET-запрос не пришел за столько секунд, отправляется повторный запрос (0 - выключено)
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", 0))
+
+# через сколько секунд после полуночи пересчитываются нормы на новый день
+# и сколько запросов погоды при этом выполняется одновременно
+NORMS_SCHEDULE_DELAY = float(os.getenv("NORMS_SCHEDULE_DELAY", 60))
+NORMS_CONCURRENCY = int(os.getenv("NORMS_CONCURRENCY", 10))
+
+# логирование: формат вывода (json или text), каталог и размер файлов логов
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_DIR = os.getenv("LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs"))
+LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", 10 * 1024 * 1024))
+LOG_FILE_BACKUPS = int(os.getenv("LOG_FILE_BACKUPS", 5))
+# сколько записей может ждать записи, остальные отбрасываются, чтобы не тормозить бота
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# доля логируемых вызовов команд, например "start=0.1,help=0" (по умолчанию логируются все)
+LOG_COMMAND_SAMPLING = {
+    command.strip(): float(rate)
+    for command, rate in (item.split("=") for item in os.getenv("LOG_COMMAND_SAMPLING", "").split(",") if item)
+}
+
+# локальный HTTP-эндпоинт с метриками в формате Prometheus (в режиме шардирования
+# обработчик с номером N слушает METRICS_PORT + 1 + N)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9100))
+
+# сколько продуктов из одного сообщения /log_food ищется во внешнем api одновременно
+PRODUCT_LOOKUP_CONCURRENCY = int(os.getenv("PRODUCT_LOOKUP_CONCURRENCY", 4))
+
+# inline-подсказки продуктов: число результатов, вес по умолчанию (г)
+# и сколько последних продуктов каждого пользователя поднимаются в выдаче
+INLINE_RESULTS_LIMIT = int(os.getenv("INLINE_RESULTS_LIMIT", 10))
+INLINE_DEFAULT_GRAMS = float(os.getenv("INLINE_DEFAULT_GRAMS", 100))
+RECENT_PRODUCTS_PER_USER = int(os.getenv("RECENT_PRODUCTS_PER_USER", 20))
+RECENT_PRODUCTS_USERS = int(os.getenv("RECENT_PRODUCTS_USERS", 10000))
+
+# период отчета /report по умолчанию (дней)
+REPORT_DAYS = int(os.getenv("REPORT_DAYS", 30))
+# процессов для служебных задач (/report, /export)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 1))
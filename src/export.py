@@ -0,0 +1,114 @@
+import argparse
+import csv
+import gzip
+import json
+import sqlite3
+from datetime import date
+from typing import IO, Iterator, List, Optional, Tuple
+
+from src.config import USERS_DB_PATH
+from src.storage import NORM_FIELDS, PROFILE_FIELDS
+from src.timeseries import FIELDS as STATS_FIELDS
+
+CSV = "csv"
+NDJSON = "ndjson"
+EXPORT_FORMATS = (CSV, NDJSON)
+# строк, которые читаются из базы и записываются в файл за раз
+CHUNK_ROWS = 5000
+# ограничение Bot API на размер отправляемого ботом документа
+TELEGRAM_DOCUMENT_LIMIT = 50 * 1024 * 1024
+
+# профиль, дневная норма из профиля (daily_norm) и статистика за день с нормами этого дня
+COLUMNS: List[str] = (["user_id"] + PROFILE_FIELDS + [f"norm_{field}" for field in NORM_FIELDS]
+                      + ["day"] + list(STATS_FIELDS))
+
+
+def iter_export_rows(connection: sqlite3.Connection, since: Optional[date] = None) -> Iterator[List[tuple]]:
+    """Строки выгрузки пачками по CHUNK_ROWS, по возрастанию (user_id, день).
+
+    Полная выгрузка включает и пользователей без статистики (с пустым днем), выгрузка
+    с since - только дни начиная с since. Строки читаются курсором по мере записи,
+    поэтому память не зависит от числа пользователей"""
+    columns = ", ".join(
+        [f"p.{field}" for field in ["user_id"] + PROFILE_FIELDS + NORM_FIELDS]
+        + ["s.day"] + [f"s.{field}" for field in STATS_FIELDS]
+    )
+    if since is None:
+        query = (f"SELECT {columns} FROM profiles p LEFT JOIN daily_stats s ON s.user_id = p.user_id "
+                 "ORDER BY p.user_id, s.day")
+        cursor = connection.execute(query)
+    else:
+        query = (f"SELECT {columns} FROM profiles p JOIN daily_stats s ON s.user_id = p.user_id "
+                 "WHERE s.day >= ? ORDER BY p.user_id, s.day")
+        cursor = connection.execute(query, (since.isoformat(),))
+    while True:
+        rows = cursor.fetchmany(CHUNK_ROWS)
+        if not rows:
+            return
+        yield rows
+
+
+def write_export(chunks: Iterator[List[tuple]], file: IO[str], export_format: str) -> int:
+    """Запись пачек строк в открытый текстовый файл, возвращает число строк"""
+    count = 0
+    if export_format == CSV:
+        writer = csv.writer(file)
+        writer.writerow(COLUMNS)
+        for rows in chunks:
+            writer.writerows(rows)
+            count += len(rows)
+    else:
+        for rows in chunks:
+            file.write("".join(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n" for row in rows))
+            count += len(rows)
+    return count
+
+
+def export_to_file(path: str, export_format: str = CSV, compress: bool = False,
+                   since: Optional[date] = None, db_path: str = USERS_DB_PATH) -> int:
+    """Выгрузка профилей и статистики всех пользователей из базы в файл (gzip, если compress)"""
+    connection = sqlite3.connect(db_path)
+    try:
+        if compress:
+            file = gzip.open(path, "wt", encoding="utf-8", newline="")
+        else:
+            file = open(path, "w", encoding="utf-8", newline="")
+        with file:
+            return write_export(iter_export_rows(connection, since), file, export_format)
+    finally:
+        connection.close()
+
+
+def export_filename(export_format: str, compress: bool, since: Optional[date], today: date) -> str:
+    name = f"export-{today.isoformat()}" + (f"-since-{since.isoformat()}" if since else "")
+    return f"{name}.{export_format}" + (".gz" if compress else "")
+
+
+def parse_export_args(args: Optional[str]) -> Optional[Tuple[str, bool, Optional[date]]]:
+    """Разбор аргументов /export: формат (csv/ndjson), gz и дата начала в любом порядке.
+    Возвращает (формат, сжатие, дата) или None, если аргументы некорректны"""
+    export_format, compress, since = CSV, False, None
+    for arg in (args or "").lower().split():
+        if arg in EXPORT_FORMATS:
+            export_format = arg
+        elif arg in ("gz", "gzip"):
+            compress = True
+        else:
+            try:
+                since = date.fromisoformat(arg)
+            except ValueError:
+                return None
+    return export_format, compress, since
+
+
+if __name__ == "__main__":
+    # выгрузка без бота: python -m src.export export.csv.gz --gzip --since 2025-01-01
+    parser = argparse.ArgumentParser(description="Выгрузка профилей и статистики пользователей")
+    parser.add_argument("output", help="путь к файлу выгрузки")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default=CSV)
+    parser.add_argument("--gzip", action="store_true", help="сжать файл gzip")
+    parser.add_argument("--since", type=date.fromisoformat, help="только дни начиная с даты (YYYY-MM-DD)")
+    parser.add_argument("--db", default=USERS_DB_PATH, help="база пользователей")
+    args = parser.parse_args()
+    rows = export_to_file(args.output, args.format, args.gzip, args.since, args.db)
+    print(f"{args.output}: выгружено {rows} строк")
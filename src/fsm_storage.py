@@ -0,0 +1,157 @@
+import asyncio
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from src.cache import TTLCache
+from src.config import FSM_STORAGE, FSM_DB_PATH, FSM_REDIS_URL
+
+FSM_CACHE_SIZE = 10000
+
+
+def build_key(key: StorageKey) -> str:
+    return ":".join(str(part) for part in (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny
+    ))
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в SQLite, общее для всех процессов бота на одной машине.
+
+    Каждый процесс держит локальный кэш состояний. Каждая запись увеличивает счетчик seq в
+    таблице fsm_meta. Если в базу писал кто-то, кроме этого процесса (меняется PRAGMA
+    data_version, а seq ушел дальше собственных записей), кэш сбрасывается целиком, поэтому
+    чтение из кэша никогда не бывает устаревшим. Чтение идет в потоке event loop, запись с
+    commit - в отдельном потоке со своим соединением, как в UserStore."""
+
+    def __init__(self, db_path: str = FSM_DB_PATH, cache_size: int = FSM_CACHE_SIZE) -> None:
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path: str = db_path
+        self.connection: sqlite3.Connection = self._connect()
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS fsm (key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}')"
+        )
+        self.connection.execute("CREATE TABLE IF NOT EXISTS fsm_meta (id INTEGER PRIMARY KEY, seq INTEGER NOT NULL)")
+        self.connection.execute("INSERT OR IGNORE INTO fsm_meta (id, seq) VALUES (0, 0)")
+        self.connection.commit()
+        self.cache: TTLCache = TTLCache(maxsize=cache_size, ttl=None)
+        self._data_version: Optional[int] = None
+        # seq, до которого содержимое кэша согласовано с базой
+        self._seq: int = self._read_seq()
+        # все записи идут через один поток, поэтому выполняются по очереди
+        self._executor: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-writer")
+        self._writer: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    def _read_seq(self) -> int:
+        return self.connection.execute("SELECT seq FROM fsm_meta WHERE id = 0").fetchone()[0]
+
+    def _validate_cache(self) -> None:
+        # data_version не читает данные с диска, seq читается, только если базу кто-то менял
+        data_version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._data_version = data_version
+            seq = self._read_seq()
+            if seq != self._seq:
+                self.cache.clear()
+                self._seq = seq
+
+    def _read(self, key: StorageKey) -> tuple:
+        self._validate_cache()
+        db_key = build_key(key)
+        record = self.cache.get(db_key)
+        if record is None:
+            row = self.connection.execute("SELECT state, data FROM fsm WHERE key = ?", (db_key,)).fetchone()
+            record = (row[0], json.loads(row[1])) if row else (None, {})
+            self.cache.set(db_key, record)
+        return record
+
+    def _write_db(self, db_key: str, state: Optional[str], data: Dict[str, Any]) -> int:
+        if self._writer is None:
+            self._writer = self._connect()
+        with self._writer:
+            self._writer.execute("UPDATE fsm_meta SET seq = seq + 1 WHERE id = 0")
+            if state is None and not data:
+                self._writer.execute("DELETE FROM fsm WHERE key = ?", (db_key,))
+            else:
+                self._writer.execute(
+                    "INSERT OR REPLACE INTO fsm (key, state, data) VALUES (?, ?, ?)",
+                    (db_key, state, json.dumps(data, ensure_ascii=False)),
+                )
+            return self._writer.execute("SELECT seq FROM fsm_meta WHERE id = 0").fetchone()[0]
+
+    async def _write(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        db_key = build_key(key)
+        seq = await asyncio.get_running_loop().run_in_executor(self._executor, self._write_db, db_key, state, data)
+        # между прошлой согласованной точкой и этой записью писал другой процесс
+        if seq != self._seq + 1:
+            self.cache.clear()
+        self._seq = max(self._seq, seq)
+        self.cache.set(db_key, (state, data))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        _, data = self._read(key)
+        await self._write(key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._read(key)[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        state, _ = self._read(key)
+        await self._write(key, state, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return self._read(key)[1].copy()
+
+    def _close_writer(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def close(self) -> None:
+        # хранилище закрывает и aiogram (Dispatcher.shutdown), и on_shutdown в src/app.py
+        if self._executor is None:
+            return
+        self._executor.submit(self._close_writer)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        self.connection.close()
+
+
+def create_fsm_storage(backend: str = FSM_STORAGE, client: Any = None) -> BaseStorage:
+    """Создает хранилище состояний FSM.
+
+    Для redis можно передать готовый клиент (например, локальную замену сервера в тестах),
+    иначе подключение создается по FSM_REDIS_URL. Для этого бэкенда нужен пакет redis
+    (pip install -r requirements-redis.txt)."""
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "sqlite":
+        return SQLiteStorage()
+    if backend == "redis":
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError as e:
+            raise RuntimeError("FSM_STORAGE=redis requires the redis package: "
+                               "pip install -r requirements-redis.txt") from e
+        if client is not None:
+            return RedisStorage(redis=client)
+        return RedisStorage.from_url(FSM_REDIS_URL)
+    raise ValueError(f"Unknown FSM storage backend: {backend}")
@@ -1,13 +1,25 @@
+import os
+from typing import Optional
+
 from aiogram import Router, Dispatcher
 from aiogram import types, F
 from aiogram.fsm.context import FSMContext
-from aiogram.types import BufferedInputFile
-from aiogram.filters import Command, CommandObject
+from aiogram.types import (
+    BufferedInputFile, FSInputFile, InlineQueryResultArticle, InlineQueryResultsButton, InputTextMessageContent
+)
+from aiogram.filters import Command, CommandObject, ExceptionTypeFilter
+from aiogram.exceptions import TelegramBadRequest
+from src.autocomplete import product_suggester
+from src.chart_cache import chart_cache
+from src.charts import WATER_CHART, CALORIES_CHART
+from src.export import parse_export_args, TELEGRAM_DOCUMENT_LIMIT
+from src.metrics import cache_requests
+from src.ratelimit import UpstreamBusyError
 from src.states import ProfileSetup, FoodLogging
 from src.commands import *
 from src.utils import *
 from src.users import *
-from src.config import ADMIN_USER_ID
+from src.config import ADMIN_USER_ID, CHART_DEFAULT_RANGE, INLINE_DEFAULT_GRAMS, REPORT_DAYS
 
 router = Router()
 
@@ -19,6 +31,14 @@ async def start(message: types.Message):
                          "Используй /help для списка команд.")
 
 
+# служебные команды, которые видит в /help только админ
+ADMIN_HELP = (
+    "/fake — (Служ.) Сгенерировать тестовые данные для графика\n"
+    "/report [дней] — (Служ.) Отчет по выполнению норм всеми пользователями\n"
+    "/export [csv|ndjson] [gz] [с даты] — (Служ.) Выгрузить профили и статистику пользователей"
+)
+
+
 @router.message(Command(HELP))
 async def help(message: types.Message):
     log_command(HELP, message.from_user.id, message.from_user.username)
@@ -29,12 +49,14 @@ async def help(message: types.Message):
         "/set_profile — Настроить профиль (без выполнения это команды остальные работать не будут)\n"
         "/log_water <объем> — Записать количество выпитой воды (в мл)\n"
         "/log_food <название продукта> — Записать продукт и его количество\n"
+        "/log_food <продукт> <граммы>, <продукт> <граммы>, ... — Записать сразу несколько продуктов\n"
+        "@<имя бота> <продукт> <граммы> — Выбрать продукт из подсказок и сразу записать его\n"
         "/log_workout <активность> <время> — Записать тренировку\n"
         "/check_progress — Проверить прогресс за сегодня\n"
-        "/show_water_chart — Показать график потребления воды\n"
-        "/show_calories_chart — Показать график потребления калорий\n"
+        "/show_water_chart [7d|30d|1y|all] — Показать график потребления воды за период\n"
+        "/show_calories_chart [7d|30d|1y|all] — Показать график потребления калорий за период\n"
         # если пользоваль админ - добавляем ему служебные команды, иначе - нет
-        f"{'/fake — (Служ.) Сгенерировать тестовые данные для графика' if message.from_user.id == ADMIN_USER_ID else ''}"
+        f"{ADMIN_HELP if message.from_user.id == ADMIN_USER_ID else ''}"
     )
 
 
@@ -107,39 +129,65 @@ async def process_city(message: types.Message, state: FSMContext):
 
 
 @router.message(Command(SHOW_WATER_CHART))
-async def show_water_chart(message: types.Message):
+async def show_water_chart(message: types.Message, command: CommandObject):
     log_command(SHOW_WATER_CHART, message.from_user.id, message.from_user.username)
 
-    user_id = message.from_user.id
-
-    if get_active_days(user_id) < 2:
-        await message.answer("Данная функция пока недоступна, Вы должны иметь не менее 2 активных дней.")
-        return
-
-    dates, logged_water = get_stats(user_id, 'logged_water')
-    graph_image = create_water_chart(user_id, dates, logged_water)
-    await message.reply_photo(
-        photo=BufferedInputFile(graph_image, filename="water_chart.png"),
-        caption="График потребления воды"
-    )
+    await send_chart(message, WATER_CHART, 'logged_water', create_water_chart, command.args,
+                     filename="water_chart.png", caption="График потребления воды")
 
 
 @router.message(Command(SHOW_CALORIES_CHART))
-async def show_calories_chart(message: types.Message):
+async def show_calories_chart(message: types.Message, command: CommandObject):
     log_command(SHOW_CALORIES_CHART, message.from_user.id, message.from_user.username)
 
-    user_id = message.from_user.id
+    await send_chart(message, CALORIES_CHART, 'logged_calories', create_calories_chart, command.args,
+                     filename="calories_chart.png", caption="График потребления калорий")
 
-    if get_active_days(user_id) < 2:
-        await message.answer("Данная функция пока недоступна, Вы должны иметь не менее 2 активных дней.")
+
+async def send_chart(message: types.Message, kind: str, key: str, create_chart, range_arg: Optional[str],
+                     filename: str, caption: str):
+    chart_range = parse_chart_range(range_arg or CHART_DEFAULT_RANGE)
+    if chart_range is None:
+        await message.answer("Пожалуйста, укажите период в виде 7d, 4w, 6m, 1y или all.")
         return
+    label, days = chart_range
+    caption = f"{caption} {chart_range_caption(label)}"
 
-    dates, logged_calories = get_stats(user_id, 'logged_calories')
-    graph_image = create_calories_chart(user_id, dates, logged_calories)
-    await message.reply_photo(
-        photo=BufferedInputFile(graph_image, filename="calories_chart.png"),
-        caption="График потребления калорий"
+    user_id = message.from_user.id
+    # активные дни считаются в выбранном периоде, иначе старая история дает пустой график
+    if get_active_days(user_id, days) < 2:
+        await message.answer("Данная функция пока недоступна, Вы должны иметь не менее 2 активных дней.")
+        return
+    # окно периода сдвигается с каждым днем, поэтому версия графика включает и текущую дату
+    version = (get_stats_version(user_id, key), datetime.now().date() if days else None)
+    kind = f"{kind}:{label}"
+
+    # статистика не менялась с прошлого раза - отправляем уже загруженную в Telegram картинку
+    cached = chart_cache.get(user_id, kind, version)
+    cache_requests.inc("charts", "hit" if cached else "miss")
+    if cached and cached.file_id:
+        try:
+            await message.reply_photo(photo=cached.file_id, caption=caption)
+            return
+        except TelegramBadRequest:
+            # file_id стал недействительным, загружаем картинку заново
+            pass
+
+    if cached:
+        graph_image = cached.png
+    else:
+        dates, values, step = get_stats(user_id, key, days)
+        try:
+            graph_image = await create_chart(user_id, dates, values, step)
+        except ChartRendererBusyError:
+            await message.answer("Сейчас строится слишком много графиков, попробуйте через несколько секунд.")
+            return
+
+    sent = await message.reply_photo(
+        photo=BufferedInputFile(graph_image, filename=filename),
+        caption=caption
     )
+    chart_cache.set(user_id, kind, version, graph_image, file_id=sent.photo[-1].file_id if sent.photo else None)
 
 
 @router.message(Command(CHECK_PROGRESS))
@@ -148,7 +196,7 @@ async def check_progress(message: types.Message):
     user_id = message.from_user.id
     today = datetime.now().date()
 
-    ensure_statistics_exists(user_id, today)
+    await ensure_norms_for_day(user_id, today)
 
     stats, profile = get_user_statistic_and_profile(user_id, today)
 
@@ -185,7 +233,7 @@ async def log_water(message: types.Message, command: CommandObject):
     user_id = message.from_user.id
     today = datetime.now().date()
 
-    ensure_statistics_exists(user_id, today)
+    await ensure_norms_for_day(user_id, today)
     add_water(user_id, today, volume)
 
     stats, _ = get_user_statistic_and_profile(user_id, today)
@@ -216,16 +264,20 @@ async def log_workout(message: types.Message, command: CommandObject):
         await message.answer("Пожалуйста, введите корректное численное значение времени выполнения упражнения.")
         return
 
-    activity_info = await workout_client.get_exercise_info(activity)
+    user_id = message.from_user.id
+
+    activity_info = await workout_client.get_exercise_info(activity, get_user_weight(user_id))
     if not activity_info:
         await message.answer("Данная активность не найдена, попробуйте другое название.")
         return
+    if "error" in activity_info:
+        await message.answer("Сервис поиска активностей сейчас недоступен, попробуйте позже.")
+        return
 
-    user_id = message.from_user.id
     today = datetime.now().date()
     calories = activity_info['calories'] * duration / 60
 
-    ensure_statistics_exists(user_id, today)
+    await ensure_norms_for_day(user_id, today)
 
     burn_calories(user_id, today, calories)
     added_calories = inc_calorie_goal_for_day(user_id, today, activity, calories)
@@ -251,13 +303,14 @@ async def log_food_name(message: types.Message, command: CommandObject, state: F
         await message.answer('Пожалуйста, введите название продукта (например, "/log_food банан").')
         return
 
-    if len(command.args.split()) != 1:
-        await message.answer('Пожалуйста, введите один агрумент (/log_food <тип продукта>)')
+    if is_food_items(command.args):
+        # продукты с количеством сразу: "/log_food банан 120, гречка 200"
+        await log_food_items(message, command.args)
         return
 
-    product = command.args.split()[0]
-    product = product.capitalize().strip()
-    if not product.isalpha():
+    # название из нескольких слов ("куриная грудка") ищется целиком, вес спрашивается отдельно
+    product = " ".join(command.args.split()).capitalize()
+    if not all(part.isalpha() for part in product.replace("-", " ").split()):
         await message.answer("Пожалуйста, введите корректное название продукта.")
         return
 
@@ -266,12 +319,46 @@ async def log_food_name(message: types.Message, command: CommandObject, state: F
     if not product_info:
         await message.answer("Данная продукт не найден, попробуйте другое название.")
         return
+    if "error" in product_info:
+        await message.answer("Сервис поиска продуктов сейчас недоступен, попробуйте позже.")
+        return
 
-    await state.update_data(product_info=product_info)
+    await state.update_data(product=product, product_info=product_info)
     await message.answer(f"{product} — {product_info['calories']} ккал на 100 г. Сколько грамм вы съели?")
     await state.set_state(FoodLogging.amount)
 
 
+async def log_food_items(message: types.Message, text: str):
+    items = parse_food_items(text)
+    if not items:
+        await message.answer('Пожалуйста, укажите продукты и их вес в граммах через запятую '
+                             '(например, "/log_food банан 120, гречка 200").')
+        return
+
+    await message.answer('Пожалуйста, подождите...')
+    products_info = await product_client.get_products_info([name for name, _ in items])
+
+    lines, total = [], 0
+    for (name, grams), product_info in zip(items, products_info):
+        if not product_info:
+            lines.append(f"{name} — не найден")
+        elif "error" in product_info:
+            lines.append(f"{name} — сервис поиска продуктов недоступен")
+        else:
+            calories = product_info["calories"] * grams / 100
+            total += calories
+            product_suggester.remember(message.from_user.id, name)
+            lines.append(f"{name} {grams} г — {calories} ккал")
+
+    if total > 0:
+        today = datetime.now().date()
+        user_id = message.from_user.id
+        await ensure_norms_for_day(user_id, today)
+        add_calories(user_id, today, total)
+
+    await message.answer("\n".join(lines) + f"\n\nЗаписано: {total} ккал.")
+
+
 @router.message(FoodLogging.amount, F.text)
 async def log_food_amount(message: types.Message, state: FSMContext):
     amount = parse_and_validate(message.text, 1, 5000)
@@ -286,14 +373,60 @@ async def log_food_amount(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
     calories = product_info["calories"] * amount / 100
 
-    ensure_statistics_exists(user_id, today)
+    await ensure_norms_for_day(user_id, today)
 
     add_calories(user_id, today, calories)
+    if user_data.get("product"):
+        product_suggester.remember(user_id, user_data["product"])
 
     await message.answer(f"Записано: {calories} ккал.")
     await state.clear()
 
 
+@router.inline_query()
+async def suggest_food(inline_query: types.InlineQuery):
+    """Подсказки продуктов в inline-режиме ("@бот банан 150"). Ищет только в локальном индексе,
+    без обращений к внешним api, поэтому отвечает на каждое нажатие клавиши"""
+    user_id = inline_query.from_user.id
+    if not is_user_exists(user_id):
+        button = InlineQueryResultsButton(text="Сначала настройте профиль", start_parameter="profile")
+        await inline_query.answer([], cache_time=0, is_personal=True, button=button)
+        return
+
+    query, grams = parse_inline_query(inline_query.query, INLINE_DEFAULT_GRAMS)
+    results = [
+        InlineQueryResultArticle(
+            # по id выбранного результата продукт записывается в chosen_inline_result
+            id=f"{suggestion.product_id}:{grams:g}",
+            title=f"{suggestion.name} {grams:g} г — {suggestion.calories * grams / 100:g} ккал",
+            description=f"{suggestion.calories:g} ккал на 100 г",
+            input_message_content=InputTextMessageContent(
+                message_text=f"{suggestion.name} {grams:g} г — {suggestion.calories * grams / 100:g} ккал"
+            ),
+        )
+        for suggestion in product_suggester.search(query, user_id)
+    ]
+    # выдача зависит от недавних продуктов пользователя, поэтому кэш персональный и короткий
+    await inline_query.answer(results, cache_time=5, is_personal=True)
+
+
+@router.chosen_inline_result()
+async def log_chosen_food(chosen: types.ChosenInlineResult):
+    """Запись продукта, выбранного из inline-подсказок.
+    Требует включенного inline feedback у бота (/setinlinefeedback в BotFather)"""
+    user_id = chosen.from_user.id
+    product_id, _, grams = chosen.result_id.partition(":")
+    suggestion = product_suggester.get(int(product_id)) if product_id.isdigit() else None
+    grams = parse_numeric_value(grams)
+    if suggestion is None or not grams or not is_user_exists(user_id):
+        return
+
+    today = datetime.now().date()
+    await ensure_norms_for_day(user_id, today)
+    add_calories(user_id, today, suggestion.calories * grams / 100)
+    product_suggester.remember(user_id, suggestion.name)
+
+
 @router.message(Command(FAKE))
 async def fake(message: types.Message):
     """Метод для генерации фейковых данных о воде и калориях по дням.
@@ -307,5 +440,52 @@ async def fake(message: types.Message):
     await message.reply("Тестовые данные сгенерированы")
 
 
+@router.message(Command(REPORT))
+async def report(message: types.Message, command: CommandObject):
+    """Отчет по выполнению норм всеми пользователями за период. Доступен только админу."""
+    log_command(REPORT, message.from_user.id, message.from_user.username)
+    if message.from_user.id != ADMIN_USER_ID:
+        return
+
+    days = parse_and_validate(command.args, 0, 3651) if command.args else REPORT_DAYS
+    if not days:
+        await message.answer('Пожалуйста, укажите период отчета в днях (например, "/report 30").')
+        return
+
+    await message.answer("Отчет строится, это может занять несколько секунд...")
+    await message.answer(await create_report(int(days)))
+
+
+@router.message(Command(EXPORT))
+async def export(message: types.Message, command: CommandObject):
+    """Выгрузка профилей и статистики всех пользователей файлом. Доступна только админу."""
+    log_command(EXPORT, message.from_user.id, message.from_user.username)
+    if message.from_user.id != ADMIN_USER_ID:
+        return
+
+    export_args = parse_export_args(command.args)
+    if export_args is None:
+        await message.answer('Пожалуйста, укажите формат, сжатие и дату начала '
+                             '(например, "/export ndjson gz 2025-01-01").')
+        return
+
+    await message.answer("Выгрузка готовится...")
+    path, filename, rows = await create_export(*export_args)
+    try:
+        if os.path.getsize(path) > TELEGRAM_DOCUMENT_LIMIT:
+            await message.answer("Выгрузка больше 50 МБ и не может быть отправлена ботом: "
+                                 "используйте сжатие (gz), дату начала или python -m src.export на сервере.")
+            return
+        await message.reply_document(FSInputFile(path, filename=filename), caption=f"Выгружено строк: {rows}")
+    finally:
+        os.remove(path)
+
+
+@router.error(ExceptionTypeFilter(UpstreamBusyError), F.update.message.as_("message"))
+async def upstream_busy(event: types.ErrorEvent, message: types.Message):
+    # внешний api перегружен: состояние диалога не меняем, пользователь может просто повторить ввод
+    await message.answer("Внешний сервис сейчас перегружен, попробуйте еще раз через минуту.")
+
+
 def setup_handlers(dp: Dispatcher):
     dp.include_router(router)
@@ -0,0 +1,37 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from src.config import JOB_WORKERS
+
+
+class ProcessJobs:
+    """Пул процессов для долгих служебных задач (отчет /report, выгрузка /export).
+
+    Задачи читают базу и перебирают миллионы строк, поэтому выполняются вне процесса бота:
+    не занимают ни event loop, ни GIL. Пул создается при старте бота и живет до остановки,
+    процессы поднимаются при первой задаче. Отдельно от пула графиков, чтобы долгая
+    выгрузка не задерживала графики пользователей."""
+
+    def __init__(self, workers: int = JOB_WORKERS) -> None:
+        self.workers: int = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        self.start()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+process_jobs = ProcessJobs()
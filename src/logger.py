@@ -1,20 +1,152 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
 import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
 
-LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+from src.config import (
+    BOT_MODE,
+    SHARD_INDEX,
+    LOG_FORMAT,
+    LOG_DIR,
+    LOG_FILE_MAX_BYTES,
+    LOG_FILE_BACKUPS,
+    LOG_QUEUE_SIZE,
+    LOG_COMMAND_SAMPLING,
+)
 
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
+# в режиме шардирования у каждого процесса свой файл, чтобы процессы не мешали друг другу при ротации
+LOG_FILE = os.path.join(LOG_DIR, f"bot-{SHARD_INDEX}.log" if BOT_MODE == "worker" else "bot.log")
 
-logger = logging.getLogger("speechgpt_logger")
-logger.setLevel(logging.DEBUG)
 
-log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON. Дополнительные поля передаются через extra={"fields": {...}}"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update(getattr(record, "fields", {}))
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class CommandSamplingFilter(logging.Filter):
+    """Пропускает только долю записей о вызове каждой команды (см. LOG_COMMAND_SAMPLING)"""
+
+    def __init__(self, rates: Dict[str, float]) -> None:
+        super().__init__()
+        self.rates: Dict[str, float] = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        command = getattr(record, "fields", {}).get("command")
+        rate = self.rates.get(command, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Кладет запись в очередь и сразу возвращается. Если очередь заполнена
+    (поток записи не успевает, например, завис stdout), запись отбрасывается."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped: int = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # сообщение и traceback форматируются здесь, в очередь уходят только строки
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogListener(QueueListener):
+    """QueueListener, остановка которого не зависает, если поток записи завис"""
+
+    stop_timeout: float = 5.0
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(self._sentinel, timeout=self.stop_timeout)
+        except queue.Full:
+            return
+        self._thread.join(self.stop_timeout)
+        self._thread = None
+
+
+log_formatter = (
+    JsonFormatter() if LOG_FORMAT == "json"
+    else logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+)
 console_handler = logging.StreamHandler()
 console_handler.setFormatter(log_formatter)
+
+log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+queue_handler = NonBlockingQueueHandler(log_queue)
+queue_handler.addFilter(CommandSamplingFilter(LOG_COMMAND_SAMPLING))
+
+listener: Optional[LogListener] = None
+
+# до start_logging (а в дочерних процессах пулов, CLI и бенчмарках - всегда) записи идут
+# сразу в консоль: файл лога открывает и ротирует только основной процесс бота
+logger = logging.getLogger("speechgpt_logger")
+logger.setLevel(logging.DEBUG)
 logger.addHandler(console_handler)
+logger.propagate = False
+
+
+def start_logging() -> None:
+    """Запись в консоль и файл через отдельный поток, event loop только кладет записи в очередь.
+    Вызывается при запуске бота (src/app.py)"""
+    global listener
+    if listener is not None:
+        return
+    os.makedirs(LOG_DIR, exist_ok=True)
+    file_handler = RotatingFileHandler(
+        LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8"
+    )
+    file_handler.setFormatter(log_formatter)
+    listener = LogListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_logging)
+    logger.removeHandler(console_handler)
+    logger.addHandler(queue_handler)
+
+
+def stop_logging() -> None:
+    global listener
+    if listener is None:
+        return
+    logger.removeHandler(queue_handler)
+    logger.addHandler(console_handler)
+    listener.stop()
+    for handler in listener.handlers:
+        if handler is not console_handler:
+            handler.close()
+    listener = None
 
 
 def get_logger():
     return logger
+
+
+def get_logging_stats() -> Dict[str, int]:
+    return {"queue_depth": log_queue.qsize(), "queue_size": LOG_QUEUE_SIZE, "dropped": queue_handler.dropped}
@@ -0,0 +1,230 @@
+import bisect
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+from src.config import BOT_MODE, SHARD_INDEX, METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Sample = Tuple[str, Sequence[str], Sequence[str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_sample(name: str, label_names: Sequence[str], label_values: Sequence[str], value: float) -> str:
+    if not label_names:
+        return f"{name} {value}"
+    labels = ",".join(f'{label}="{_escape(label_value)}"' for label, label_value in zip(label_names, label_values))
+    return f"{name}{{{labels}}} {value}"
+
+
+class Metric(ABC):
+    """Метрика в текстовом формате Prometheus: наследники задают type и samples()"""
+
+    type: str = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.label_names: Tuple[str, ...] = tuple(label_names)
+
+    @abstractmethod
+    def samples(self) -> Iterator[Sample]:
+        ...
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(_format_sample(*sample) for sample in self.samples())
+        return lines
+
+
+class ValueMetric(Metric):
+    """Значения по наборам меток. Помимо значений, записанных через inc/set, можно
+    добавить функции, которые возвращают значения на момент запроса метрик -
+    так счетчики, которые уже есть в других модулях, не дублируются на горячем пути."""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callbacks: List[Callable[[], Dict[Tuple[str, ...], float]]] = []
+
+    def add_callback(self, callback: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        self._callbacks.append(callback)
+
+    def samples(self) -> Iterator[Sample]:
+        for label_values, value in list(self._values.items()):
+            yield self.name, self.label_names, label_values, value
+        for callback in self._callbacks:
+            for label_values, value in callback().items():
+                yield self.name, self.label_names, label_values, value
+
+
+class Counter(ValueMetric):
+    type = "counter"
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+
+class Gauge(ValueMetric):
+    type = "gauge"
+
+    def set(self, value: float, *label_values: str) -> None:
+        self._values[label_values] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            label_names: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self.buckets: Tuple[float, ...] = tuple(buckets)
+        # по каждому набору меток: число наблюдений в каждом интервале (последний - +Inf) и их сумма
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> Iterator[Sample]:
+        label_names = self.label_names + ("le",)
+        for label_values, (counts, total) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket", label_names, label_values + (le,), cumulative
+            yield f"{self.name}_sum", self.label_names, label_values, total
+            yield f"{self.name}_count", self.label_names, label_values, cumulative
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, label_names, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+command_duration = registry.histogram(
+    "bot_command_duration_seconds", "Время обработки сообщения по командам", ("command",))
+command_errors = registry.counter(
+    "bot_command_errors_total", "Необработанные ошибки по командам", ("command",))
+upstream_duration = registry.histogram(
+    "bot_upstream_request_duration_seconds", "Время запросов к внешним API", ("upstream",))
+upstream_responses = registry.counter(
+    "bot_upstream_responses_total", "Ответы внешних API по статусам", ("upstream", "status"))
+cache_requests = registry.counter(
+    "bot_cache_requests_total", "Обращения к кэшам и локальным индексам", ("cache", "result"))
+chart_render_duration = registry.histogram(
+    "bot_chart_render_duration_seconds", "Время построения графиков", ("kind",))
+runtime_gauge = registry.gauge(
+    "bot_runtime_value", "Текущее состояние очередей, лимитов и circuit breaker'ов", ("component", "name", "field"))
+
+
+_runtime_registered = False
+
+
+def register_runtime_metrics() -> None:
+    """Показатели, которые модули уже считают сами: читаются только при запросе метрик"""
+    global _runtime_registered
+    if _runtime_registered:
+        return
+    _runtime_registered = True
+    # импорт здесь, а не в начале модуля: эти модули сами импортируют src.metrics
+    from src.api import weather_cache
+    from src.logger import get_logging_stats
+    from src.ratelimit import get_limiters_stats
+    from src.renderer import chart_renderer
+    from src.resilience import get_breakers_stats
+    from src.user_queues import user_queues
+    from src.users import users
+
+    cache_requests.add_callback(lambda: {
+        ("weather", "hit"): weather_cache.hits,
+        ("weather", "miss"): weather_cache.misses,
+    })
+
+    def runtime_values() -> Dict[Tuple[str, ...], float]:
+        values = {}
+        for upstream, stats in get_limiters_stats().items():
+            for key in ("tokens", "queued_interactive", "queued_background", "rejected"):
+                values[("ratelimit", upstream, key)] = stats[key]
+        for upstream, stats in get_breakers_stats().items():
+            values[("circuit", upstream, "open")] = float(stats["state"] != "closed")
+            values[("circuit", upstream, "rejected")] = stats["rejected"]
+        for key, value in get_logging_stats().items():
+            values[("logging", "queue", key)] = value
+        values[("charts", "renderer", "pending")] = chart_renderer.pending
+        values[("users", "queues", "active")] = len(user_queues)
+        values[("users", "queues", "depth")] = sum(user_queues.depths().values())
+        values[("users", "store", "pending_writes")] = users.pending_writes()
+        return values
+
+    runtime_gauge.add_callback(runtime_values)
+
+
+class MetricsServer:
+    def __init__(self, host: str = METRICS_HOST, port: int = METRICS_PORT) -> None:
+        self.host: str = host
+        self.port: int = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> None:
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=registry.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+metrics_server = MetricsServer(port=METRICS_PORT + 1 + SHARD_INDEX if BOT_MODE == "worker" else METRICS_PORT)
+
+
+async def start_metrics() -> None:
+    if METRICS_ENABLED:
+        register_runtime_metrics()
+        await metrics_server.start()
@@ -1,9 +1,16 @@
+import time
 from typing import Dict, Any, Awaitable, Callable
 
 from aiogram import BaseMiddleware, Dispatcher
-from aiogram.types import Message
+from aiogram.types import Message, TelegramObject
 from src.handlers import is_user_exists
+from src import commands
 from src.commands import *
+from src.logger import get_logger
+from src.metrics import command_duration, command_errors
+from src.user_queues import user_queues, UserQueueFullError
+
+logger = get_logger()
 
 
 class ProfileRequiredMiddleware(BaseMiddleware):
@@ -43,6 +50,72 @@ class ProtectFromChangeMiddleware(BaseMiddleware):
         return await handler(event, data)
 
 
+class UserOrderingMiddleware(BaseMiddleware):
+    """Апдейты одного пользователя обрабатываются строго по очереди, разных - параллельно.
+
+    Встроенный FSMContextMiddleware выполняется раньше и читает состояние FSM (raw_state)
+    еще до того, как апдейт встал в очередь. Поэтому состояние перечитывается уже в очереди,
+    когда предыдущий апдейт пользователя (например, ответ в диалоге /set_profile) обработан.
+    Inline-запросы и выбор inline-результата обрабатываются сразу, в обход очереди."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ):
+        user = data.get("event_from_user")
+        # inline-подсказки не должны ждать медленных команд пользователя (графики, запросы к api),
+        # а запись выбранного продукта не делает await между чтением и изменением счетчика
+        if user is None or event.inline_query is not None or event.chosen_inline_result is not None:
+            return await handler(event, data)
+
+        async def job():
+            state = data.get("state")
+            if state is not None:
+                data["raw_state"] = await state.get_state()
+            return await handler(event, data)
+
+        try:
+            return await user_queues.run(user.id, job)
+        except UserQueueFullError:
+            logger.warning(f"Очередь апдейтов пользователя {user.id} переполнена, апдейт пропущен")
+
+
+# все команды бота: метка метрики ограничена этим списком, чтобы произвольный текст не порождал новые ряды
+KNOWN_COMMANDS = {value for name, value in vars(commands).items() if name.isupper() and isinstance(value, str)}
+
+
+def command_label(event: Message, data: Dict[str, Any]) -> str:
+    if event.text and event.text.startswith("/"):
+        command = event.text.split(maxsplit=1)[0][1:].split("@", 1)[0]
+        return command if command in KNOWN_COMMANDS else "unknown"
+    # ответы внутри диалога (/set_profile, /log_food) учитываются по состоянию FSM
+    return data.get("raw_state") or "message"
+
+
+class InstrumentationMiddleware(BaseMiddleware):
+    """Время обработки и число ошибок по каждой команде (см. src/metrics.py)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any],
+    ):
+        label = command_label(event, data)
+        started_at = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            command_errors.inc(label)
+            raise
+        finally:
+            command_duration.observe(time.perf_counter() - started_at, label)
+
+
 def setup_middleware(dp: Dispatcher):
+    dp.update.outer_middleware(UserOrderingMiddleware())
+    dp.message.outer_middleware(InstrumentationMiddleware())
     dp.message.middleware(ProfileRequiredMiddleware())
     dp.message.middleware(ProtectFromChangeMiddleware())
@@ -0,0 +1,217 @@
+import asyncio
+import csv
+import os
+import sqlite3
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.config import NUTRITION_DB_PATH
+from src.logger import get_logger
+from src.translations import RESOURCES_DIR, normalize_text
+
+logger = get_logger()
+
+# набор продуктов, которым индекс заполняется при первом открытии
+BUNDLED_PRODUCTS_PATH = os.path.join(RESOURCES_DIR, "products.csv")
+
+# триграммный поиск работает только для запросов от 3 символов
+MIN_FULLTEXT_QUERY_LENGTH = 3
+
+
+class NutritionIndex:
+    """Локальный индекс калорийности продуктов (ккал на 100 г) на SQLite.
+
+    Сначала ищется точное совпадение русского или английского названия, затем
+    полнотекстовый поиск по триграммам. OpenFoodFacts нужен только при промахе,
+    а найденные там продукты дописываются в индекс (см. ProductsApiClient): сразу
+    в память, а в базу в отдельном потоке."""
+
+    def __init__(self, db_path: str = NUTRITION_DB_PATH) -> None:
+        self.db_path: str = db_path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._fulltext_prefix: bool = False
+        # вызываются для каждого добавленного продукта: (id, name_ru, name_en, calories)
+        self._listeners: List[Callable[[int, Optional[str], Optional[str], float], None]] = []
+        # продукты из api, еще не записанные в базу: название -> {"name", "calories"}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # запись идет через один поток со своим соединением, чтобы commit не блокировал event loop
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._writer: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if self.db_path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path)
+            self._create_schema(self._connection)
+            if self._connection.execute("SELECT COUNT(*) FROM products").fetchone()[0] == 0:
+                self.import_csv(BUNDLED_PRODUCTS_PATH)
+        return self._connection
+
+    def _create_schema(self, connection: sqlite3.Connection) -> None:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS products ("
+            "id INTEGER PRIMARY KEY, name_ru TEXT, name_en TEXT, "
+            "calories REAL NOT NULL, source TEXT NOT NULL DEFAULT 'bundled')"
+        )
+        connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS products_name_ru ON products (name_ru)")
+        connection.execute("CREATE INDEX IF NOT EXISTS products_name_en ON products (name_en)")
+        try:
+            connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts "
+                "USING fts5(name_ru, name_en, tokenize='trigram')"
+            )
+        except sqlite3.OperationalError:
+            # trigram-токенизатор есть только в SQLite >= 3.34, иначе ищем по префиксу слова
+            connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(name_ru, name_en)")
+            self._fulltext_prefix = True
+
+    def import_csv(self, path: str) -> int:
+        """Импорт продуктов из CSV с колонками name_ru, name_en, calories"""
+        with open(path, encoding="utf-8", newline="") as f:
+            return self.add_many(
+                (row.get("name_ru"), row.get("name_en"), float(row["calories"]), "bundled")
+                for row in csv.DictReader(f)
+            )
+
+    def add(self, name_ru: Optional[str], name_en: Optional[str], calories: float, source: str) -> None:
+        """Добавление продукта, найденного в api: lookup видит его сразу, база и подписчики
+        обновляются после записи в отдельном потоке"""
+        name_ru = normalize_text(name_ru) if name_ru else None
+        name_en = normalize_text(name_en) if name_en else None
+        if not (name_ru or name_en):
+            return
+        info = {"name": name_ru or name_en, "calories": calories}
+        for name in filter(None, (name_ru, name_en)):
+            self._pending[name] = info
+
+        # схема создается при открытии основного соединения
+        self.connection
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nutrition-writer")
+        try:
+            loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        future = self._executor.submit(self._write, [(name_ru, name_en, calories, source)])
+        future.add_done_callback(lambda future: self._on_written(future, info, loop))
+
+    def _write(self, rows: List[tuple]) -> List[Tuple[int, Optional[str], Optional[str], float]]:
+        if self._writer is None:
+            self._writer = sqlite3.connect(self.db_path)
+        with self._writer:
+            return self._insert(self._writer, rows)
+
+    def _on_written(self, future: Future, info: Dict[str, Any], loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        # подписчики (подсказки inline-режима) работают в потоке event loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._finish_write, future, info)
+        else:
+            self._finish_write(future, info)
+
+    def _finish_write(self, future: Future, info: Dict[str, Any]) -> None:
+        for name in [name for name, pending in self._pending.items() if pending is info]:
+            del self._pending[name]
+        if future.exception() is not None:
+            # продукт будет снова запрошен в api
+            logger.error(f"Не удалось сохранить продукт {info['name']}: {future.exception()!r}")
+            return
+        self._notify(future.result())
+
+    def add_many(self, rows: Iterable[tuple]) -> int:
+        added = self._insert(self.connection, rows)
+        self.connection.commit()
+        self._notify(added)
+        return len(added)
+
+    @staticmethod
+    def _insert(connection: sqlite3.Connection,
+                rows: Iterable[tuple]) -> List[Tuple[int, Optional[str], Optional[str], float]]:
+        added = []
+        for name_ru, name_en, calories, source in rows:
+            name_ru = normalize_text(name_ru) if name_ru else None
+            name_en = normalize_text(name_en) if name_en else None
+            if not (name_ru or name_en):
+                continue
+            if name_ru:
+                existing = connection.execute("SELECT id FROM products WHERE name_ru = ?", (name_ru,)).fetchone()
+                if existing:
+                    connection.execute("DELETE FROM products_fts WHERE rowid = ?", existing)
+                    connection.execute("DELETE FROM products WHERE id = ?", existing)
+            cursor = connection.execute(
+                "INSERT INTO products (name_ru, name_en, calories, source) VALUES (?, ?, ?, ?)",
+                (name_ru, name_en, calories, source),
+            )
+            connection.execute(
+                "INSERT INTO products_fts (rowid, name_ru, name_en) VALUES (?, ?, ?)",
+                (cursor.lastrowid, name_ru or "", name_en or ""),
+            )
+            added.append((cursor.lastrowid, name_ru, name_en, calories))
+        return added
+
+    def _notify(self, added: List[Tuple[int, Optional[str], Optional[str], float]]) -> None:
+        for row in added:
+            for listener in self._listeners:
+                listener(*row)
+
+    def subscribe(self, listener: Callable[[int, Optional[str], Optional[str], float], None]) -> None:
+        self._listeners.append(listener)
+
+    def iter_products(self) -> Iterator[Tuple[int, Optional[str], Optional[str], float]]:
+        return iter(self.connection.execute("SELECT id, name_ru, name_en, calories FROM products").fetchall())
+
+    def lookup(self, name: str) -> Optional[Dict[str, Any]]:
+        query = normalize_text(name)
+        if not query:
+            return None
+        if query in self._pending:
+            return dict(self._pending[query])
+
+        row = self.connection.execute(
+            "SELECT name_ru, name_en, calories FROM products WHERE name_ru = ? OR name_en = ? "
+            "ORDER BY name_ru = ? DESC LIMIT 1",
+            (query, query, query),
+        ).fetchone()
+        if row is None and len(query) >= MIN_FULLTEXT_QUERY_LENGTH:
+            row = self.connection.execute(
+                "SELECT p.name_ru, p.name_en, p.calories FROM products_fts "
+                "JOIN products p ON p.id = products_fts.rowid "
+                "WHERE products_fts MATCH ? ORDER BY rank LIMIT 1",
+                (self._fulltext_query(query),),
+            ).fetchone()
+        if row is None:
+            return None
+
+        name_ru, name_en, calories = row
+        return {"name": name_ru or name_en, "calories": calories}
+
+    def _fulltext_query(self, query: str) -> str:
+        phrase = '"' + query.replace('"', '""') + '"'
+        return phrase + "*" if self._fulltext_prefix else phrase
+
+    def _close_writer(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def close(self) -> None:
+        if self._executor is not None:
+            # дожидаемся записи продуктов, отправленных в поток
+            self._executor.submit(self._close_writer)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+nutrition_index = NutritionIndex()
+
+
+if __name__ == "__main__":
+    # импорт своего набора продуктов: python -m src.nutrition products.csv
+    for csv_path in sys.argv[1:]:
+        print(f"{csv_path}: импортировано {nutrition_index.import_csv(csv_path)} продуктов")
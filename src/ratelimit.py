@@ -0,0 +1,164 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.config import (
+    OPENWEATHERMAP_RATE,
+    OPENWEATHERMAP_BURST,
+    OPENFOODFACTS_RATE,
+    OPENFOODFACTS_BURST,
+    API_NINJAS_RATE,
+    API_NINJAS_BURST,
+    TRANSLATE_RATE,
+    TRANSLATE_BURST,
+    UPSTREAM_QUEUE_SIZE,
+    UPSTREAM_QUEUE_TIMEOUT,
+)
+
+# приоритеты запросов: меньше - важнее
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# приоритет запросов текущей задачи, по умолчанию - команда пользователя
+request_priority: ContextVar[int] = ContextVar("request_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def background_priority() -> Iterator[None]:
+    """Запросы к внешним API внутри блока уступают очередь командам пользователей"""
+    token = request_priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+class UpstreamBusyError(Exception):
+    """Внешний API перегружен: очередь к нему заполнена или ожидание слишком долгое"""
+
+    def __init__(self, upstream: str) -> None:
+        super().__init__(f"Upstream {upstream} is busy")
+        self.upstream: str = upstream
+
+
+class RateLimiter:
+    """Token bucket с очередью по приоритетам для одного внешнего API.
+
+    Если токен есть и никто не ждет, запрос проходит сразу. Иначе запрос встает в
+    очередь: команды пользователей обслуживаются раньше фоновых задач. Если очередь
+    заполнена или токен не выдан за timeout секунд, выбрасывается UpstreamBusyError."""
+
+    def __init__(
+            self,
+            name: str,
+            rate: float,
+            burst: int,
+            max_queue: int = UPSTREAM_QUEUE_SIZE,
+            timeout: float = UPSTREAM_QUEUE_TIMEOUT,
+    ) -> None:
+        # при rate <= 0 токены никогда не восстанавливаются, а расчет паузы делит на rate
+        if rate <= 0:
+            raise ValueError(f"Rate limit for {name} must be positive, got {rate}")
+        if burst < 1:
+            raise ValueError(f"Burst for {name} must be at least 1, got {burst}")
+        self.name: str = name
+        self.rate: float = rate
+        self.burst: int = burst
+        self.max_queue: int = max_queue
+        self.timeout: float = timeout
+        self.tokens: float = float(burst)
+        self.rejected: int = 0
+        self._updated_at: float = time.monotonic()
+        self._waiters: List[tuple] = []
+        self._counter = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, priority: Optional[int] = None) -> None:
+        priority = request_priority.get() if priority is None else priority
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise UpstreamBusyError(self.name)
+
+        entry = (priority, next(self._counter), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, entry)
+        self._schedule()
+        try:
+            await asyncio.wait_for(entry[2], self.timeout)
+        except asyncio.TimeoutError:
+            self._remove(entry)
+            self.rejected += 1
+            raise UpstreamBusyError(self.name)
+        except asyncio.CancelledError:
+            self._remove(entry)
+            raise
+
+    def try_acquire(self) -> bool:
+        """Берет токен, только если он есть прямо сейчас и никто не ждет в очереди"""
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def _remove(self, entry: tuple) -> None:
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+
+    def _schedule(self) -> None:
+        if self._waiters and self._timer is None:
+            delay = max(0.0, (1 - self.tokens) / self.rate)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        self._refill()
+        while self._waiters and self.tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.tokens -= 1
+            future.set_result(None)
+        self._schedule()
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "tokens": self.tokens,
+            "burst": self.burst,
+            "rate": self.rate,
+            "queued_interactive": sum(1 for entry in self._waiters if entry[0] == INTERACTIVE),
+            "queued_background": sum(1 for entry in self._waiters if entry[0] != INTERACTIVE),
+            "rejected": self.rejected,
+        }
+
+
+OPENWEATHERMAP = "openweathermap"
+OPENFOODFACTS = "openfoodfacts"
+API_NINJAS = "api_ninjas"
+TRANSLATE = "translate"
+
+limiters: Dict[str, RateLimiter] = {
+    OPENWEATHERMAP: RateLimiter(OPENWEATHERMAP, OPENWEATHERMAP_RATE, OPENWEATHERMAP_BURST),
+    OPENFOODFACTS: RateLimiter(OPENFOODFACTS, OPENFOODFACTS_RATE, OPENFOODFACTS_BURST),
+    API_NINJAS: RateLimiter(API_NINJAS, API_NINJAS_RATE, API_NINJAS_BURST),
+    TRANSLATE: RateLimiter(TRANSLATE, TRANSLATE_RATE, TRANSLATE_BURST),
+}
+
+
+def get_limiters_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: limiter.stats() for name, limiter in limiters.items()}
@@ -0,0 +1,62 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import List, Optional
+
+from src.charts import init_worker, render_chart
+from src.config import CHART_WORKERS, CHART_MAX_PENDING
+from src.metrics import chart_render_duration
+
+
+class ChartRendererBusyError(Exception):
+    pass
+
+
+class ChartRenderer:
+    """Пул процессов для построения графиков вне event loop.
+
+    Рендер одного графика занимает 100+ мс и блокировал бы обработку апдейтов
+    всех пользователей. Очередь ограничена: если задач больше max_pending,
+    render сразу выбрасывает ChartRendererBusyError вместо того, чтобы копить очередь."""
+
+    def __init__(self, workers: int = CHART_WORKERS, max_pending: int = CHART_MAX_PENDING) -> None:
+        self.workers: int = workers
+        self.max_pending: int = max_pending
+        self.pending: int = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        if self._executor is not None:
+            return
+        # spawn, а не fork: родительский процесс к этому моменту уже держит event loop и сокеты
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+        )
+        # процессы запускаются лениво, поэтому сразу отправляем пустые задачи, чтобы поднять их заранее
+        for _ in range(self.workers):
+            self._executor.submit(int)
+
+    async def render(self, kind: str, dates: List[date], values: List[float], goal: float, step: str = "day") -> bytes:
+        if self.pending >= self.max_pending:
+            raise ChartRendererBusyError("Too many charts are being rendered")
+        self.start()
+        self.pending += 1
+        started_at = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, render_chart, kind, dates, values, goal, step)
+        finally:
+            self.pending -= 1
+            chart_render_duration.observe(time.perf_counter() - started_at, kind)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+chart_renderer = ChartRenderer()
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from src.config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    OPENWEATHERMAP_TIMEOUT,
+    OPENFOODFACTS_TIMEOUT,
+    API_NINJAS_TIMEOUT,
+    TRANSLATE_TIMEOUT,
+)
+from src.ratelimit import OPENWEATHERMAP, OPENFOODFACTS, API_NINJAS, TRANSLATE
+
+
+class CircuitOpenError(Exception):
+    """Запрос не выполнялся: api недавно несколько раз подряд не ответил"""
+
+    def __init__(self, upstream: str) -> None:
+        super().__init__(f"Circuit for {upstream} is open")
+        self.upstream: str = upstream
+
+
+class CircuitBreaker:
+    """Circuit breaker для одного внешнего API.
+
+    После failure_threshold ошибок подряд breaker размыкается, и в течение reset_timeout
+    секунд запросы сразу завершаются CircuitOpenError - вызывающий код отдает кэш или
+    значение по умолчанию вместо ожидания таймаута. Затем пропускается один пробный
+    запрос: при успехе breaker замыкается, при ошибке снова размыкается."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+    ) -> None:
+        self.name: str = name
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self.state: str = self.CLOSED
+        self.failures: int = 0
+        self.rejected: int = 0
+        self._opened_at: float = 0.0
+        self._probe_in_flight: bool = False
+
+    def before_request(self) -> None:
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == self.OPEN or (self.state == self.HALF_OPEN and self._probe_in_flight):
+            self.rejected += 1
+            raise CircuitOpenError(self.name)
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = True
+
+    def release(self) -> None:
+        """Запрос не состоялся по причине, не связанной с api (например, отмена)"""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+async def hedged(
+        make_request: Callable[[], Awaitable[Any]],
+        delay: float,
+        can_hedge: Callable[[], bool] = lambda: True,
+) -> Any:
+    """Выполняет запрос и, если ответа нет через delay секунд, параллельно отправляет второй.
+    Возвращается первый успешный ответ, оставшийся запрос отменяется.
+    Подходит только для идемпотентных запросов."""
+    first = asyncio.ensure_future(make_request())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done or not can_hedge():
+        return await first
+
+    pending = {first, asyncio.ensure_future(make_request())}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+# таймауты всего запроса (соединение + ответ) по каждому api
+timeouts: Dict[str, float] = {
+    OPENWEATHERMAP: OPENWEATHERMAP_TIMEOUT,
+    OPENFOODFACTS: OPENFOODFACTS_TIMEOUT,
+    API_NINJAS: API_NINJAS_TIMEOUT,
+    TRANSLATE: TRANSLATE_TIMEOUT,
+}
+
+breakers: Dict[str, CircuitBreaker] = {name: CircuitBreaker(name) for name in timeouts}
+
+
+def get_breakers_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: breaker.stats() for name, breaker in breakers.items()}
@@ -0,0 +1,102 @@
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from src.api import normalize_city
+from src.config import BOT_MODE, NORMS_SCHEDULE_DELAY, NORMS_CONCURRENCY, SHARD_INDEX, SHARD_WORKERS
+from src.logger import get_logger
+from src.ratelimit import background_priority, UpstreamBusyError
+from src.users import users, weather_client, water_goal_for, calorie_goal_for, fill_norms_for_day
+
+logger = get_logger()
+
+
+def seconds_until_next_run(delay: float, now: Optional[datetime] = None) -> float:
+    now = now or datetime.now()
+    next_run = datetime.combine(now.date(), time.min) + timedelta(seconds=delay)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+class DailyNormsScheduler:
+    """Заполнение норм воды и калорий на новый день для всех пользователей сразу.
+
+    Вскоре после полуночи (по времени сервера, как и "сегодня" в обработчиках) пользователи
+    группируются по городу, погода запрашивается один раз на город (не более concurrency
+    запросов одновременно, с фоновым приоритетом), после чего нормы заполняются пачкой.
+    Пользователей, для города которых погоду получить не удалось, досчитывает
+    ensure_norms_for_day при первом обращении."""
+
+    def __init__(self, delay: float = NORMS_SCHEDULE_DELAY, concurrency: int = NORMS_CONCURRENCY) -> None:
+        self.delay: float = delay
+        self.concurrency: int = concurrency
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(seconds_until_next_run(self.delay))
+            try:
+                await self.run(datetime.now().date())
+            except Exception:
+                logger.exception("Не удалось заполнить нормы на новый день")
+
+    async def _group_by_city(self) -> Dict[str, List[Tuple[int, dict]]]:
+        groups = defaultdict(list)
+        # в режиме шардирования каждый процесс читает из базы только своих пользователей (как shard_for)
+        workers, index = (SHARD_WORKERS, SHARD_INDEX) if BOT_MODE == "worker" else (1, 0)
+        for user_id, profile in await users.load_profiles(workers, index):
+            if profile.get("city"):
+                groups[normalize_city(profile["city"])].append((user_id, profile))
+        return groups
+
+    async def _fetch_temperature(self, city: str, semaphore: asyncio.Semaphore) -> Optional[float]:
+        async with semaphore:
+            with background_priority():
+                try:
+                    weather_data = await weather_client.get_weather_async(city)
+                except UpstreamBusyError:
+                    return None
+        if "error" in weather_data:
+            return None
+        return weather_data.get("main", {}).get("temp")
+
+    async def run(self, day: date) -> Dict[str, int]:
+        groups = await self._group_by_city()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        cities = list(groups)
+        temperatures = await asyncio.gather(*(self._fetch_temperature(city, semaphore) for city in cities))
+
+        filled, skipped, rows = 0, 0, []
+        for city, temperature in zip(cities, temperatures):
+            if temperature is None:
+                skipped += len(groups[city])
+                continue
+            for user_id, profile in groups[city]:
+                if users.is_loaded(user_id):
+                    fill_norms_for_day(user_id, day, temperature)
+                # нормы сохраняются отдельно от статистики, чтобы после перезапуска не считать их заново
+                rows.append((user_id, day, water_goal_for(profile, temperature), calorie_goal_for(profile)))
+                filled += 1
+        await users.fill_day_goals(rows)
+
+        result = {"cities": len(cities), "filled": filled, "skipped": skipped}
+        logger.info(f"Нормы на {day} заполнены: {result}")
+        return result
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+norms_scheduler = DailyNormsScheduler()
@@ -0,0 +1,81 @@
+from typing import Optional, TYPE_CHECKING
+
+import aiohttp
+
+from src.config import (
+    HTTP_CONNECTIONS_LIMIT,
+    HTTP_CONNECTIONS_PER_HOST,
+    HTTP_DNS_CACHE_TTL,
+    HTTP_KEEPALIVE_TIMEOUT,
+)
+
+if TYPE_CHECKING:
+    from googletrans import Translator
+
+
+class SessionRegistry:
+    """Общий пул HTTP-соединений для всех клиентов внешних API.
+
+    Вместо того чтобы открывать новую aiohttp.ClientSession (и заново делать TCP/TLS handshake)
+    на каждый запрос, все клиенты берут одну сессию отсюда. Сессия создается при старте
+    диспетчера и закрывается при его остановке (см. src/app.py)."""
+
+    def __init__(
+            self,
+            limit: int = HTTP_CONNECTIONS_LIMIT,
+            limit_per_host: int = HTTP_CONNECTIONS_PER_HOST,
+            ttl_dns_cache: int = HTTP_DNS_CACHE_TTL,
+            keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+    ) -> None:
+        self.limit: int = limit
+        self.limit_per_host: int = limit_per_host
+        self.ttl_dns_cache: int = ttl_dns_cache
+        self.keepalive_timeout: float = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._translator: Optional["Translator"] = None
+
+    async def start(self) -> None:
+        self.get_session()
+
+    def get_session(self) -> aiohttp.ClientSession:
+        # если клиент используется вне бота (например, из __main__ в src/api.py),
+        # то сессия создается лениво при первом обращении
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self.ttl_dns_cache,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def get_translator(self) -> "Translator":
+        # googletrans работает поверх своего httpx-клиента, поэтому держим один переводчик
+        # на все приложение, чтобы соединение с сервисом перевода тоже переиспользовалось
+        if self._translator is None:
+            # googletrans (и httpx) импортируются только при первом переводе, чтобы не замедлять старт
+            from googletrans import Translator
+            self._translator = Translator()
+        return self._translator
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+        if self._translator is not None:
+            await self._translator.client.aclose()
+        self._translator = None
+
+
+sessions = SessionRegistry()
+
+
+def get_session() -> aiohttp.ClientSession:
+    return sessions.get_session()
+
+
+def get_translator() -> "Translator":
+    return sessions.get_translator()
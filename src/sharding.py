@@ -0,0 +1,277 @@
+import asyncio
+import hmac
+import os
+import signal
+import sys
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from src.config import (
+    BOT_TOKEN,
+    TELEGRAM_API_URL,
+    SHARD_WORKERS,
+    SHARD_INGRESS,
+    SHARD_SOCKET_DIR,
+    SHARD_BUFFER_SIZE,
+    SHARD_POLL_MAX_BACKOFF,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_URL,
+)
+from src.logger import get_logger
+from src.webhook import create_webhook_app, webhook_secret
+
+logger = get_logger()
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKER_UPDATE_PATH = "/update"
+WORKER_HEALTH_PATH = "/health"
+RESTART_DELAY = 1.0
+# long polling getUpdates (сек)
+POLLING_TIMEOUT = 30
+
+
+def get_update_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """user_id автора апдейта (для любого типа апдейта: message, callback_query, inline_query, ...)"""
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        user = value.get("from") or value.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return user["id"]
+        chat = value.get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+    return None
+
+
+def shard_for(user_id: Optional[int], workers: int) -> int:
+    return (user_id or 0) % workers
+
+
+class ShardWorker:
+    """Процесс-обработчик одного шарда и очередь апдейтов для него.
+
+    Апдейты отправляются в процесс строго по одному, чтобы сохранить их порядок. Если
+    процесс упал, он перезапускается, а апдейты его шарда копятся в очереди и
+    доставляются после перезапуска."""
+
+    def __init__(self, index: int, workers: int, socket_dir: str, buffer_size: int) -> None:
+        self.index: int = index
+        self.workers: int = workers
+        self.socket_path: str = os.path.join(socket_dir, f"shard-{index}.sock")
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.ready = asyncio.Event()
+        self.restarts: int = 0
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._stopping: bool = False
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        await self._spawn()
+        self._tasks = [asyncio.create_task(self._monitor()), asyncio.create_task(self._sender())]
+
+    async def _spawn(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        env = dict(os.environ, BOT_MODE="worker", SHARD_INDEX=str(self.index), SHARD_SOCKET=self.socket_path)
+        self._process = await asyncio.create_subprocess_exec(sys.executable, "bot.py", cwd=ROOT_DIR, env=env)
+        await self._wait_ready()
+
+    async def _wait_ready(self) -> None:
+        connector = aiohttp.UnixConnector(path=self.socket_path)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            while self._process.returncode is None:
+                try:
+                    async with session.get(f"http://shard{WORKER_HEALTH_PATH}") as response:
+                        if response.status == 200:
+                            self.ready.set()
+                            return
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.1)
+
+    async def _monitor(self) -> None:
+        while not self._stopping:
+            returncode = await self._process.wait()
+            if self._stopping:
+                return
+            self.ready.clear()
+            self.restarts += 1
+            logger.warning(f"Обработчик шарда {self.index} завершился с кодом {returncode}, перезапуск")
+            await asyncio.sleep(RESTART_DELAY)
+            await self._spawn()
+
+    async def _sender(self) -> None:
+        connector = aiohttp.UnixConnector(path=self.socket_path)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            while True:
+                update = await self.queue.get()
+                while True:
+                    await self.ready.wait()
+                    try:
+                        async with session.post(f"http://shard{WORKER_UPDATE_PATH}", json=update) as response:
+                            if response.status == 200:
+                                break
+                    except aiohttp.ClientError:
+                        pass
+                    # процесс недоступен или перегружен - ждем и повторяем, не теряя порядок
+                    await asyncio.sleep(0.1)
+
+    def submit(self, update: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            logger.warning(f"Буфер шарда {self.index} переполнен, апдейт {update.get('update_id')} пропущен")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        # даем отправить уже полученные апдейты
+        if self.ready.is_set():
+            try:
+                await asyncio.wait_for(self._drain(), 10)
+            except asyncio.TimeoutError:
+                pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._process is not None and self._process.returncode is None:
+            # SIGTERM - процесс останавливает диспетчер и сбрасывает данные на диск
+            self._process.terminate()
+            await self._process.wait()
+
+    async def _drain(self) -> None:
+        while not self.queue.empty():
+            await asyncio.sleep(0.05)
+
+
+class Supervisor:
+    """Фронт для нескольких процессов-обработчиков.
+
+    Получает апдейты (polling или webhook) и передает каждый апдейт процессу, который
+    владеет его пользователем: user_id % число процессов. Так у каждого процесса свой
+    набор пользователей и своя часть данных в памяти, а порядок апдейтов одного
+    пользователя сохраняется."""
+
+    def __init__(self, workers: int = SHARD_WORKERS, socket_dir: str = SHARD_SOCKET_DIR,
+                 buffer_size: int = SHARD_BUFFER_SIZE) -> None:
+        os.makedirs(socket_dir, exist_ok=True)
+        self.shards: List[ShardWorker] = [
+            ShardWorker(index, workers, socket_dir, buffer_size) for index in range(workers)
+        ]
+
+    def route(self, update: Dict[str, Any]) -> None:
+        self.shards[shard_for(get_update_user_id(update), len(self.shards))].submit(update)
+
+    def queue_depths(self) -> List[int]:
+        return [shard.queue.qsize() for shard in self.shards]
+
+    async def run(self, ingress: str = SHARD_INGRESS) -> None:
+        await asyncio.gather(*(shard.start() for shard in self.shards))
+        logger.info(f"Запущено процессов-обработчиков: {len(self.shards)}")
+        try:
+            if ingress == "webhook":
+                await self._run_webhook()
+            else:
+                await self._run_polling()
+        finally:
+            await asyncio.gather(*(shard.stop() for shard in self.shards))
+
+    async def _run_polling(self) -> None:
+        # апдейты получаем "сырыми" и без разбора передаем дальше: фронт не тратит CPU на модели aiogram
+        api_url = (TELEGRAM_API_URL or "https://api.telegram.org").rstrip("/")
+        offset = None
+        delay = 0.0
+        # таймаут запроса чуть больше long polling, иначе зависшее соединение остановит прием апдейтов
+        timeout = aiohttp.ClientTimeout(total=POLLING_TIMEOUT + 10)
+        # webhook снимается первым запросом цикла, с теми же повторами, что и getUpdates
+        webhook_deleted = False
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while True:
+                if delay:
+                    await asyncio.sleep(delay)
+                params = {}
+                method = "getUpdates" if webhook_deleted else "deleteWebhook"
+                if webhook_deleted:
+                    params["timeout"] = POLLING_TIMEOUT
+                    if offset is not None:
+                        params["offset"] = offset
+                try:
+                    async with session.post(f"{api_url}/bot{BOT_TOKEN}/{method}", data=params) as response:
+                        payload = await response.json(content_type=None)
+                except (asyncio.TimeoutError, aiohttp.ClientError, ValueError) as e:
+                    delay = min(max(delay * 2, 1), SHARD_POLL_MAX_BACKOFF)
+                    logger.error(f"{method}: {e!r}, повтор через {delay:.0f} с")
+                    continue
+                if not payload.get("ok"):
+                    # 409 - бот уже получает апдейты в другом месте, 401 - неверный токен, 429 - ограничение частоты
+                    retry_after = payload.get("parameters", {}).get("retry_after")
+                    delay = retry_after or min(max(delay * 2, 1), SHARD_POLL_MAX_BACKOFF)
+                    logger.error(f"{method}: {payload.get('error_code')} {payload.get('description')}, "
+                                 f"повтор через {delay:.0f} с")
+                    continue
+                delay = 0.0
+                if not webhook_deleted:
+                    webhook_deleted = True
+                    continue
+                for update in payload.get("result", []):
+                    self.route(update)
+                    offset = update["update_id"] + 1
+
+    async def _run_webhook(self) -> None:
+        secret_token = webhook_secret()
+
+        async def handle(request: web.Request) -> web.Response:
+            # сравнение за постоянное время, чтобы секрет нельзя было подобрать по времени ответа
+            received = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if secret_token and not hmac.compare_digest(received.encode(), secret_token.encode()):
+                return web.Response(status=401, text="Unauthorized")
+            self.route(await request.json())
+            return web.json_response({})
+
+        app = web.Application()
+        app.router.add_post(WEBHOOK_PATH, handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        if WEBHOOK_URL:
+            async with Bot(token=BOT_TOKEN) as bot:
+                await bot.set_webhook(url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH, secret_token=secret_token)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+
+async def run_shard_worker(dp: Dispatcher, bot: Bot, socket_path: str) -> None:
+    """Процесс-обработчик: получает апдейты своего шарда от супервизора через unix-сокет"""
+    app = create_webhook_app(dp, bot, path=WORKER_UPDATE_PATH, secret_token=None)
+    app.router.add_get(WORKER_HEALTH_PATH, lambda request: web.Response(text="ok"))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.UnixSite(runner, socket_path).start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_supervisor() -> None:
+    # по SIGTERM/SIGINT корректно останавливаем процессы-обработчики, чтобы они сохранили данные
+    task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await Supervisor().run()
+    except asyncio.CancelledError:
+        pass
@@ -0,0 +1,326 @@
+import asyncio
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from src.config import (
+    USERS_DB_PATH,
+    USERS_FLUSH_INTERVAL,
+    USERS_FLUSH_BATCH_SIZE,
+    USERS_FLUSH_MAX_BACKOFF,
+    USERS_MISSING_CACHE_SIZE,
+    USERS_MISSING_TTL,
+)
+from src.logger import get_logger
+from src.timeseries import DailyStats, FIELDS as STATS_FIELDS
+
+logger = get_logger()
+
+PROFILE_FIELDS = ["weight", "height", "age", "activity", "city"]
+NORM_FIELDS = ["water_goal", "calorie_goal"]
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS profiles ("
+    "user_id INTEGER PRIMARY KEY, weight REAL, height REAL, age REAL, activity REAL, city TEXT, "
+    "water_goal REAL, calorie_goal REAL)",
+    "CREATE TABLE IF NOT EXISTS daily_stats ("
+    "user_id INTEGER NOT NULL, day TEXT NOT NULL, logged_water REAL, additional_water REAL, "
+    "logged_calories REAL, burned_calories REAL, water_goal REAL, calorie_goal REAL, "
+    "PRIMARY KEY (user_id, day))",
+    # нормы, заполненные заранее (см. src/scheduler.py), до первой записи пользователя за день:
+    # строка в daily_stats появляется только вместе с активностью
+    "CREATE TABLE IF NOT EXISTS day_goals ("
+    "user_id INTEGER NOT NULL, day TEXT NOT NULL, water_goal REAL, calorie_goal REAL, "
+    "PRIMARY KEY (user_id, day))",
+]
+
+
+class UserStore(dict):
+    """Словарь пользователей с сохранением в SQLite.
+
+    Работает как обычный dict (user_id -> профиль со статистикой), все чтения и
+    изменения идут в памяти. Изменения помечаются через mark_profile_dirty/mark_day_dirty
+    и сбрасываются на диск фоновой задачей пачками в одной транзакции (write-behind),
+    поэтому обработчики никогда не ждут диск. Пользователи, которых нет в памяти,
+    подгружаются из базы при первом обращении."""
+
+    def __init__(
+            self,
+            db_path: str = USERS_DB_PATH,
+            flush_interval: float = USERS_FLUSH_INTERVAL,
+            batch_size: int = USERS_FLUSH_BATCH_SIZE,
+    ) -> None:
+        super().__init__()
+        self.db_path: str = db_path
+        self.flush_interval: float = flush_interval
+        self.batch_size: int = batch_size
+        self._dirty_profiles: Set[int] = set()
+        self._dirty_days: Set[Tuple[int, date]] = set()
+        # user_id -> время, когда выяснилось, что пользователя нет в базе (FIFO, ограничен по размеру)
+        self._missing: "OrderedDict[int, float]" = OrderedDict()
+        self._reader: Optional[sqlite3.Connection] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        # все записи идут через один поток, чтобы sqlite-соединение не гуляло между потоками
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_requested: Optional[asyncio.Event] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        # базу могут одновременно использовать несколько процессов бота (см. src/sharding.py)
+        connection.execute("PRAGMA busy_timeout=5000")
+        for statement in SCHEMA:
+            connection.execute(statement)
+        return connection
+
+    @property
+    def reader(self) -> sqlite3.Connection:
+        if self._reader is None:
+            self._reader = self._connect()
+        return self._reader
+
+    # --- ленивая загрузка -------------------------------------------------
+
+    def __missing__(self, user_id: int) -> Dict[str, Any]:
+        user = self._load(user_id)
+        if user is None:
+            raise KeyError(user_id)
+        return user
+
+    def __contains__(self, user_id: object) -> bool:
+        return dict.__contains__(self, user_id) or self._load(user_id) is not None
+
+    def get(self, user_id: int, default: Any = None) -> Any:
+        try:
+            return self[user_id]
+        except KeyError:
+            return default
+
+    def _load(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        # отсутствие пользователя тоже запоминаем, чтобы не ходить в базу на каждое сообщение
+        if not isinstance(user_id, int) or self._is_known_missing(user_id):
+            return None
+        row = self.reader.execute(
+            f"SELECT {', '.join(PROFILE_FIELDS + NORM_FIELDS)} FROM profiles WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            self._remember_missing(user_id)
+            return None
+
+        user = self._profile_from_row(row)
+        user["stats"] = DailyStats()
+        for day, *values in self.reader.execute(
+                f"SELECT day, {', '.join(STATS_FIELDS)} FROM daily_stats WHERE user_id = ? ORDER BY day", (user_id,)
+        ):
+            user["stats"][date.fromisoformat(day)] = {
+                field: value for field, value in zip(STATS_FIELDS, values) if value is not None
+            }
+        for day, *goals in self.reader.execute(
+                f"SELECT day, {', '.join(NORM_FIELDS)} FROM day_goals WHERE user_id = ?", (user_id,)
+        ):
+            user["stats"].fill_goals(date.fromisoformat(day), dict(zip(NORM_FIELDS, goals)))
+        dict.__setitem__(self, user_id, user)
+        return user
+
+    def _is_known_missing(self, user_id: int) -> bool:
+        checked_at = self._missing.get(user_id)
+        if checked_at is None:
+            return False
+        # профиль мог появиться в базе из другого процесса бота, поэтому запись живет ограниченное время
+        if time.monotonic() - checked_at > USERS_MISSING_TTL:
+            del self._missing[user_id]
+            return False
+        return True
+
+    def _remember_missing(self, user_id: int) -> None:
+        self._missing.pop(user_id, None)
+        self._missing[user_id] = time.monotonic()
+        while len(self._missing) > USERS_MISSING_CACHE_SIZE:
+            self._missing.popitem(last=False)
+
+    @staticmethod
+    def _profile_from_row(row: tuple) -> Dict[str, Any]:
+        profile = dict(zip(PROFILE_FIELDS + NORM_FIELDS, row))
+        user = {field: profile[field] for field in PROFILE_FIELDS}
+        user["daily_norm"] = {field: profile[field] for field in NORM_FIELDS}
+        return user
+
+    def __setitem__(self, user_id: int, user: Dict[str, Any]) -> None:
+        dict.__setitem__(self, user_id, user)
+        self._missing.pop(user_id, None)
+
+    def iter_user_ids(self) -> Iterator[int]:
+        """Все пользователи: и загруженные в память, и оставшиеся только в базе"""
+        seen = set(dict.keys(self))
+        yield from seen
+        for (user_id,) in self.reader.execute("SELECT user_id FROM profiles"):
+            if user_id not in seen:
+                yield user_id
+
+    def is_loaded(self, user_id: int) -> bool:
+        return dict.__contains__(self, user_id)
+
+    def _read_profiles(self, workers: int, index: int) -> List[Tuple[int, Dict[str, Any]]]:
+        # читается не в потоке event loop, поэтому со своим соединением
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                f"SELECT user_id, {', '.join(PROFILE_FIELDS + NORM_FIELDS)} FROM profiles WHERE user_id % ? = ?",
+                (workers, index),
+            ).fetchall()
+        finally:
+            connection.close()
+        return [(user_id, self._profile_from_row(tuple(row))) for user_id, *row in rows]
+
+    async def load_profiles(self, workers: int = 1, index: int = 0) -> List[Tuple[int, Dict[str, Any]]]:
+        """Профили (с дневными нормами) пользователей с user_id % workers == index (шард, см. src/sharding.py).
+
+        База читается в отдельном потоке, профили из памяти важнее прочитанных (в них могут быть
+        еще не сохраненные изменения). Статистика пользователей, которых нет в памяти, не читается"""
+        stored = await asyncio.get_running_loop().run_in_executor(None, self._read_profiles, workers, index)
+        loaded = {user_id: user for user_id, user in dict.items(self) if user_id % workers == index}
+        profiles = [(user_id, loaded.pop(user_id, profile)) for user_id, profile in stored]
+        profiles.extend(loaded.items())
+        return profiles
+
+    # --- write-behind -----------------------------------------------------
+
+    def mark_profile_dirty(self, user_id: int) -> None:
+        self._dirty_profiles.add(user_id)
+        self._request_flush_if_full()
+
+    def mark_day_dirty(self, user_id: int, day: date) -> None:
+        self._dirty_days.add((user_id, day))
+        self._request_flush_if_full()
+
+    def _request_flush_if_full(self) -> None:
+        if (self._flush_requested is not None
+                and len(self._dirty_profiles) + len(self._dirty_days) >= self.batch_size):
+            self._flush_requested.set()
+
+    async def start(self) -> None:
+        if self._flush_task is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="users-writer")
+            self._flush_requested = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        delay = self.flush_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+                delay = self.flush_interval
+            except Exception as e:
+                # изменения уже возвращены в очередь записи (см. flush), повторяем с растущей паузой
+                delay = min(max(delay, self.flush_interval) * 2, USERS_FLUSH_MAX_BACKOFF)
+                logger.error(f"Не удалось сохранить пользователей ({self.pending_writes()} изменений), "
+                             f"повтор через {delay:.1f} с: {e!r}")
+
+    def _take_dirty_rows(self) -> Tuple[List[tuple], List[tuple]]:
+        # снимок данных делается в потоке event loop, в поток записи уходят только готовые строки
+        profiles, days = self._dirty_profiles, self._dirty_days
+        self._dirty_profiles, self._dirty_days = set(), set()
+
+        profile_rows = []
+        for user_id in profiles:
+            user = dict.get(self, user_id)
+            if user is not None:
+                profile_rows.append(
+                    (user_id, *[user.get(f) for f in PROFILE_FIELDS], *[user["daily_norm"].get(f) for f in NORM_FIELDS])
+                )
+
+        day_rows = []
+        for user_id, day in days:
+            user = dict.get(self, user_id)
+            if user is not None and day in user["stats"]:
+                stats = user["stats"][day]
+                day_rows.append((user_id, day.isoformat(), *[stats.get(f) for f in STATS_FIELDS]))
+        return profile_rows, day_rows
+
+    def _write(self, profile_rows: List[tuple], day_rows: List[tuple]) -> None:
+        if self._writer is None:
+            self._writer = self._connect()
+        with self._writer:
+            self._writer.executemany(
+                f"INSERT OR REPLACE INTO profiles (user_id, {', '.join(PROFILE_FIELDS + NORM_FIELDS)}) "
+                f"VALUES ({', '.join('?' * (1 + len(PROFILE_FIELDS) + len(NORM_FIELDS)))})",
+                profile_rows,
+            )
+            self._writer.executemany(
+                f"INSERT OR REPLACE INTO daily_stats (user_id, day, {', '.join(STATS_FIELDS)}) "
+                f"VALUES ({', '.join('?' * (2 + len(STATS_FIELDS)))})",
+                day_rows,
+            )
+
+    async def flush(self) -> None:
+        if not self._dirty_profiles and not self._dirty_days:
+            return
+        profiles, days = self._dirty_profiles, self._dirty_days
+        profile_rows, day_rows = self._take_dirty_rows()
+        try:
+            if self._executor is None:
+                self._write(profile_rows, day_rows)
+            else:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self._write, profile_rows, day_rows)
+        except BaseException:
+            # транзакция откатилась: возвращаем ключи, чтобы строки записались при следующей попытке
+            # (строки берутся из памяти заново, поэтому более поздние изменения не теряются)
+            self._dirty_profiles |= profiles
+            self._dirty_days |= days
+            raise
+
+    def _write_day_goals(self, rows: List[tuple], since: str) -> None:
+        if self._writer is None:
+            self._writer = self._connect()
+        with self._writer:
+            # нормы прошедших дней уже не нужны: активные дни хранят свои нормы в daily_stats
+            self._writer.execute("DELETE FROM day_goals WHERE day < ?", (since,))
+            self._writer.executemany(
+                f"INSERT OR IGNORE INTO day_goals (user_id, day, {', '.join(NORM_FIELDS)}) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    async def fill_day_goals(self, rows: List[Tuple[int, date, float, float]]) -> None:
+        """Сохраняет нормы на день (user_id, день, вода, калории), не создавая дней в статистике.
+        Нормы, уже заданные в статистике дня (например, увеличенные после тренировки), важнее"""
+        if not rows:
+            return
+        since = min(day for _, day, _, _ in rows).isoformat()
+        rows = [(user_id, day.isoformat(), water_goal, calorie_goal) for user_id, day, water_goal, calorie_goal in rows]
+        if self._executor is None:
+            self._write_day_goals(rows, since)
+        else:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write_day_goals, rows, since)
+
+    def pending_writes(self) -> int:
+        return len(self._dirty_profiles) + len(self._dirty_days)
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for connection in (self._reader, self._writer):
+            if connection is not None:
+                connection.close()
+        self._reader = self._writer = None
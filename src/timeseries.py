@@ -0,0 +1,306 @@
+import bisect
+from collections.abc import MutableMapping
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# счетчики, которые появляются у дня сразу при его создании (см. ensure_statistics_exists)
+COUNTER_FIELDS = ("logged_water", "additional_water", "logged_calories", "burned_calories")
+# нормы на день заполняются отдельно и до этого отсутствуют
+GOAL_FIELDS = ("water_goal", "calorie_goal")
+FIELDS = COUNTER_FIELDS + GOAL_FIELDS
+
+INITIAL_CAPACITY = 32
+
+DAY = "day"
+WEEK = "week"
+MONTH = "month"
+# во сколько раз точек может быть больше лимита, чтобы еще прореживать дневные (недельные) данные,
+# а не переходить к более крупным периодам
+DOWNSAMPLE_FACTOR = 4
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+class PeriodRollup:
+    """Суммы счетчиков и число дней со статистикой по периодам (неделям или месяцам).
+
+    Обновляется инкрементально при каждом изменении дня в DailyStats, поэтому
+    выборка за длинный период читает по одной строке на неделю/месяц, а не все дни."""
+
+    __slots__ = ("period_start", "_periods", "_totals")
+
+    def __init__(self, period_start: Callable[[date], date]) -> None:
+        self.period_start = period_start
+        self._periods: List[date] = []
+        # период -> [сумма по каждому из COUNTER_FIELDS..., число дней]
+        self._totals: Dict[date, List[float]] = {}
+
+    def _row(self, day: date) -> List[float]:
+        period = self.period_start(day)
+        row = self._totals.get(period)
+        if row is None:
+            row = self._totals[period] = [0.0] * (len(COUNTER_FIELDS) + 1)
+            bisect.insort(self._periods, period)
+        return row
+
+    def add_day(self, day: date) -> None:
+        self._row(day)[-1] += 1
+
+    def add(self, day: date, field: str, delta: float) -> None:
+        self._row(day)[COUNTER_FIELDS.index(field)] += delta
+
+    def __len__(self) -> int:
+        return len(self._periods)
+
+    def count(self, start: Optional[date] = None) -> int:
+        return len(self._periods) - self._first(start)
+
+    def _first(self, start: Optional[date]) -> int:
+        return 0 if start is None else bisect.bisect_left(self._periods, self.period_start(start))
+
+    def series(self, field: str, start: Optional[date] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Начала периодов (datetime64[D]) и среднее значение поля за день со статистикой в периоде"""
+        position = COUNTER_FIELDS.index(field)
+        periods = self._periods[self._first(start):]
+        rows = [self._totals[period] for period in periods]
+        values = np.array([row[position] / row[-1] if row[-1] else 0.0 for row in rows])
+        return np.array(periods, dtype="datetime64[D]"), values
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Прореживание ряда до threshold точек алгоритмом Largest-Triangle-Three-Buckets:
+    сохраняет форму графика (пики и провалы) в отличие от простого усреднения"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    xs = x.astype("int64").astype(float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            next_lo, next_hi = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+        else:
+            next_lo, next_hi = n - 1, n
+        cx, cy = xs[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs((xs[a] - cx) * (y[lo:hi] - y[a]) - (xs[a] - xs[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return x[selected], y[selected]
+
+
+class DayStats(MutableMapping):
+    """Статистика за один день: представление поверх колонок DailyStats.
+
+    Ведет себя как прежний словарь {поле: значение}, отсутствующее значение (NaN) -> KeyError."""
+
+    __slots__ = ("_series", "_day")
+
+    def __init__(self, series: "DailyStats", day: date) -> None:
+        self._series = series
+        self._day = day
+
+    def __getitem__(self, field: str) -> float:
+        value = self._series.column_buffer(field)[self._series.index(self._day)]
+        if np.isnan(value):
+            raise KeyError(field)
+        return float(value)
+
+    def __setitem__(self, field: str, value: float) -> None:
+        self._series.set_value(self._day, field, value)
+
+    def __delitem__(self, field: str) -> None:
+        self[field] = np.nan
+
+    def __iter__(self) -> Iterator[str]:
+        index = self._series.index(self._day)
+        return (field for field in FIELDS if not np.isnan(self._series.column_buffer(field)[index]))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class DailyStats:
+    """Колоночное хранилище дневной статистики одного пользователя.
+
+    Каждое поле хранится в отдельном numpy-массиве, индекс в массиве - смещение дня
+    от начальной даты буфера, поэтому доступ к дню - O(1), а выборка за период -
+    срез массива без копирования. Буфер растет удвоением в обе стороны.
+    Недельные и месячные суммы счетчиков (rollups) обновляются при каждом изменении дня."""
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY) -> None:
+        self._epoch: Optional[date] = None
+        self._columns = {field: np.full(capacity, np.nan) for field in FIELDS}
+        self._present = np.zeros(capacity, dtype=bool)
+        self._lo = 0
+        self._hi = 0
+        self._count = 0
+        self.rollups: Dict[str, PeriodRollup] = {WEEK: PeriodRollup(week_start), MONTH: PeriodRollup(month_start)}
+        # версии метрик для кэша графиков (см. bump_stats_version в src/users.py)
+        self.versions: Dict[str, int] = {}
+
+    @property
+    def capacity(self) -> int:
+        return len(self._present)
+
+    def index(self, day: date) -> int:
+        if self._epoch is None:
+            raise KeyError(day)
+        return (day - self._epoch).days
+
+    def column_buffer(self, field: str) -> np.ndarray:
+        return self._columns[field]
+
+    def set_value(self, day: date, field: str, value: float) -> None:
+        column = self._columns[field]
+        index = self.index(day)
+        if field in COUNTER_FIELDS:
+            previous = column[index]
+            delta = (0.0 if np.isnan(value) else value) - (0.0 if np.isnan(previous) else previous)
+            if delta:
+                for rollup in self.rollups.values():
+                    rollup.add(day, field, delta)
+        column[index] = value
+
+    def _grow(self, left: int, right: int) -> None:
+        capacity = self.capacity + left + right
+        for field, column in self._columns.items():
+            grown = np.full(capacity, np.nan)
+            grown[left:left + len(column)] = column
+            self._columns[field] = grown
+        present = np.zeros(capacity, dtype=bool)
+        present[left:left + len(self._present)] = self._present
+        self._present = present
+        self._epoch -= timedelta(days=left)
+        self._lo += left
+        self._hi += left
+
+    def _slot(self, day: date) -> int:
+        if self._epoch is None:
+            self._epoch = day
+        index = (day - self._epoch).days
+        if index < 0:
+            self._grow(left=max(-index, self.capacity), right=0)
+        elif index >= self.capacity:
+            self._grow(left=0, right=max(index + 1 - self.capacity, self.capacity))
+        index = (day - self._epoch).days
+
+        if self._count == 0:
+            self._lo, self._hi = index, index + 1
+        else:
+            self._lo, self._hi = min(self._lo, index), max(self._hi, index + 1)
+        return index
+
+    def ensure(self, day: date) -> DayStats:
+        if day not in self:
+            index = self._slot(day)
+            for field in COUNTER_FIELDS:
+                self._columns[field][index] = 0
+            self._present[index] = True
+            self._count += 1
+            for rollup in self.rollups.values():
+                rollup.add_day(day)
+        return DayStats(self, day)
+
+    def fill_goals(self, day: date, goals: Dict[str, float]) -> None:
+        """Задает еще не заданные нормы на день, не создавая сам день: день без записанной
+        активности не попадает в статистику и графики, а при создании (ensure) получает эти нормы"""
+        index = self.index(day) if day in self else self._slot(day)
+        for field, value in goals.items():
+            if value is not None and np.isnan(self._columns[field][index]):
+                self._columns[field][index] = value
+
+    def __contains__(self, day: object) -> bool:
+        if self._epoch is None or not isinstance(day, date):
+            return False
+        index = (day - self._epoch).days
+        return 0 <= index < self.capacity and bool(self._present[index])
+
+    def __getitem__(self, day: date) -> DayStats:
+        if day not in self:
+            raise KeyError(day)
+        return DayStats(self, day)
+
+    def __setitem__(self, day: date, values: dict) -> None:
+        stats = self.ensure(day)
+        # незаданные счетчики - 0, как у нового дня, незаданные нормы - отсутствуют
+        for field in COUNTER_FIELDS:
+            stats[field] = values.get(field, 0)
+        for field in GOAL_FIELDS:
+            stats[field] = values.get(field, np.nan)
+
+    def get(self, day: date, default: Any = None) -> Any:
+        return self[day] if day in self else default
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[date]:
+        for index in np.flatnonzero(self._present[self._lo:self._hi]):
+            yield self._epoch + timedelta(days=int(self._lo + index))
+
+    def count_days(self, start: Optional[date] = None, end: Optional[date] = None) -> int:
+        """Число дней со статистикой в периоде [start, end]"""
+        if self._epoch is None:
+            return 0
+        lo, hi = self._bounds(start, end)
+        return int(np.count_nonzero(self._present[lo:hi]))
+
+    def keys(self) -> List[date]:
+        return list(self)
+
+    def _bounds(self, start: Optional[date], end: Optional[date]) -> Tuple[int, int]:
+        lo = self._lo if start is None else max(self._lo, (start - self._epoch).days)
+        hi = self._hi if end is None else min(self._hi, (end - self._epoch).days + 1)
+        return lo, max(lo, hi)
+
+    def column(self, field: str, start: Optional[date] = None, end: Optional[date] = None) -> np.ndarray:
+        """Значения поля за период [start, end] по всем дням подряд, без копирования.
+
+        Дни без статистики - NaN. Срез ссылается на текущий буфер: после роста буфера
+        он остается корректным, но новые изменения в нем уже не видны."""
+        if self._epoch is None:
+            return np.empty(0)
+        lo, hi = self._bounds(start, end)
+        return self._columns[field][lo:hi]
+
+    def series(self, field: str, start: Optional[date] = None, end: Optional[date] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Даты (datetime64[D]) и значения поля только за дни со статистикой, по возрастанию даты"""
+        if self._epoch is None:
+            return np.empty(0, dtype="datetime64[D]"), np.empty(0)
+        lo, hi = self._bounds(start, end)
+        dates = np.datetime64(self._epoch, "D") + np.arange(lo, hi)
+        values = self._columns[field][lo:hi]
+        present = self._present[lo:hi]
+        if present.all():
+            return dates, values
+        return dates[present], values[present]
+
+    def chart_series(self, field: str, start: Optional[date], max_points: int) -> Tuple[np.ndarray, np.ndarray, str]:
+        """Ряд для графика с началом в start (None - вся история) не длиннее max_points точек.
+
+        Берутся дни, если их не слишком много, иначе средние по неделям или месяцам из rollups,
+        затем лишние точки прореживаются LTTB. Возвращает даты, значения и шаг (DAY/WEEK/MONTH)"""
+        dates, values, step = None, None, DAY
+        if len(self.column(field, start)) <= max_points * DOWNSAMPLE_FACTOR:
+            dates, values = self.series(field, start)
+        else:
+            for step in (WEEK, MONTH):
+                if self.rollups[step].count(start) <= max_points * DOWNSAMPLE_FACTOR or step == MONTH:
+                    dates, values = self.rollups[step].series(field, start)
+                    break
+        dates, values = lttb(dates, values, max_points)
+        return dates, values, step
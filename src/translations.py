@@ -0,0 +1,132 @@
+import json
+import os
+import sqlite3
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.cache import TTLCache
+from src.config import TRANSLATION_CACHE_SIZE, TRANSLATION_DB_PATH
+from src.logger import get_logger
+
+logger = get_logger()
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources")
+
+# словари, которыми база заполняется при первом открытии: язык перевода -> файл
+SEED_DICTIONARIES = {
+    "en": os.path.join(RESOURCES_DIR, "translations_ru_en.json"),
+}
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+class TranslationCache:
+    """Двухуровневый кэш переводов: in-memory LRU поверх SQLite-базы на диске.
+
+    Пользователи постоянно вводят одни и те же слова ("банан", "бег", "гречка"),
+    поэтому переведенное один раз сохраняется и переживает перезапуск бота.
+    Новые переводы сразу попадают в память, а в базу записываются в отдельном потоке."""
+
+    def __init__(self, db_path: str = TRANSLATION_DB_PATH, maxsize: int = TRANSLATION_CACHE_SIZE) -> None:
+        self.db_path: str = db_path
+        self.memory: TTLCache = TTLCache(maxsize=maxsize, ttl=None)
+        self._connection: Optional[sqlite3.Connection] = None
+        # запись идет через один поток со своим соединением, чтобы commit не блокировал event loop
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._writer: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # база открывается лениво, чтобы импорт модуля не трогал диск
+        if self._connection is None:
+            if self.db_path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "dest TEXT NOT NULL, source TEXT NOT NULL, text TEXT NOT NULL, "
+                "PRIMARY KEY (dest, source))"
+            )
+            for dest, path in SEED_DICTIONARIES.items():
+                self.seed_from_file(path, dest)
+        return self._connection
+
+    def seed_from_file(self, path: str, dest: str = "en") -> None:
+        with open(path, encoding="utf-8") as f:
+            self.seed(json.load(f), dest)
+
+    def seed(self, translations: Dict[str, str], dest: str = "en") -> None:
+        # уже сохраненные переводы словарь не перетирает
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO translations (dest, source, text) VALUES (?, ?, ?)",
+            [(dest, normalize_text(source), text) for source, text in translations.items()],
+        )
+        self.connection.commit()
+
+    def get(self, text: str, dest: str = "en") -> Optional[str]:
+        key = (dest, normalize_text(text))
+        translation = self.memory.get(key)
+        if translation is not None:
+            return translation
+
+        row = self.connection.execute(
+            "SELECT text FROM translations WHERE dest = ? AND source = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        self.memory.set(key, row[0])
+        return row[0]
+
+    def get_many(self, texts: Iterable[str], dest: str = "en") -> Dict[str, str]:
+        """Возвращает найденные переводы в виде {нормализованный текст: перевод}"""
+        found = {}
+        for text in texts:
+            translation = self.get(text, dest)
+            if translation is not None:
+                found[normalize_text(text)] = translation
+        return found
+
+    def set_many(self, translations: Dict[str, str], dest: str = "en") -> None:
+        rows = [(dest, normalize_text(source), text) for source, text in translations.items()]
+        for dest_, source, text in rows:
+            self.memory.set((dest_, source), text)
+        # таблица создается при открытии основного соединения
+        self.connection
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="translations-writer")
+        self._executor.submit(self._write, rows).add_done_callback(self._log_write_error)
+
+    def _write(self, rows: List[Tuple[str, str, str]]) -> None:
+        if self._writer is None:
+            self._writer = sqlite3.connect(self.db_path)
+        with self._writer:
+            self._writer.executemany(
+                "INSERT OR REPLACE INTO translations (dest, source, text) VALUES (?, ?, ?)", rows
+            )
+
+    @staticmethod
+    def _log_write_error(future: Future) -> None:
+        # перевод остается в памяти, при ошибке записи он будет запрошен заново после перезапуска
+        if future.exception() is not None:
+            logger.error(f"Не удалось сохранить переводы: {future.exception()!r}")
+
+    def _close_writer(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def close(self) -> None:
+        if self._executor is not None:
+            # дожидаемся записи переводов, отправленных в поток
+            self._executor.submit(self._close_writer)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+translation_cache = TranslationCache()
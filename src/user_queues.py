@@ -0,0 +1,90 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from src.config import USER_QUEUE_MAX_SIZE, USER_QUEUE_IDLE_TIMEOUT
+
+
+class UserQueueFullError(Exception):
+    pass
+
+
+class UserQueues:
+    """Последовательная обработка апдейтов одного пользователя при параллельной обработке разных.
+
+    Обработчики делают read-modify-write над данными пользователя с await между чтением
+    и записью, поэтому апдейты одного пользователя нельзя обрабатывать одновременно.
+    У каждого пользователя своя ограниченная очередь и свой обработчик-задача, которая
+    завершается и удаляется после idle_timeout секунд без новых апдейтов."""
+
+    def __init__(self, max_size: int = USER_QUEUE_MAX_SIZE, idle_timeout: float = USER_QUEUE_IDLE_TIMEOUT) -> None:
+        self.max_size: int = max_size
+        self.idle_timeout: float = idle_timeout
+        self._queues: Dict[Hashable, Tuple[asyncio.Queue, asyncio.Task]] = {}
+
+    async def run(self, key: Hashable, job: Callable[[], Awaitable[Any]]) -> Any:
+        """Ставит job в очередь пользователя key и ждет результата его выполнения"""
+        if key in self._queues:
+            queue = self._queues[key][0]
+        else:
+            queue = asyncio.Queue(maxsize=self.max_size)
+            self._queues[key] = (queue, asyncio.create_task(self._worker(key, queue)))
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            queue.put_nowait((job, future))
+        except asyncio.QueueFull:
+            raise UserQueueFullError(f"Queue for {key} is full")
+        return await future
+
+    async def _worker(self, key: Hashable, queue: asyncio.Queue) -> None:
+        try:
+            while True:
+                try:
+                    job, future = await asyncio.wait_for(queue.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    # между проверкой и удалением (в finally) нет await, поэтому новый апдейт не потеряется
+                    if queue.empty():
+                        return
+                    continue
+
+                if future.cancelled():
+                    continue
+                try:
+                    result = await job()
+                except asyncio.CancelledError:
+                    future.cancel()
+                    # отменен сам обработчик очереди (close), а не только job
+                    if asyncio.current_task().cancelling():
+                        raise
+                except BaseException as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    if not isinstance(e, Exception):
+                        raise
+                else:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            # очередь без обработчика не должна оставаться в _queues, иначе апдейты пользователя
+            # копились бы в ней без обработки; оставшиеся в ней апдейты отменяются
+            if key in self._queues and self._queues[key][0] is queue:
+                del self._queues[key]
+            while not queue.empty():
+                queue.get_nowait()[1].cancel()
+
+    def depths(self) -> Dict[Hashable, int]:
+        """Число ожидающих апдейтов в очереди каждого пользователя"""
+        return {key: queue.qsize() for key, (queue, _) in self._queues.items()}
+
+    def __len__(self) -> int:
+        return len(self._queues)
+
+    async def close(self) -> None:
+        tasks = [task for _, task in self._queues.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._queues.clear()
+
+
+user_queues = UserQueues()
@@ -1,13 +1,24 @@
+import itertools
 import random
 from datetime import datetime, date, timedelta
-from src.api import WeatherApiClient
-from src.config import OPEN_WEATHER_MAP_TOKEN
+from src.activities import activity_catalog
+from src.clients import get_weather_client
+from src.config import CHART_MAX_POINTS
+from src.storage import UserStore
+from src.timeseries import DailyStats
 
-users = {}
+# профили и статистика хранятся в памяти и в фоне сохраняются в SQLite (см. UserStore),
+# поэтому после каждого изменения нужно вызвать users.mark_profile_dirty/mark_day_dirty
+users = UserStore()
 
-weather_client = WeatherApiClient(OPEN_WEATHER_MAP_TOKEN)
+# версия статистики по метрике хранится в DailyStats пользователя и меняется при каждом
+# изменении, по ней проверяется актуальность закэшированных графиков. Номера берутся из
+# общего счетчика, чтобы версия не повторилась после замены статистики новым профилем
+stats_version_counter = itertools.count(1)
 
-HIGH_INTENSIVE_TRAINING_ACTIVITIES = ["бег", "плавание", "прыжки"]
+weather_client = get_weather_client()
+
+HIGH_INTENSIVE_TRAINING_ACTIVITIES = activity_catalog.high_intensive_activities()
 
 
 def add_user(user_id: int, user_data: dict):
@@ -30,38 +41,58 @@ def add_user(user_id: int, user_data: dict):
                     - 5 * user_data.get("age")
             ),
         },
-        "stats": {}
+        "stats": DailyStats()
     }
+    users.mark_profile_dirty(user_id)
+    # на графиках рисуется норма из профиля, поэтому закэшированные графики устаревают
+    bump_stats_version(user_id, "logged_water", "logged_calories", "burned_calories")
 
 
 def is_user_exists(user_id: int):
     return user_id in users
 
 
+def get_stats_version(user_id: int, key: str):
+    return users[user_id]["stats"].versions.get(key, 0)
+
+
+def bump_stats_version(user_id: int, *keys: str):
+    versions = users[user_id]["stats"].versions
+    version = next(stats_version_counter)
+    for key in keys:
+        versions[key] = version
+
+
 def ensure_statistics_exists(user_id: int, date: date):
     if date not in users[user_id]["stats"]:
-        users[user_id]["stats"][date] = {
-            "logged_water": 0,
-            "additional_water": 0,
-            "logged_calories": 0,
-            "burned_calories": 0,
-        }
+        # новый день: счетчики воды и калорий равны 0, нормы на день пока не заданы
+        users[user_id]["stats"].ensure(date)
+        users.mark_day_dirty(user_id, date)
+        # новый день - новая точка на всех графиках
+        bump_stats_version(user_id, "logged_water", "logged_calories", "burned_calories")
 
 
 def add_water(user_id: int, date: date, volume: float):
     users[user_id]["stats"][date]["logged_water"] += volume
+    users.mark_day_dirty(user_id, date)
+    bump_stats_version(user_id, "logged_water")
 
 
 def inc_water_norm(user_id: int, date: date, volume: float):
     users[user_id]["stats"][date]["additional_water"] += volume
+    users.mark_day_dirty(user_id, date)
 
 
 def burn_calories(user_id: int, date: date, amount: float):
     users[user_id]["stats"][date]["burned_calories"] += amount
+    users.mark_day_dirty(user_id, date)
+    bump_stats_version(user_id, "burned_calories")
 
 
 def add_calories(user_id: int, date: date, amount: float):
     users[user_id]["stats"][date]["logged_calories"] += amount
+    users.mark_day_dirty(user_id, date)
+    bump_stats_version(user_id, "logged_calories")
 
 
 def get_user_statistic_and_profile(user_id: int, date: date):
@@ -74,6 +105,10 @@ def get_user_basenorm(user_id: int):
     return users[user_id]["daily_norm"]
 
 
+def get_user_weight(user_id: int):
+    return users[user_id]["weight"]
+
+
 async def set_norms_for_day(user_id: int, city: str):
     today = datetime.now().date()
 
@@ -82,13 +117,25 @@ async def set_norms_for_day(user_id: int, city: str):
     add_calorie_goal_for_day(user_id, today)
 
 
+def water_goal_for(user: dict, temperature):
+    return (user["daily_norm"]["water_goal"] +
+            # +500−1000мл  за жаркую погоду (> 25°C).
+            (500 if temperature and temperature > 25 else 0))
+
+
+def calorie_goal_for(user: dict):
+    return (user["daily_norm"]["calorie_goal"] +
+            # +300 кал за высокую активность (> 60 мин/день).
+            (300 if user["activity"] > 60 else 0))
+
+
 async def add_water_goal_for_day(user_id: int, date: date, city):
     weather_data = await weather_client.get_weather_async(city)
-    temperature = weather_data["main"]["temp"]
+    # если погоду получить не удалось ({"error": ...}), считаем норму без поправки на жару
+    temperature = weather_data.get("main", {}).get("temp")
 
-    users[user_id]["stats"][date]["water_goal"] = (users[user_id]["daily_norm"]["water_goal"] +
-                                                    # +500−1000мл  за жаркую погоду (> 25°C).
-                                                   (500 if temperature and temperature > 25 else 0))
+    users[user_id]["stats"][date]["water_goal"] = water_goal_for(users[user_id], temperature)
+    users.mark_day_dirty(user_id, date)
 
 
 def get_calorie_goal_for_day(user_id: int, date: date):
@@ -96,10 +143,31 @@ def get_calorie_goal_for_day(user_id: int, date: date):
 
 
 def add_calorie_goal_for_day(user_id: int, date: date):
-    activity_level = users[user_id]['activity']
-    users[user_id]["stats"][date]["calorie_goal"] = (users[user_id]["daily_norm"]["calorie_goal"] +
-                                                     # +300 кал за высокую активность (> 60 мин/день).
-                                                     (300 if activity_level > 60 else 0))
+    users[user_id]["stats"][date]["calorie_goal"] = calorie_goal_for(users[user_id])
+    users.mark_day_dirty(user_id, date)
+
+
+async def ensure_norms_for_day(user_id: int, date: date):
+    """Нормы на день обычно заранее заполняет планировщик (см. src/scheduler.py),
+    здесь досчитываются нормы пользователей, которых он пропустил"""
+    ensure_statistics_exists(user_id, date)
+    stats = users[user_id]["stats"][date]
+    if "water_goal" not in stats:
+        await add_water_goal_for_day(user_id, date, users[user_id]["city"])
+    if "calorie_goal" not in stats:
+        add_calorie_goal_for_day(user_id, date)
+
+
+def fill_norms_for_day(user_id: int, date: date, temperature):
+    """Заполняет незаданные нормы на день пользователя, загруженного в память.
+    Сам день в статистике не создается, пока пользователь ничего не записал"""
+    stats = users[user_id]["stats"]
+    stats.fill_goals(date, {
+        "water_goal": water_goal_for(users[user_id], temperature),
+        "calorie_goal": calorie_goal_for(users[user_id]),
+    })
+    if date in stats:
+        users.mark_day_dirty(user_id, date)
 
 
 def inc_calorie_goal_for_day(user_id: int, date: date, activity: str, burned_calories: int):
@@ -109,20 +177,27 @@ def inc_calorie_goal_for_day(user_id: int, date: date, activity: str, burned_cal
     # добавляем к дневной норме число калорий, сожженных на тренировке
     # с коэффициентом 0.8 если это высокоинтенсивная тренировка, 0.5 иначе
     users[user_id]["stats"][date]["calorie_goal"] += coef * burned_calories
+    users.mark_day_dirty(user_id, date)
 
     return coef * burned_calories
 
 
-def get_stats(user_id, key):
-    stats = users[user_id]['stats']
-    dates = list(stats.keys())
-    logged_water = [stats[day][key] for day in dates]
-    return dates, logged_water
+def period_start(days=None):
+    """Первый день периода из последних days дней, None - все время"""
+    return None if days is None else datetime.now().date() - timedelta(days=days - 1)
+
+
+def get_stats(user_id, key, days=None):
+    """Даты, значения и шаг (день/неделя/месяц) для графика за последние days дней (None - за все время).
+    Длинная история берется из недельных/месячных сумм и прореживается до CHART_MAX_POINTS точек"""
+    return users[user_id]['stats'].chart_series(key, period_start(days), CHART_MAX_POINTS)
 
 
-def get_active_days(user_id):
-    stats = users[user_id]['stats']
-    return len(list(stats.keys()))
+def get_active_days(user_id, days=None):
+    """Число дней со статистикой за последние days дней (None - за все время)"""
+    if user_id not in users:
+        return 0
+    return users[user_id]['stats'].count_days(period_start(days))
 
 
 def get_user_daily_calorie_goal(user_id: int):
@@ -1,13 +1,20 @@
-import io
-import matplotlib.pyplot as plt
+import os
+import tempfile
+from datetime import datetime
+
+from src.analytics import build_report, format_report
+from src.charts import WATER_CHART, CALORIES_CHART
+from src.export import export_filename, export_to_file
+from src.jobs import process_jobs
 from src.logger import get_logger
-from src.config import OPEN_WEATHER_MAP_TOKEN, WORKOUT_API_TOKEN
-from src.api import WeatherApiClient, WorkoutApiClient, ProductsApiClient
-from src.users import get_user_daily_calorie_goal, get_user_daily_water_goal
+from src.clients import get_weather_client, get_workout_client, get_product_client
+from src.renderer import chart_renderer, ChartRendererBusyError
+from src.timeseries import DAY
+from src.users import get_user_daily_calorie_goal, get_user_daily_water_goal, users
 
-weather_client = WeatherApiClient(OPEN_WEATHER_MAP_TOKEN)
-workout_client = WorkoutApiClient(WORKOUT_API_TOKEN)
-product_client = ProductsApiClient()
+weather_client = get_weather_client()
+workout_client = get_workout_client()
+product_client = get_product_client()
 logger = get_logger()
 
 
@@ -28,42 +35,104 @@ def parse_and_validate(value: str, lower_bound: int, upper_bound: int):
     return None
 
 
+def is_food_items(text: str) -> bool:
+    """Список продуктов с весом ("банан 120", "банан 120, гречка 200"), а не одно название ("куриная грудка")"""
+    parts = text.split()
+    return "," in text or (len(parts) > 1 and parts[-1].lower().removesuffix("гр").removesuffix("г")
+                            .replace(".", "", 1).isdigit())
+
+
+def parse_food_items(text: str):
+    """Разбор списка продуктов вида "банан 120, гречка 200" в [(название, граммы), ...].
+    Возвращает None, если хотя бы один продукт записан некорректно"""
+    items = []
+    for item in text.split(","):
+        parts = item.split()
+        if not parts:
+            continue
+        if len(parts) < 2:
+            return None
+
+        # допускаем запись "120г" и "120гр"
+        amount = parts[-1].lower().removesuffix("гр").removesuffix("г")
+        name = " ".join(parts[:-1]).capitalize()
+        if not amount.replace(".", "", 1).isdigit() or not all(
+                part.isalpha() for part in name.replace("-", " ").split()):
+            return None
+
+        grams = parse_and_validate(amount, 1, 5000)
+        if not grams:
+            return None
+        items.append((name, grams))
+    return items or None
+
+
+def parse_inline_query(text: str, default_grams: float):
+    """Разбор inline-запроса вида "банан 150" в (начало названия, граммы)"""
+    parts = text.split()
+    if parts:
+        amount = parts[-1].lower().removesuffix("гр").removesuffix("г")
+        grams = parse_and_validate(amount, 1, 5000) if amount.replace(".", "", 1).isdigit() else None
+        if grams:
+            return " ".join(parts[:-1]), grams
+    return " ".join(parts), default_grams
+
+
+# единицы периода графика в днях: 7d, 4w, 6m, 1y
+CHART_RANGE_UNITS = {"d": 1, "w": 7, "m": 30, "y": 365}
+CHART_RANGE_NAMES = {"d": "дн.", "w": "нед.", "m": "мес.", "y": "г."}
+
+
+def parse_chart_range(value: str):
+    """Разбор периода графика: "30d" -> ("30d", 30), "all" -> ("all", None), некорректный -> None"""
+    value = value.strip().lower()
+    if value == "all":
+        return value, None
+    count, unit = value[:-1], value[-1:]
+    if unit not in CHART_RANGE_UNITS or not count.isdigit() or not 0 < int(count) * CHART_RANGE_UNITS[unit] <= 36500:
+        return None
+    return value, int(count) * CHART_RANGE_UNITS[unit]
+
+
+def chart_range_caption(label: str):
+    return "за все время" if label == "all" else f"за {label[:-1]} {CHART_RANGE_NAMES[label[-1]]}"
+
+
 def log_command(command: str, user_id: int, username: str):
-    logger.info(f"Получена команда /{command} от пользователя {user_id}, {username}")
-
-
-def create_water_chart(user_id, dates, logged_water):
-    plt.figure(figsize=(10, 5))
-    plt.plot(dates, logged_water, marker='o', linestyle='-', color='b', label='Суточное потребление (мл)')
-    plt.axhline(y=get_user_daily_water_goal(user_id), color='r', linestyle='--', label='Суточная норма (мл)')
-    plt.title("Потребление воды")
-    plt.xlabel("Дата")
-    plt.ylabel("Количество воды (мл)")
-    plt.xticks(rotation=45)
-    plt.legend()
-    plt.tight_layout()
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    plt.close()
-    return buf.read()
-
-
-def create_calories_chart(user_id, dates, logged_water):
-    plt.figure(figsize=(10, 5))
-    plt.plot(dates, logged_water, marker='o', linestyle='-', color='b', label='Суточное потребление (ккал)')
-    plt.axhline(y=get_user_daily_calorie_goal(user_id), color='r', linestyle='--', label='Суточная норма (ккал)')
-    plt.title("Потребление калорий")
-    plt.xlabel("Дата")
-    plt.ylabel("Количество (ккал)")
-    plt.xticks(rotation=45)
-    plt.legend()
-    plt.tight_layout()
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    plt.close()
-    return buf.read()
+    logger.info(
+        f"Получена команда /{command} от пользователя {user_id}, {username}",
+        extra={"fields": {"event": "command", "command": command, "user_id": user_id, "username": username}},
+    )
+
+
+async def create_water_chart(user_id, dates, logged_water, step=DAY):
+    return await chart_renderer.render(WATER_CHART, dates, logged_water, get_user_daily_water_goal(user_id), step)
+
+
+async def create_calories_chart(user_id, dates, logged_water, step=DAY):
+    return await chart_renderer.render(CALORIES_CHART, dates, logged_water, get_user_daily_calorie_goal(user_id), step)
+
+
+async def create_report(days: int) -> str:
+    """Отчет по всем пользователям (см. src/analytics.py)"""
+    # процесс отчета читает базу напрямую, поэтому сначала сбрасываем несохраненные изменения
+    await users.flush()
+    report = await process_jobs.run(build_report, users.db_path, days, datetime.now().date())
+    return format_report(report)
+
+
+async def create_export(export_format: str, compress: bool, since):
+    """Выгрузка всех пользователей во временный файл (см. src/export.py).
+    Возвращает (путь к файлу, имя для отправки, число строк); файл удаляет вызывающий"""
+    await users.flush()
+    fd, path = tempfile.mkstemp(prefix="export-")
+    os.close(fd)
+    try:
+        rows = await process_jobs.run(export_to_file, path, export_format, compress, since, users.db_path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, export_filename(export_format, compress, since, datetime.now().date()), rows
 
 
 async def check_city(city: str):
@@ -0,0 +1,99 @@
+import asyncio
+import secrets
+from typing import Any, Dict, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from src.config import (
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_URL,
+    WEBHOOK_SECRET,
+    WEBHOOK_MAX_CONCURRENCY,
+    WEBHOOK_MAX_PENDING,
+)
+from src.logger import get_logger
+
+logger = get_logger()
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """Обработчик webhook-запросов от Telegram с ограничением нагрузки.
+
+    Проверяет секретный токен, сразу отвечает Telegram и обрабатывает апдейт в фоне,
+    при этом одновременно обрабатывается не больше max_concurrency апдейтов. Если в
+    очереди уже max_pending апдейтов, отвечаем 503 - Telegram повторит доставку позже."""
+
+    def __init__(
+            self,
+            dispatcher: Dispatcher,
+            bot: Bot,
+            secret_token: Optional[str] = WEBHOOK_SECRET,
+            max_concurrency: int = WEBHOOK_MAX_CONCURRENCY,
+            max_pending: int = WEBHOOK_MAX_PENDING,
+            **data: Any,
+    ) -> None:
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.max_pending: int = max_pending
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    # _background_feed_update и _background_feed_update_tasks - внутренние методы aiogram,
+    # поэтому версия aiogram закреплена в requirements.txt и проверяется tests/test_webhook.py
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        async with self._semaphore:
+            await super()._background_feed_update(bot, update)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if len(self._background_feed_update_tasks) >= self.max_pending:
+            return web.Response(status=503, text="Too many pending updates")
+        return await super().handle(request)
+
+    def pending_updates(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+
+def webhook_secret() -> Optional[str]:
+    """Секрет для проверки запросов Telegram. Публичный webhook (WEBHOOK_URL) без секрета принимал бы
+    апдейты от кого угодно, поэтому если WEBHOOK_SECRET не задан, на время запуска генерируется случайный:
+    set_webhook передает его Telegram при каждом запуске"""
+    if WEBHOOK_SECRET or not WEBHOOK_URL:
+        return WEBHOOK_SECRET
+    logger.warning("WEBHOOK_SECRET не задан, используется случайный секрет")
+    return secrets.token_urlsafe(32)
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot, path: str = WEBHOOK_PATH, **handler_kwargs: Any) -> web.Application:
+    app = web.Application()
+    BoundedRequestHandler(dispatcher=dp, bot=bot, **handler_kwargs).register(app, path=path)
+    # запуск и остановка диспетчера (on_startup/on_shutdown в src/app.py) привязываются к приложению
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT) -> None:
+    """Запуск бота в режиме webhook. Для локальной проверки можно не задавать WEBHOOK_URL
+    и отправлять записанные апдейты вручную:
+    curl -X POST -H "Content-Type: application/json" -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \
+        -d @update.json http://localhost:8080/webhook"""
+    secret_token = webhook_secret()
+    app = create_webhook_app(dp, bot, secret_token=secret_token)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=secret_token,
+            max_connections=min(WEBHOOK_MAX_CONCURRENCY, 100),
+            drop_pending_updates=True,
+        )
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
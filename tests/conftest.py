@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# src.config требует токены при импорте: для тестов достаточно фиктивных значений,
+# к внешним API тесты не обращаются
+os.environ.setdefault("BOT_TOKEN", "42:test")
+os.environ.setdefault("OPEN_WEATHER_MAP_TOKEN", "test")
+os.environ.setdefault("WORKOUT_API_TOKEN", "test")
+os.environ.setdefault("ADMIN_USER_ID", "1")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bot-tests-"))
@@ -0,0 +1,19 @@
+from src.activities import REFERENCE_WEIGHT_KG, ActivityCatalog
+
+
+def test_remote_activity_is_available_at_once_and_after_restart(tmp_path):
+    db_path = str(tmp_path / "activities.db")
+    catalog = ActivityCatalog(db_path=db_path)
+    assert catalog.lookup("Жонглирование") is None
+
+    catalog.add_remote("Жонглирование", "Juggling", 2 * REFERENCE_WEIGHT_KG)
+    assert catalog.lookup("жонглирование")["met"] == 2
+    # close дожидается записи в отдельном потоке
+    catalog.close()
+    catalog.close()
+
+    catalog = ActivityCatalog(db_path=db_path)
+    activity = catalog.lookup("жонглирование")
+    assert activity["name"] == "Juggling"
+    assert catalog.calories_per_hour(activity, 50) == 100
+    catalog.close()
@@ -0,0 +1,91 @@
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from src.analytics import build_report, format_report, streaks
+from src.storage import SCHEMA
+
+TODAY = date(2026, 1, 10)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "users.db")
+    connection = sqlite3.connect(path)
+    for statement in SCHEMA:
+        connection.execute(statement)
+    connection.executemany(
+        "INSERT INTO profiles VALUES (?, 70, 180, 30, 45, ?, 2000, 2000)",
+        [(1, "Москва"), (2, "Казань"), (3, "Москва")],
+    )
+    rows = []
+    # пользователь 1 выполняет обе нормы все 7 дней отчета
+    for offset in range(7):
+        rows.append((1, (TODAY - timedelta(days=offset)).isoformat(), 2500, 0, 1500, 0, 2000, 2000))
+    # пользователь 2 пьет мало и не записывает еду, один день - до начала отчета
+    for offset in (0, 1, 9):
+        rows.append((2, (TODAY - timedelta(days=offset)).isoformat(), 500, 0, 0, 0, 2000, 2000))
+    connection.executemany("INSERT INTO daily_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    connection.commit()
+    connection.close()
+    return path
+
+
+def test_build_report(db_path):
+    report = build_report(db_path, days=7, today=TODAY)
+    assert report["since"] == "2026-01-04"
+    assert report["profiles"] == 3
+    assert report["rows"] == 9
+    assert report["active_users"] == 2
+    assert report["water_days_rate"] == pytest.approx(7 / 9)
+    assert report["calorie_days_rate"] == 1.0
+    assert report["median_user_water_rate"] == 0.5
+    assert report["water_streaks"] == {"users": 1, "median_longest": 7, "max_longest": 7, "active": 1,
+                                       "mean_active": 7.0}
+    assert report["moving_average"]["active_users"] == (pytest.approx(9 / 7), None)
+    assert report["cities"] == [
+        {"city": "Москва", "users": 2, "active_users": 1, "water_days_rate": 1.0},
+        {"city": "Казань", "users": 1, "active_users": 1, "water_days_rate": 0.0},
+    ]
+    assert "Москва" in format_report(report)
+
+
+def test_build_report_without_stats(tmp_path):
+    path = str(tmp_path / "empty.db")
+    connection = sqlite3.connect(path)
+    for statement in SCHEMA:
+        connection.execute(statement)
+    connection.close()
+    report = build_report(path, days=30, today=TODAY)
+    assert report["rows"] == 0 and report["profiles"] == 0
+    assert format_report(report)
+
+
+def test_streaks():
+    user_ids = np.array([1, 1, 1, 1, 2, 2])
+    days = np.array([0, 1, 2, 4, 3, 4])
+    met = np.array([True, True, False, True, True, True])
+    result = streaks(user_ids, days, met, today=4)
+    assert result["max_longest"] == 2
+    assert result["users"] == 2
+    # текущие серии: день 4 у пользователя 1 и дни 3-4 у пользователя 2
+    assert result["active"] == 2
+    assert result["mean_active"] == 1.5
+
+
+def test_days_after_today_are_ignored(db_path):
+    connection = sqlite3.connect(db_path)
+    connection.executemany(
+        "INSERT INTO daily_stats VALUES (?, ?, 500, 0, 0, 0, 2000, 2000)",
+        [(1, (TODAY + timedelta(days=offset)).isoformat()) for offset in (1, 3)],
+    )
+    connection.commit()
+    connection.close()
+    report = build_report(db_path, days=7, today=TODAY)
+    assert report["rows"] == 9
+    assert report["water_days_rate"] == pytest.approx(7 / 9)
+    # серия пользователя 1 по-прежнему продолжается сегодня
+    assert report["water_streaks"]["active"] == 1 and report["water_streaks"]["max_longest"] == 7
+    assert report["moving_average"]["active_users"] == (pytest.approx(9 / 7), None)
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from src.autocomplete import ProductSuggester
+from src.nutrition import NutritionIndex
+
+
+@pytest.fixture
+def suggester(tmp_path):
+    index = NutritionIndex(db_path=str(tmp_path / "nutrition.db"))
+    yield ProductSuggester(index)
+    index.close()
+
+
+def names(suggestions):
+    return [suggestion.name for suggestion in suggestions]
+
+
+def test_prefix_of_whole_name_and_of_word(suggester):
+    assert names(suggester.search("бан", user_id=1))[0] == "Банан"
+    assert "Банан" in names(suggester.search("banan", user_id=1))
+
+
+def test_typo_matches_by_trigrams(suggester):
+    assert "Банан" in names(suggester.search("бонан", user_id=1))
+
+
+def test_trigram_posting_lists_have_no_duplicates(suggester):
+    suggester.search("", user_id=1)
+    suggester.add(10_000, "латте", "латте", 50)
+    for product_ids in suggester._trigrams.values():
+        assert len(product_ids) == len(set(product_ids))
+
+
+def test_products_added_to_index_are_suggested(suggester):
+    suggester.search("", user_id=1)
+    suggester.index.add("куриная грудка", "chicken breast", 113, "openfoodfacts")
+    # дожидаемся записи в отдельном потоке
+    suggester.index.close()
+    assert names(suggester.search("груд", user_id=1))[0] == "Куриная грудка"
+
+
+def test_remote_product_is_found_before_and_after_write(tmp_path):
+    db_path = str(tmp_path / "nutrition.db")
+
+    async def main():
+        index = NutritionIndex(db_path=db_path)
+        added = []
+        index.subscribe(lambda *row: added.append(row))
+        index.add("Мангостин", "mangosteen", 73, "openfoodfacts")
+        # до записи в базу продукт ищется в памяти
+        assert index.lookup("мангостин") == {"name": "мангостин", "calories": 73}
+        assert index.lookup("Mangosteen")["calories"] == 73
+        index.close()
+        # подписчики вызываются в потоке event loop после записи
+        await asyncio.sleep(0)
+        assert added[-1][1:] == ("мангостин", "mangosteen", 73)
+        assert not index._pending
+
+    asyncio.run(main())
+    index = NutritionIndex(db_path=db_path)
+    assert index.lookup("мангостин") == {"name": "мангостин", "calories": 73}
+    index.close()
+
+
+def test_recent_products_are_ranked_first(suggester):
+    suggester.remember(7, "груша")
+    assert names(suggester.search("", user_id=7)) == ["Груша"]
+    assert names(suggester.search("г", user_id=7))[0] == "Груша"
+    assert names(suggester.search("", user_id=8)) == []
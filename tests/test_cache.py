@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import pytest
+
+from src.cache import TTLCache
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_ttl_expiry():
+    cache = TTLCache(maxsize=10, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = TTLCache(maxsize=10, ttl=None)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(5)))
+        assert results == ["value"] * 5
+        assert await cache.get_or_load("key", loader) == "value"
+
+    asyncio.run(main())
+    assert len(calls) == 1
+    assert cache.coalesced == 4
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_failed_load_is_not_cached():
+    cache = TTLCache(maxsize=10, ttl=None)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0)
+        raise RuntimeError("upstream")
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(3)),
+                                       return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        with pytest.raises(RuntimeError):
+            await cache.get_or_load("key", loader)
+
+    asyncio.run(main())
+    assert len(calls) == 2
+    assert "key" not in cache
+
+
+def test_should_cache_rejects_value():
+    cache = TTLCache(maxsize=10, ttl=None)
+
+    async def loader():
+        return {"error": "not found"}
+
+    async def main():
+        return await cache.get_or_load("key", loader, should_cache=lambda value: "error" not in value)
+
+    assert asyncio.run(main()) == {"error": "not found"}
+    assert "key" not in cache
+
+
+def test_cancelled_waiter_does_not_cancel_load():
+    cache = TTLCache(maxsize=10, ttl=None)
+
+    async def loader():
+        await asyncio.sleep(0.02)
+        return "value"
+
+    async def main():
+        first = asyncio.create_task(cache.get_or_load("key", loader))
+        second = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        assert await second == "value"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(main())
+    assert cache.get("key") == "value"
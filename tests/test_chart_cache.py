@@ -0,0 +1,72 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+import src.users as users_module
+from src.chart_cache import ChartCache
+from src.storage import UserStore
+
+DAY = date(2026, 1, 10)
+USER_ID = 7
+PROFILE = {"weight": 70, "height": 180, "age": 30, "activity": 30, "city": "москва"}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = UserStore(db_path=str(tmp_path / "users.db"))
+    monkeypatch.setattr(users_module, "users", store)
+    users_module.add_user(USER_ID, PROFILE)
+    users_module.ensure_statistics_exists(USER_ID, DAY)
+    yield store
+    asyncio.run(store.close())
+
+
+def cache_chart(cache, key):
+    version = (users_module.get_stats_version(USER_ID, key), DAY)
+    cache.set(USER_ID, key, version, b"png", file_id="file-1")
+    return version
+
+
+def test_cached_file_id_is_reused_while_version_is_the_same(store):
+    cache = ChartCache()
+    version = cache_chart(cache, "logged_water")
+    # изменение другой метрики не сбрасывает график воды
+    users_module.add_calories(USER_ID, DAY, 300)
+    assert users_module.get_stats_version(USER_ID, "logged_water") == version[0]
+    assert cache.get(USER_ID, "logged_water", version).file_id == "file-1"
+
+
+def test_version_bump_invalidates_cached_file_id(store):
+    cache = ChartCache()
+    version = cache_chart(cache, "logged_water")
+    users_module.add_water(USER_ID, DAY, 250)
+    new_version = (users_module.get_stats_version(USER_ID, "logged_water"), DAY)
+    assert new_version != version
+    assert cache.get(USER_ID, "logged_water", new_version) is None
+
+
+def test_new_profile_never_repeats_an_old_version(store):
+    cache = ChartCache()
+    version = cache_chart(cache, "logged_calories")
+    # новый профиль - новая статистика, но версия не начинается заново
+    users_module.add_user(USER_ID, PROFILE)
+    new_version = (users_module.get_stats_version(USER_ID, "logged_calories"), DAY)
+    assert new_version[0] > version[0]
+    assert cache.get(USER_ID, "logged_calories", new_version) is None
+
+
+def test_versions_live_in_user_stats(store):
+    assert not hasattr(users_module, "stats_versions")
+    assert set(store[USER_ID]["stats"].versions) == {"logged_water", "logged_calories", "burned_calories"}
+
+
+def test_cache_is_bounded_by_png_size():
+    cache = ChartCache(max_bytes=10)
+    cache.set(1, "water", 1, b"12345")
+    cache.set(2, "water", 1, b"12345")
+    assert cache.get(1, "water", 1) is not None
+    cache.set(3, "water", 1, b"12345")
+    # вытесняется давно не запрошенный график пользователя 2
+    assert cache.get(2, "water", 1) is None
+    assert len(cache) == 2 and cache.size_bytes == 10
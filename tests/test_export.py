@@ -0,0 +1,126 @@
+import csv
+import gzip
+import io
+import json
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+import src.export as export
+from src.storage import SCHEMA
+
+TODAY = date(2026, 1, 10)
+USERS = 25
+DAYS = 8
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "users.db")
+    connection = sqlite3.connect(path)
+    for statement in SCHEMA:
+        connection.execute(statement)
+    connection.executemany(
+        "INSERT INTO profiles VALUES (?, ?, 180, 30, 45, ?, ?, 2000)",
+        [(user_id, 60 + user_id, "Москва" if user_id % 2 else "Казань", 1800 + user_id) for user_id in range(1, USERS + 1)],
+    )
+    # у последнего пользователя нет статистики
+    connection.executemany(
+        "INSERT INTO daily_stats VALUES (?, ?, ?, 0, ?, 0, 2000, NULL)",
+        [(user_id, (TODAY - timedelta(days=offset)).isoformat(), 100.5 * offset, 1000 + user_id)
+         for user_id in range(1, USERS) for offset in range(DAYS)],
+    )
+    connection.commit()
+    connection.close()
+    return path
+
+
+def expected_rows(db_path, since=None):
+    connection = sqlite3.connect(db_path)
+    rows = [row for chunk in export.iter_export_rows(connection, since) for row in chunk]
+    connection.close()
+    return rows
+
+
+def test_rows_are_streamed_in_chunks(db_path, monkeypatch):
+    monkeypatch.setattr(export, "CHUNK_ROWS", 7)
+    connection = sqlite3.connect(db_path)
+    chunks = export.iter_export_rows(connection)
+    first = next(chunks)
+    assert len(first) == 7
+    sizes = [len(first)] + [len(chunk) for chunk in chunks]
+    connection.close()
+
+    total = (USERS - 1) * DAYS + 1
+    assert sum(sizes) == total
+    assert sizes[:-1] == [7] * (len(sizes) - 1) and 0 < sizes[-1] <= 7
+
+
+def test_rows_order_and_user_without_stats(db_path):
+    rows = expected_rows(db_path)
+    day = export.COLUMNS.index("day")
+    keys = [(row[0], row[day] or "") for row in rows]
+    assert keys == sorted(keys)
+    # полная выгрузка включает пользователя без статистики с пустым днем
+    assert rows[-1][0] == USERS and rows[-1][day] is None
+
+
+def test_since_keeps_only_recent_days(db_path):
+    since = TODAY - timedelta(days=1)
+    rows = expected_rows(db_path, since)
+    days = {row[export.COLUMNS.index("day")] for row in rows}
+    assert days == {since.isoformat(), TODAY.isoformat()}
+    assert len(rows) == (USERS - 1) * 2
+
+
+def test_csv_round_trip(db_path, tmp_path):
+    path = str(tmp_path / "export.csv")
+    assert export.export_to_file(path, export.CSV, db_path=db_path) == (USERS - 1) * DAYS + 1
+    with open(path, encoding="utf-8", newline="") as file:
+        reader = csv.reader(file)
+        assert next(reader) == export.COLUMNS
+        written = list(reader)
+    assert written == [["" if value is None else str(value) for value in row] for row in expected_rows(db_path)]
+
+
+def test_ndjson_round_trip(db_path, tmp_path):
+    path = str(tmp_path / "export.ndjson")
+    export.export_to_file(path, export.NDJSON, db_path=db_path)
+    with open(path, encoding="utf-8") as file:
+        records = [json.loads(line) for line in file]
+    assert records == [dict(zip(export.COLUMNS, row)) for row in expected_rows(db_path)]
+    assert records[0]["city"] == "Москва"
+
+
+@pytest.mark.parametrize("export_format", export.EXPORT_FORMATS)
+def test_gzip_matches_plain_export(db_path, tmp_path, export_format):
+    plain, compressed = str(tmp_path / "plain"), str(tmp_path / "compressed.gz")
+    since = TODAY - timedelta(days=3)
+    rows = export.export_to_file(plain, export_format, since=since, db_path=db_path)
+    assert export.export_to_file(compressed, export_format, compress=True, since=since, db_path=db_path) == rows
+    with gzip.open(compressed, "rt", encoding="utf-8", newline="") as file, \
+            open(plain, encoding="utf-8", newline="") as expected:
+        assert file.read() == expected.read()
+
+
+def test_write_export_consumes_chunk_generator():
+    chunks = ([(user_id,) + (None,) * (len(export.COLUMNS) - 1)] * 3 for user_id in range(4))
+    file = io.StringIO()
+    assert export.write_export(chunks, file, export.NDJSON) == 12
+    assert len(file.getvalue().splitlines()) == 12
+
+
+def test_parse_export_args():
+    assert export.parse_export_args(None) == (export.CSV, False, None)
+    assert export.parse_export_args("") == (export.CSV, False, None)
+    assert export.parse_export_args("NDJSON gz 2026-01-01") == (export.NDJSON, True, date(2026, 1, 1))
+    assert export.parse_export_args("2026-01-01 gzip csv") == (export.CSV, True, date(2026, 1, 1))
+    assert export.parse_export_args("xml") is None
+    assert export.parse_export_args("2026-13-01") is None
+
+
+def test_export_filename():
+    assert export.export_filename(export.CSV, False, None, TODAY) == "export-2026-01-10.csv"
+    assert (export.export_filename(export.NDJSON, True, date(2026, 1, 1), TODAY)
+            == "export-2026-01-10-since-2026-01-01.ndjson.gz")
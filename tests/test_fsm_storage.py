@@ -0,0 +1,134 @@
+import asyncio
+import importlib.util
+import sqlite3
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from src.fsm_storage import SQLiteStorage, create_fsm_storage
+
+KEY = StorageKey(bot_id=42, chat_id=7, user_id=7)
+OTHER_KEY = StorageKey(bot_id=42, chat_id=8, user_id=8)
+HAS_REDIS = importlib.util.find_spec("redis") is not None
+
+
+async def round_trip(storage):
+    await storage.set_state(KEY, "ProfileSetup:weight")
+    await storage.set_data(KEY, {"weight": 70.0, "city": "Москва"})
+    assert await storage.get_state(KEY) == "ProfileSetup:weight"
+    assert await storage.get_data(KEY) == {"weight": 70.0, "city": "Москва"}
+    assert await storage.get_state(OTHER_KEY) is None
+    assert await storage.get_data(OTHER_KEY) == {}
+
+    await storage.set_state(KEY, None)
+    await storage.set_data(KEY, {})
+    assert await storage.get_state(KEY) is None
+    assert await storage.get_data(KEY) == {}
+
+
+def test_sqlite_round_trip(tmp_path):
+    async def main():
+        storage = SQLiteStorage(str(tmp_path / "fsm.db"))
+        await round_trip(storage)
+        await storage.close()
+        # повторное закрытие (aiogram и on_shutdown) ничего не делает
+        await storage.close()
+
+    asyncio.run(main())
+    # пустое состояние без данных не хранится
+    connection = sqlite3.connect(str(tmp_path / "fsm.db"))
+    assert connection.execute("SELECT count(*) FROM fsm").fetchone() == (0,)
+    connection.close()
+
+
+def test_sqlite_state_survives_restart(tmp_path):
+    async def main():
+        storage = SQLiteStorage(str(tmp_path / "fsm.db"))
+        await storage.set_state(KEY, "FoodLogging:amount")
+        await storage.set_data(KEY, {"product": "Банан"})
+        await storage.close()
+
+        storage = SQLiteStorage(str(tmp_path / "fsm.db"))
+        assert await storage.get_state(KEY) == "FoodLogging:amount"
+        assert await storage.get_data(KEY) == {"product": "Банан"}
+        await storage.close()
+
+    asyncio.run(main())
+
+
+def test_sqlite_own_writes_keep_cache(tmp_path):
+    async def main():
+        storage = SQLiteStorage(str(tmp_path / "fsm.db"))
+        await storage.set_state(KEY, "A:a")
+        await storage.set_state(OTHER_KEY, "B:b")
+        assert await storage.get_state(KEY) == "A:a"
+        assert len(storage.cache) == 2
+        await storage.close()
+
+    asyncio.run(main())
+
+
+def test_sqlite_sees_writes_of_another_process(tmp_path):
+    async def main():
+        first = SQLiteStorage(str(tmp_path / "fsm.db"))
+        second = SQLiteStorage(str(tmp_path / "fsm.db"))
+        await first.set_state(KEY, "A:a")
+        assert await second.get_state(KEY) == "A:a"
+
+        await second.set_state(KEY, "A:b")
+        assert await first.get_state(KEY) == "A:b"
+        await first.set_data(KEY, {"step": 2})
+        assert await second.get_data(KEY) == {"step": 2}
+        assert await second.get_state(KEY) == "A:b"
+        await first.close()
+        await second.close()
+
+    asyncio.run(main())
+
+
+def test_create_fsm_storage_backends(tmp_path):
+    assert isinstance(create_fsm_storage("memory"), MemoryStorage)
+    with pytest.raises(ValueError):
+        create_fsm_storage("mongo")
+
+
+class FakeRedis:
+    """Минимальная замена клиента redis.asyncio.Redis в памяти: только то, что использует RedisStorage"""
+
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, name):
+        return self.values.get(name)
+
+    async def set(self, name, value, ex=None, px=None):
+        self.values[name] = value.encode() if isinstance(value, str) else value
+
+    async def delete(self, *names):
+        for name in names:
+            self.values.pop(name, None)
+
+    async def aclose(self, close_connection_pool=None):
+        pass
+
+
+@pytest.mark.skipif(not HAS_REDIS, reason="redis is an optional dependency (requirements-redis.txt)")
+def test_redis_round_trip_with_injected_client():
+    client = FakeRedis()
+
+    async def main():
+        storage = create_fsm_storage("redis", client=client)
+        await round_trip(storage)
+        await storage.set_state(KEY, "ProfileSetup:city")
+        # второй процесс с тем же сервером видит то же состояние
+        assert await create_fsm_storage("redis", client=client).get_state(KEY) == "ProfileSetup:city"
+        await storage.close()
+
+    asyncio.run(main())
+
+
+@pytest.mark.skipif(HAS_REDIS, reason="redis is installed")
+def test_redis_backend_without_package_fails_clearly():
+    with pytest.raises(RuntimeError, match="requirements-redis.txt"):
+        create_fsm_storage("redis")
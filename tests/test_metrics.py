@@ -0,0 +1,71 @@
+import math
+import re
+
+import pytest
+
+from src.metrics import Metric, Registry
+
+# строка значения в текстовом формате Prometheus: имя{метка="значение",...} число
+SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"(?:,|$)')
+
+
+def parse_exposition(text):
+    """Разбор вывода /metrics: {имя: {"help", "type"}} и список (имя, метки, значение)"""
+    assert text.endswith("\n")
+    metadata, samples = {}, []
+    for line in text.splitlines():
+        if line.startswith("# HELP ") or line.startswith("# TYPE "):
+            _, kind, name, value = line.split(" ", 3)
+            metadata.setdefault(name, {})[kind.lower()] = value
+            continue
+        match = SAMPLE_RE.match(line)
+        assert match, f"invalid sample line: {line!r}"
+        name, labels, value = match.groups()
+        label_pairs = LABEL_RE.findall(labels or "")
+        assert ",".join(f'{k}="{v}"' for k, v in label_pairs) == (labels or "")
+        samples.append((name, dict(label_pairs), float(value)))
+    return metadata, samples
+
+
+def test_metric_requires_samples():
+    with pytest.raises(TypeError):
+        Metric("bot_metric", "Без samples")
+
+
+def test_exposition_text_parses():
+    registry = Registry()
+    counter = registry.counter("bot_requests_total", "Запросы", ("cache", "result"))
+    gauge = registry.gauge("bot_queue_depth", "Глубина очереди")
+    histogram = registry.histogram("bot_duration_seconds", "Время", ("command",), buckets=(0.1, 1.0))
+
+    counter.inc("weather", "hit")
+    counter.inc("weather", "hit", amount=2)
+    counter.inc('wea"ther\\', "miss")
+    counter.add_callback(lambda: {("nutrition", "hit"): 5})
+    gauge.set(3)
+    for value in (0.05, 0.1, 0.5, 7):
+        histogram.observe(value, "log_food")
+
+    metadata, samples = parse_exposition(registry.render())
+    assert metadata == {
+        "bot_requests_total": {"help": "Запросы", "type": "counter"},
+        "bot_queue_depth": {"help": "Глубина очереди", "type": "gauge"},
+        "bot_duration_seconds": {"help": "Время", "type": "histogram"},
+    }
+
+    values = {(name, tuple(sorted(labels.items()))): value for name, labels, value in samples}
+    assert values[("bot_requests_total", (("cache", "weather"), ("result", "hit")))] == 3
+    assert values[("bot_requests_total", (("cache", 'wea\\"ther\\\\'), ("result", "miss")))] == 1
+    assert values[("bot_requests_total", (("cache", "nutrition"), ("result", "hit")))] == 5
+    assert values[("bot_queue_depth", ())] == 3
+
+    # интервалы гистограммы накопительные и заканчиваются +Inf
+    buckets = [(labels, value) for name, labels, value in samples if name == "bot_duration_seconds_bucket"]
+    assert buckets == [
+        ({"command": "log_food", "le": "0.1"}, 2),
+        ({"command": "log_food", "le": "1.0"}, 3),
+        ({"command": "log_food", "le": "+Inf"}, 4),
+    ]
+    assert values[("bot_duration_seconds_count", (("command", "log_food"),))] == 4
+    assert math.isclose(values[("bot_duration_seconds_sum", (("command", "log_food"),))], 7.65)
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+
+from src.ratelimit import BACKGROUND, INTERACTIVE, RateLimiter, UpstreamBusyError
+
+
+def test_rate_limiter_burst_then_queue():
+    async def main():
+        limiter = RateLimiter("test", rate=20, burst=2, max_queue=1, timeout=1)
+        await limiter.acquire()
+        await limiter.acquire()
+        assert not limiter.try_acquire()
+
+        started = time.monotonic()
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        # очередь заполнена: следующий запрос отклоняется сразу
+        with pytest.raises(UpstreamBusyError):
+            await limiter.acquire()
+        await queued
+        assert time.monotonic() - started >= 0.04
+        assert limiter.rejected == 1
+
+    asyncio.run(main())
+
+
+def test_rate_limiter_serves_interactive_first():
+    async def main():
+        limiter = RateLimiter("test", rate=50, burst=1, max_queue=10, timeout=1)
+        await limiter.acquire()
+        order = []
+
+        async def request(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+
+        tasks = [asyncio.create_task(request(f"background-{i}", BACKGROUND)) for i in range(2)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("interactive", INTERACTIVE)))
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ["interactive", "background-0", "background-1"]
+
+
+def test_rate_limiter_timeout():
+    async def main():
+        limiter = RateLimiter("test", rate=0.1, burst=1, max_queue=10, timeout=0.02)
+        await limiter.acquire()
+        with pytest.raises(UpstreamBusyError):
+            await limiter.acquire()
+        assert limiter.stats()["queued_interactive"] == 0
+        assert limiter.rejected == 1
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("rate, burst", [(0, 1), (-1, 1), (1, 0)])
+def test_rate_limiter_rejects_invalid_config(rate, burst):
+    with pytest.raises(ValueError):
+        RateLimiter("test", rate=rate, burst=burst)
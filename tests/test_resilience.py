@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+from src.resilience import CircuitBreaker, CircuitOpenError
+
+
+def test_circuit_breaker_opens_after_threshold():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    assert breaker.rejected == 1
+
+
+def test_circuit_breaker_success_resets_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_breaker_half_open_probe():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    # после паузы пропускается ровно один пробный запрос
+    breaker.before_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.02)
+    breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_request()
@@ -0,0 +1,68 @@
+import asyncio
+import sqlite3
+from datetime import date
+
+import pytest
+
+import src.scheduler as scheduler
+import src.users as users_module
+from src.storage import UserStore
+from src.timeseries import DailyStats
+
+DAY = date(2026, 1, 10)
+
+
+def profile(city):
+    return {"weight": 70, "height": 180, "age": 30, "activity": 30, "city": city,
+            "daily_norm": {"water_goal": 2400, "calorie_goal": 1700}}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = UserStore(db_path=str(tmp_path / "users.db"))
+    for user_id in range(1, 7):
+        store[user_id] = {**profile("Москва" if user_id % 2 else "Казань"), "stats": DailyStats()}
+        store.mark_profile_dirty(user_id)
+    asyncio.run(store.flush())
+    # в памяти остается только пользователь 1, остальные - только в базе
+    for user_id in range(2, 7):
+        dict.pop(store, user_id)
+    monkeypatch.setattr(scheduler, "users", store)
+    monkeypatch.setattr(users_module, "users", store)
+    yield store
+    asyncio.run(store.close())
+
+
+def test_load_profiles_reads_only_own_shard(store):
+    store[1]["city"] = "Сочи"
+    store[7] = {**profile("Москва"), "stats": DailyStats()}
+    profiles = dict(asyncio.run(store.load_profiles(workers=2, index=1)))
+    assert sorted(profiles) == [1, 3, 5, 7]
+    # профиль из памяти важнее сохраненного
+    assert profiles[1]["city"] == "Сочи"
+    assert not store.is_loaded(3)
+
+
+def test_nightly_run_does_not_create_days(store, monkeypatch):
+    async def temperature(city, semaphore):
+        return 30 if city == "москва" else 10
+
+    norms_scheduler = scheduler.DailyNormsScheduler()
+    monkeypatch.setattr(norms_scheduler, "_fetch_temperature", temperature)
+    result = asyncio.run(norms_scheduler.run(DAY))
+    assert result == {"cities": 2, "filled": 6, "skipped": 0}
+
+    stats = store[1]["stats"]
+    assert DAY not in stats and len(stats) == 0
+    stats.ensure(DAY)
+    assert stats[DAY]["water_goal"] == 2900
+
+    connection = sqlite3.connect(store.db_path)
+    assert connection.execute("SELECT count(*) FROM daily_stats").fetchone() == (0,)
+    goals = dict(connection.execute("SELECT user_id, water_goal FROM day_goals WHERE day = ?", (DAY.isoformat(),)))
+    connection.close()
+    assert goals == {1: 2900, 2: 2400, 3: 2900, 4: 2400, 5: 2900, 6: 2400}
+    # пользователь, загруженный после ночного расчета, получает нормы без появления дня
+    assert DAY not in store[2]["stats"]
+    store[2]["stats"].ensure(DAY)
+    assert store[2]["stats"][DAY]["water_goal"] == 2400
@@ -0,0 +1,106 @@
+import asyncio
+import sqlite3
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+import src.storage as storage
+from src.storage import UserStore
+from src.timeseries import DailyStats
+
+DAY = date(2026, 1, 10)
+
+
+def profile(city="Москва"):
+    return {"weight": 70.0, "height": 180.0, "age": 30.0, "activity": 45.0, "city": city,
+            "daily_norm": {"water_goal": 2550.0, "calorie_goal": 1675.0}, "stats": DailyStats()}
+
+
+def add_user(store, user_id, water=0.0):
+    store[user_id] = profile()
+    store[user_id]["stats"].ensure(DAY)
+    store[user_id]["stats"][DAY]["logged_water"] += water
+    store.mark_profile_dirty(user_id)
+    store.mark_day_dirty(user_id, DAY)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "users.db")
+
+
+def test_changes_survive_restart(db_path):
+    async def main():
+        store = UserStore(db_path=db_path, flush_interval=60)
+        await store.start()
+        add_user(store, 1, water=250)
+        store[1]["city"] = "Казань"
+        await store.close()
+        assert store.pending_writes() == 0
+
+    asyncio.run(main())
+    store = UserStore(db_path=db_path)
+    assert store[1]["city"] == "Казань"
+    assert store[1]["daily_norm"] == {"water_goal": 2550.0, "calorie_goal": 1675.0}
+    assert store[1]["stats"][DAY]["logged_water"] == 250
+    assert 2 not in store
+    asyncio.run(store.close())
+
+
+def test_failed_flush_keeps_dirty_keys(db_path, monkeypatch):
+    store = UserStore(db_path=db_path)
+    add_user(store, 1, water=250)
+    write = store._write
+
+    def failing_write(profile_rows, day_rows):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(store, "_write", failing_write)
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(store.flush())
+    assert store.pending_writes() == 2
+
+    # изменение после неудачной записи тоже попадает в базу при повторе
+    store[1]["stats"][DAY]["logged_water"] += 100
+    monkeypatch.setattr(store, "_write", write)
+    asyncio.run(store.flush())
+    assert store.pending_writes() == 0
+    asyncio.run(store.close())
+
+    connection = sqlite3.connect(db_path)
+    assert connection.execute("SELECT logged_water FROM daily_stats WHERE user_id = 1").fetchall() == [(350,)]
+    connection.close()
+
+
+def test_missing_user_is_cached_until_ttl(db_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(storage, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    monkeypatch.setattr(storage, "USERS_MISSING_TTL", 60)
+    store = UserStore(db_path=db_path)
+    assert 1 not in store
+    assert 1 in store._missing
+
+    # профиль появился в базе из другого процесса бота
+    other = UserStore(db_path=db_path)
+    add_user(other, 1)
+    asyncio.run(other.close())
+
+    now[0] += 30
+    assert 1 not in store
+    now[0] += 31
+    assert 1 in store
+    assert 1 not in store._missing
+    asyncio.run(store.close())
+
+
+def test_missing_cache_is_bounded(db_path, monkeypatch):
+    monkeypatch.setattr(storage, "USERS_MISSING_CACHE_SIZE", 2)
+    store = UserStore(db_path=db_path)
+    for user_id in range(1, 4):
+        assert store.get(user_id) is None
+    assert list(store._missing) == [2, 3]
+    # новый профиль убирает пользователя из кэша отсутствующих
+    store[3] = profile()
+    assert list(store._missing) == [2]
+    asyncio.run(store.close())
@@ -0,0 +1,121 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from src.timeseries import DAY, MONTH, WEEK, DailyStats, PeriodRollup, lttb, month_start, week_start
+
+MONDAY = date(2026, 1, 5)
+
+
+def test_ensure_creates_day_with_zero_counters():
+    stats = DailyStats()
+    day = stats.ensure(MONDAY)
+    assert MONDAY in stats and len(stats) == 1
+    assert dict(day) == {"logged_water": 0, "additional_water": 0, "logged_calories": 0, "burned_calories": 0}
+    with pytest.raises(KeyError):
+        day["water_goal"]
+
+
+def test_setitem_defaults_counters_to_zero_and_goals_to_missing():
+    stats = DailyStats()
+    stats[MONDAY] = {"logged_water": 500, "water_goal": 2000}
+    day = stats[MONDAY]
+    assert day["logged_water"] == 500 and day["water_goal"] == 2000
+    assert day["logged_calories"] == 0
+    assert "calorie_goal" not in day
+    day["logged_calories"] += 300
+    assert day["logged_calories"] == 300
+
+
+def test_buffer_grows_in_both_directions():
+    stats = DailyStats(capacity=4)
+    days = [MONDAY, MONDAY + timedelta(days=40), MONDAY - timedelta(days=100)]
+    for i, day in enumerate(days):
+        stats.ensure(day)["logged_water"] = i + 1
+    assert sorted(stats) == sorted(days)
+    assert [stats[day]["logged_water"] for day in days] == [1, 2, 3]
+    dates, values = stats.series("logged_water")
+    assert list(values) == [3, 1, 2]
+    assert dates[0] == np.datetime64(days[2])
+    assert len(stats.column("logged_water")) == 141
+
+
+def test_fill_goals_does_not_create_day():
+    stats = DailyStats()
+    stats.fill_goals(MONDAY, {"water_goal": 2000, "calorie_goal": 1800})
+    assert MONDAY not in stats and len(stats) == 0
+    assert len(stats.series("logged_water")[0]) == 0
+
+    stats.ensure(MONDAY)
+    assert stats[MONDAY]["water_goal"] == 2000
+    # уже заданная норма не перезаписывается
+    stats.fill_goals(MONDAY, {"water_goal": 2500})
+    assert stats[MONDAY]["water_goal"] == 2000
+
+
+def test_count_days_in_period():
+    stats = DailyStats()
+    for offset in (0, 1, 100, 102):
+        stats.ensure(MONDAY + timedelta(days=offset))
+    assert stats.count_days() == 4
+    assert stats.count_days(MONDAY + timedelta(days=100)) == 2
+    assert stats.count_days(MONDAY + timedelta(days=101)) == 1
+    assert stats.count_days(MONDAY + timedelta(days=200)) == 0
+    assert stats.count_days(MONDAY - timedelta(days=50), MONDAY) == 1
+    assert DailyStats().count_days() == 0
+
+
+def test_period_rollup_series_is_mean_per_active_day():
+    rollup = PeriodRollup(week_start)
+    for offset, water in ((0, 1000), (2, 2000), (7, 500)):
+        day = MONDAY + timedelta(days=offset)
+        rollup.add_day(day)
+        rollup.add(day, "logged_water", water)
+    dates, values = rollup.series("logged_water")
+    assert list(dates) == [np.datetime64(MONDAY), np.datetime64(MONDAY + timedelta(days=7))]
+    assert list(values) == [1500, 500]
+    assert rollup.count(MONDAY + timedelta(days=7)) == 1
+
+
+def test_rollups_follow_counter_changes():
+    stats = DailyStats()
+    stats.ensure(MONDAY)["logged_water"] += 800
+    stats.ensure(MONDAY + timedelta(days=1))["logged_water"] += 400
+    stats[MONDAY]["logged_water"] = 200
+    _, values = stats.rollups[WEEK].series("logged_water")
+    assert list(values) == [300]
+    _, values = stats.rollups[MONTH].series("logged_water")
+    assert list(values) == [300]
+    assert month_start(MONDAY) == date(2026, 1, 1)
+
+
+def test_chart_series_switches_to_weeks_for_long_history():
+    stats = DailyStats()
+    for offset in range(1000):
+        stats.ensure(MONDAY + timedelta(days=offset))["logged_water"] = offset
+
+    dates, values, step = stats.chart_series("logged_water", MONDAY + timedelta(days=970), max_points=120)
+    assert step == DAY and len(dates) == 30
+
+    dates, values, step = stats.chart_series("logged_water", None, max_points=120)
+    assert step == WEEK
+    assert len(dates) == 120
+    assert np.all(np.diff(dates.astype("int64")) > 0)
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.datetime64("2026-01-01") + np.arange(1000)
+    y = np.sin(np.arange(1000) / 50.0)
+    y[500] = 10
+    sampled_x, sampled_y = lttb(x, y, 50)
+    assert len(sampled_x) == 50
+    assert sampled_x[0] == x[0] and sampled_x[-1] == x[-1]
+    assert 10 in sampled_y
+    assert np.all(np.diff(sampled_x.astype("int64")) > 0)
+
+
+def test_lttb_returns_short_series_unchanged():
+    x = np.arange(10)
+    y = np.arange(10.0)
+    assert lttb(x, y, 20)[0] is x
@@ -0,0 +1,154 @@
+import asyncio
+import random
+import time
+
+import pytest
+from aiogram.types import Update
+
+from src.middlewares import UserOrderingMiddleware
+from src.user_queues import UserQueueFullError, UserQueues
+
+
+class Fatal(BaseException):
+    pass
+
+
+def test_updates_of_one_user_are_processed_in_order():
+    queues = UserQueues(max_size=100, idle_timeout=1)
+    processed = {}
+
+    async def job(user_id, number):
+        await asyncio.sleep(random.random() / 100)
+        processed.setdefault(user_id, []).append(number)
+        return number
+
+    async def main():
+        results = await asyncio.gather(*(
+            queues.run(user_id, lambda user_id=user_id, number=number: job(user_id, number))
+            for number in range(20) for user_id in range(3)
+        ))
+        await queues.close()
+        return results
+
+    results = asyncio.run(main())
+    assert results == [number for number in range(20) for _ in range(3)]
+    assert processed == {user_id: list(range(20)) for user_id in range(3)}
+
+
+def test_different_users_are_processed_in_parallel():
+    queues = UserQueues(max_size=10, idle_timeout=1)
+
+    async def main():
+        started = time.monotonic()
+        await asyncio.gather(*(queues.run(user_id, lambda: asyncio.sleep(0.1)) for user_id in range(10)))
+        elapsed = time.monotonic() - started
+        await queues.close()
+        return elapsed
+
+    assert asyncio.run(main()) < 0.5
+
+
+def test_idle_queue_is_removed():
+    queues = UserQueues(max_size=10, idle_timeout=0.01)
+
+    async def main():
+        await queues.run(1, lambda: asyncio.sleep(0))
+        assert len(queues) == 1
+        await asyncio.sleep(0.05)
+        assert len(queues) == 0
+        assert await queues.run(1, lambda: asyncio.sleep(0, "again")) == "again"
+        await queues.close()
+
+    asyncio.run(main())
+
+
+def test_full_queue_rejects_update():
+    queues = UserQueues(max_size=1, idle_timeout=1)
+
+    async def main():
+        release = asyncio.Event()
+        # первый апдейт уже обрабатывается, второй занимает единственное место в очереди
+        first = asyncio.create_task(queues.run(1, release.wait))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(queues.run(1, release.wait))
+        await asyncio.sleep(0.01)
+        with pytest.raises(UserQueueFullError):
+            await queues.run(1, release.wait)
+        release.set()
+        await asyncio.gather(first, second)
+        await queues.close()
+
+    asyncio.run(main())
+
+
+def test_cancelled_job_does_not_stop_the_user_queue():
+    queues = UserQueues(max_size=10, idle_timeout=1)
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    async def main():
+        with pytest.raises(asyncio.CancelledError):
+            await queues.run(1, cancelled)
+        assert await queues.run(1, lambda: asyncio.sleep(0, "next")) == "next"
+        await queues.close()
+
+    asyncio.run(main())
+
+
+def test_base_exception_resolves_future_and_drops_dead_queue():
+    queues = UserQueues(max_size=10, idle_timeout=1)
+
+    async def fatal():
+        raise Fatal()
+
+    async def main():
+        blocked = asyncio.Event()
+        failing = asyncio.create_task(queues.run(1, fatal))
+        waiting = asyncio.create_task(queues.run(1, blocked.wait))
+        with pytest.raises(Fatal):
+            await failing
+        # апдейт, стоявший за упавшим, отменяется, а не ждет вечно
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert len(queues) == 0
+        assert await queues.run(1, lambda: asyncio.sleep(0, "next")) == "next"
+        await queues.close()
+
+    asyncio.run(main())
+
+
+def make_update(update_id, user_id, kind):
+    user = {"id": user_id, "is_bot": False, "first_name": "Test"}
+    payload = {"update_id": update_id}
+    if kind == "inline_query":
+        payload["inline_query"] = {"id": str(update_id), "from": user, "query": "бан", "offset": ""}
+    else:
+        payload["chosen_inline_result"] = {"result_id": "1:100", "from": user, "query": "бан"}
+    return Update.model_validate(payload)
+
+
+@pytest.mark.parametrize("kind", ["inline_query", "chosen_inline_result"])
+def test_inline_updates_bypass_user_queue(kind, monkeypatch):
+    import src.middlewares as middlewares
+
+    queues = UserQueues(max_size=10, idle_timeout=1)
+    monkeypatch.setattr(middlewares, "user_queues", queues)
+    middleware = UserOrderingMiddleware()
+
+    async def main():
+        slow_command = asyncio.Event()
+        busy = asyncio.create_task(queues.run(5, slow_command.wait))
+        await asyncio.sleep(0.01)
+        update = make_update(1, 5, kind)
+        handled = await asyncio.wait_for(
+            middleware(lambda event, data: asyncio.sleep(0, "handled"), update,
+                       {"event_from_user": getattr(update, kind).from_user}),
+            timeout=1,
+        )
+        slow_command.set()
+        await busy
+        await queues.close()
+        return handled
+
+    assert asyncio.run(main()) == "handled"
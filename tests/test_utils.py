@@ -0,0 +1,44 @@
+from src.utils import chart_range_caption, is_food_items, parse_chart_range, parse_food_items, parse_inline_query
+
+
+def test_parse_food_items():
+    assert parse_food_items("банан 120, гречка 200г") == [("Банан", 120), ("Гречка", 200)]
+    assert parse_food_items("куриная грудка 150гр,") == [("Куриная грудка", 150)]
+    assert parse_food_items("иван-чай 2.5") == [("Иван-чай", 2.5)]
+
+
+def test_parse_food_items_rejects_invalid_items():
+    assert parse_food_items("банан") is None
+    assert parse_food_items("банан 120, гречка") is None
+    assert parse_food_items("банан сто") is None
+    assert parse_food_items("банан 0") is None
+    assert parse_food_items("банан 6000") is None
+    assert parse_food_items("банан3 120") is None
+    assert parse_food_items(" , ") is None
+
+
+def test_is_food_items():
+    assert not is_food_items("банан")
+    assert not is_food_items("куриная грудка")
+    assert is_food_items("банан 120")
+    assert is_food_items("куриная грудка 200гр")
+    assert is_food_items("банан, гречка")
+
+
+def test_parse_inline_query():
+    assert parse_inline_query("банан 150", 100) == ("банан", 150)
+    assert parse_inline_query("куриная грудка", 100) == ("куриная грудка", 100)
+
+
+def test_parse_chart_range():
+    assert parse_chart_range("30d") == ("30d", 30)
+    assert parse_chart_range(" 4W ") == ("4w", 28)
+    assert parse_chart_range("6m") == ("6m", 180)
+    assert parse_chart_range("all") == ("all", None)
+    for value in ("", "d", "0d", "-1d", "1.5w", "5x", "101y"):
+        assert parse_chart_range(value) is None
+
+
+def test_chart_range_caption():
+    assert chart_range_caption("all") == "за все время"
+    assert chart_range_caption("4w") == "за 4 нед."
@@ -0,0 +1,75 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.webhook import BoundedRequestHandler
+
+SECRET = "test-secret"
+HEADERS = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+
+def update(update_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "chat": {"id": 7, "type": "private"},
+            "from": {"id": 7, "is_bot": False, "first_name": "Test"}, "text": "привет",
+        },
+    }
+
+
+async def run_with_client(test, **handler_kwargs):
+    release = asyncio.Event()
+    handled = []
+    dp = Dispatcher()
+
+    @dp.message()
+    async def on_message(message):
+        await release.wait()
+        handled.append(message.message_id)
+
+    app = web.Application()
+    handler = BoundedRequestHandler(dp, Bot(token="42:test"), secret_token=SECRET, **handler_kwargs)
+    handler.register(app, path="/webhook")
+    async with TestClient(TestServer(app)) as client:
+        await test(client, handler, release, handled)
+        release.set()
+        await asyncio.gather(*handler._background_feed_update_tasks)
+    await handler.close()
+
+
+def test_wrong_secret_is_rejected():
+    async def test(client, handler, release, handled):
+        response = await client.post("/webhook", json=update(1), headers={"X-Telegram-Bot-Api-Secret-Token": "x"})
+        assert response.status == 401
+        response = await client.post("/webhook", json=update(2))
+        assert response.status == 401
+        assert handler.pending_updates() == 0
+
+        response = await client.post("/webhook", json=update(3), headers=HEADERS)
+        assert response.status == 200
+        release.set()
+        await asyncio.gather(*handler._background_feed_update_tasks)
+        assert handled == [3]
+
+    asyncio.run(run_with_client(test))
+
+
+def test_full_handler_answers_503_until_updates_are_processed():
+    async def test(client, handler, release, handled):
+        for update_id in (1, 2):
+            assert (await client.post("/webhook", json=update(update_id), headers=HEADERS)).status == 200
+        assert handler.pending_updates() == 2
+        # Telegram повторит доставку отклоненного апдейта позже
+        assert (await client.post("/webhook", json=update(3), headers=HEADERS)).status == 503
+
+        release.set()
+        await asyncio.gather(*handler._background_feed_update_tasks)
+        assert handler.pending_updates() == 0
+        assert (await client.post("/webhook", json=update(3), headers=HEADERS)).status == 200
+        await asyncio.gather(*handler._background_feed_update_tasks)
+        assert handled == [1, 2, 3]
+
+    asyncio.run(run_with_client(test, max_concurrency=1, max_pending=2))